@@ -5,7 +5,24 @@ This module contains all AI agents used for extracting structured information
 from documents. Each agent is specialized for a specific type of extraction task.
 """
 
-from .contract_information_agent import ContractInformationAgent
-from .installment_series_agent import InstallmentSeriesAgent
+from .base_agent import BaseExtractionAgent
+from .combined_extraction_agent import CombinedExtractionAgent, get_combined_agent
+from .contract_information_agent import ContractInformationAgent, get_contract_agent
+from .installment_series_agent import InstallmentSeriesAgent, get_installment_agent
+from .orchestration import extract_both, extract_documents, gather_limited
+from .result_cache import ResultCache, get_default_cache
 
-__all__ = ["ContractInformationAgent", "InstallmentSeriesAgent"]
+__all__ = [
+    "BaseExtractionAgent",
+    "CombinedExtractionAgent",
+    "ContractInformationAgent",
+    "InstallmentSeriesAgent",
+    "ResultCache",
+    "extract_both",
+    "extract_documents",
+    "gather_limited",
+    "get_combined_agent",
+    "get_contract_agent",
+    "get_default_cache",
+    "get_installment_agent",
+]
@@ -0,0 +1,1003 @@
+"""
+Base class shared by the extraction agents.
+
+Holds the response parsing and batching logic that is identical across agents, so each
+concrete agent only has to define its fields, rules and prompt sections.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from agno.agent import Agent
+from agno.run.agent import RunEvent
+from pydantic import BaseModel
+
+from .result_cache import ResultCache, make_cache_key
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+    _loads = json.loads
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a ~4 characters per token estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Set once the .env file has been loaded, so every agent module does not parse it again
+_DOTENV_LOADED_FLAG = "_GCB_DOTENV_LOADED"
+
+# Tokenizer per model, loaded on first use
+_ENCODINGS: Dict[str, Any] = {}
+
+# Chunk text normalization: whitespace runs, ruler/dot-leader runs and page-number-only text
+_SPACES_RE = re.compile(r'[ \t\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_RULER_RE = re.compile(r'([-_.=])\1{4,}')
+_PAGE_NUMBER_RE = re.compile(
+    r'^(?:p[áa]g(?:ina)?\.?\s*\d{1,4}(?:\s*(?:de|/)\s*\d{1,4})?|\d{1,4}\s*(?:de|/)\s*\d{1,4})$',
+    re.IGNORECASE
+)
+
+# Chunks whose normalized text is shorter than this carry no information.
+# Kept low on purpose: short chunks such as 'LOTE 29' may hold a unitCode.
+MIN_CHUNK_CHARS = 2
+
+# Prompt block of one chunk; the trailing newline leaves a blank line before the next chunk
+_CHUNK_TEMPLATE = "[CHUNK ID: {cid}]\nType: {etype}\nText:\n{text}\n"
+
+# Markdown code fences the model sometimes wraps its JSON answer in
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.MULTILINE)
+
+# Bytes read at a time when streaming a chunks file
+_READ_SIZE = 64 * 1024
+
+# Decoder pulling the first complete JSON value out of surrounding text
+# (prose around the answer, or a partially streamed response)
+_DECODER = json.JSONDecoder()
+
+# Common fixes for malformed JSON, compiled once at import
+_FIX_PATTERNS = [
+    # Fix trailing commas
+    (re.compile(r',(\s*[}\]])'), r'\1'),
+    # Fix missing quotes around keys
+    (re.compile(r'(\w+):'), r'"\1":'),
+    # Fix single quotes to double quotes
+    (re.compile(r"'([^']*)'"), r'"\1"'),
+    # Fix unescaped quotes in strings
+    (re.compile(r'"(.*?)"(?=\s*:)'), r'"\1"'),
+]
+
+
+def _strip_fences(content: str) -> str:
+    """Remove markdown code fences (```json ... ```) around a model response."""
+    return _FENCE_RE.sub('', content).strip()
+
+
+def _unwrap_units(value: Any) -> Any:
+    """Return the list inside a ``{"units": [...]}`` response, or ``value`` unchanged."""
+    if isinstance(value, dict) and isinstance(value.get("units"), list):
+        return value["units"]
+    return value
+
+
+def load_env_once() -> None:
+    """
+    Load the .env file into the environment, only the first time it is called per process.
+
+    Like the S3/SNS providers, the file is only read when ``GCB_LOAD_DOTENV`` is set;
+    inside Lambda the configuration comes from environment variables.
+    """
+    if not os.getenv('GCB_LOAD_DOTENV') or os.getenv(_DOTENV_LOADED_FLAG):
+        return
+    import dotenv
+    dotenv.load_dotenv()
+    os.environ[_DOTENV_LOADED_FLAG] = "1"
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Count the tokens ``text`` takes as input of ``model``.
+
+    Uses tiktoken when installed, otherwise estimates ~4 characters per token.
+
+    Args:
+        text: Prompt text
+        model: OpenAI model id
+
+    Returns:
+        Number of tokens
+    """
+    if tiktoken is None:
+        return len(text) // 4
+
+    encoding = _ENCODINGS.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:  # Model unknown to this tiktoken version
+            encoding = tiktoken.get_encoding("o200k_base")
+        _ENCODINGS[model] = encoding
+
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _iter_array_items(pieces: Iterable[str]) -> Iterator[Any]:
+    """
+    Incrementally decode the elements of a top-level JSON array.
+
+    Text pieces (e.g. streamed model tokens) are buffered and every array element
+    is yielded as soon as it is complete, so callers can process the first unit
+    while the rest is still being generated. Anything before the opening '['
+    (such as a markdown fence) and after the closing ']' is ignored.
+
+    Args:
+        pieces: Successive fragments of the response text
+
+    Returns:
+        Iterator over the decoded array elements
+    """
+    buffer = ''
+    pos = -1  # Index of the next element in ``buffer``, -1 until '[' is seen
+
+    for piece in pieces:
+        buffer += piece
+
+        if pos < 0:
+            start = buffer.find('[')
+            if start < 0:
+                continue
+            pos = start + 1
+
+        # An object or array element can only be complete once a closing bracket arrived
+        if '}' not in piece and ']' not in piece:
+            continue
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == ']':
+                break
+            try:
+                item, pos = _DECODER.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element not complete yet
+            yield item
+
+        # Drop consumed text so the buffer stays small
+        buffer = buffer[pos:]
+        pos = 0
+
+
+def iter_chunks(json_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream document chunks from a JSON or JSON Lines file, one chunk at a time.
+
+    ``.jsonl`` files hold one chunk per line. A top-level array of chunks is
+    decoded incrementally while reading, so the whole file never has to be held
+    in memory. Files wrapping the array in a ``{"chunks": [...]}`` object are
+    loaded in one go.
+
+    Args:
+        json_path: Path of the chunks file
+
+    Returns:
+        Iterator over chunk dictionaries
+    """
+    if json_path.endswith('.jsonl'):
+        with open(json_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield _loads(line)
+        return
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        head = f.read(_READ_SIZE)
+        if not head.lstrip().startswith('['):
+            data = json.loads(head + f.read())
+            yield from data.get('chunks', [])
+            return
+
+        def _pieces() -> Iterator[str]:
+            yield head
+            while piece := f.read(_READ_SIZE):
+                yield piece
+
+        yield from _iter_array_items(_pieces())
+
+
+def dump_json(value: Any, output_path: str) -> None:
+    """Write ``value`` as indented UTF-8 JSON (with orjson when installed)."""
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(value, option=orjson.OPT_INDENT_2))
+        return
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, indent=2, ensure_ascii=False)
+
+
+def _normalize_chunk_text(text: str, element_type: Optional[str] = None) -> str:
+    """
+    Remove characters that cost input tokens without carrying information.
+
+    Collapses whitespace, shortens ruler/dot-leader runs ('-----', '.....') to three
+    characters and blanks out page-number-only text ('Página 3', '3 de 10'; bare
+    numbers are kept since they may be unit codes). Tables keep their line breaks
+    so the markdown rows stay readable.
+
+    Args:
+        text: Raw chunk text
+        element_type: Chunk element type ('table' preserves line structure)
+
+    Returns:
+        Normalized text (empty if nothing useful is left)
+    """
+    text = _RULER_RE.sub(r'\1\1\1', text or '')
+
+    if element_type == 'table':
+        text = _BLANK_LINES_RE.sub('\n', _SPACES_RE.sub(' ', text))
+    else:
+        text = _WHITESPACE_RE.sub(' ', text)
+    text = text.strip()
+
+    if _PAGE_NUMBER_RE.match(text):
+        return ''
+
+    return text
+
+
+def _canonicalize_chunks(chunks: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Deduplicate document chunks, keeping document order.
+
+    Overlapping chunking windows and repeated headers would otherwise send the
+    same text to the model several times. Chunks are deduplicated by the SHA-1 of
+    their element type and normalized text, and the first occurrence of each one
+    stays in place: the extraction rules rely on the document flow (e.g. "same
+    as previous unit"), so the chunks are not re-ordered.
+
+    Args:
+        chunks: Document chunks
+
+    Returns:
+        List of (chunk, normalized text) tuples
+    """
+    seen = set()
+    deduped = []
+
+    for chunk in chunks:
+        element_type = chunk.get('element_type')
+        text = _normalize_chunk_text(chunk.get('text'), element_type)
+        digest = hashlib.sha1(f"{element_type or ''}|{text}".encode('utf-8')).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        deduped.append((chunk, text))
+
+    return deduped
+
+
+def merge_units_by_code(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge partial extraction results that may describe the same units.
+
+    Units sharing a unitCode are combined: missing field values are filled in,
+    installmentPlans are concatenated and sources are deduplicated by
+    (field, chunk_id). Units without a unitCode are kept as they are, and empty
+    placeholder units are dropped.
+
+    Args:
+        results: Extraction results, one list of units per partial extraction
+
+    Returns:
+        List of merged unit dictionaries, in first-seen order
+    """
+    by_code: Dict[Any, Dict[str, Any]] = {}
+    merged_units = []
+
+    for result in results:
+        for item in result:
+            unit = item.get('unit') or {}
+            if not unit:
+                continue
+
+            code = unit.get('unitCode')
+            merged = by_code.get(code) if code is not None else None
+            if merged is None:
+                item.setdefault('sources', [])
+                item.setdefault('confidence', {})
+                if code is not None:
+                    by_code[code] = item
+                merged_units.append(item)
+                continue
+
+            merged_unit = merged['unit']
+            for field, value in unit.items():
+                if field == 'installmentPlans':
+                    merged_unit['installmentPlans'] = merged_unit.get('installmentPlans', []) + (value or [])
+                elif merged_unit.get(field) is None:
+                    merged_unit[field] = value
+
+            seen_sources = {(s.get('field'), s.get('chunk_id')) for s in merged['sources']}
+            for source in item.get('sources', []):
+                key = (source.get('field'), source.get('chunk_id'))
+                if key not in seen_sources:
+                    seen_sources.add(key)
+                    merged['sources'].append(source)
+
+            for field, conf in item.get('confidence', {}).items():
+                merged['confidence'].setdefault(field, conf)
+
+    return merged_units
+
+
+class BaseExtractionAgent(ABC):
+    """
+    Common behaviour for agents that extract structured data from document chunks.
+
+    Subclasses must create ``self.agent`` (and optionally ``self.strong_agent``), set
+    ``self.model``, ``prompt_cache_key`` and ``self.result_cache``, and implement
+    ``_build_request_section`` and ``_build_agent(model, structured=True)``.
+    """
+
+    # Versioned prompt identifier, also used to invalidate cached results
+    prompt_cache_key = "base_agent_v1"
+
+    # Cache of previous results (None disables caching)
+    result_cache: Optional[ResultCache] = None
+
+    # Stronger model re-running documents the cheap model was unsure about (None disables escalation)
+    strong_agent = None
+
+    # Pydantic model of the response ({"units": [...]}), enforced through OpenAI
+    # structured outputs on single-document calls (None keeps free-form JSON)
+    output_schema: Optional[Type[BaseModel]] = None
+
+    # Unit fields that must be filled for a result to be accepted without escalation
+    mandatory_fields = ("unitCode",)
+
+    # Escalation statistics, per instance, updated under ``_stats_lock``
+    _extractions = 0
+    _escalations = 0
+    _stats_lock = threading.Lock()
+
+    # Maximum number of documents answered by a single batched LLM call.
+    # Keeps the combined prompt well inside the model context window.
+    max_batch_size = 4
+
+    # Prompts above this many tokens are split into shards instead of sent as is
+    max_input_tokens = 100_000
+
+    def extract_information(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extract information from the chunks of a single document.
+
+        Args:
+            chunks: List of document chunks with text, page, bbox, and element_type
+
+        Returns:
+            List of unit dictionaries with unit, sources, and confidence
+        """
+        # Chunks normalized and deduplicated once, for the cache key and the prompt
+        canonical = _canonicalize_chunks(chunks)
+
+        cached, cache_key, embedding = self._lookup_cache(chunks, canonical)
+        if cached is not None:
+            return cached
+
+        result = self._extract_uncached(chunks, canonical)
+
+        self._store_cache(cache_key, result, embedding)
+        return result
+
+    def _extract_uncached(
+        self,
+        chunks: List[Dict[str, Any]],
+        canonical: Optional[List[Tuple[Dict[str, Any], str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Run the extraction of a single document, bypassing the result cache."""
+        # Create prompt with chunks and extraction request
+        prompt = self._build_extraction_prompt(chunks, canonical)
+
+        shard_size = self._oversized_shard_size(prompt, chunks)
+        if shard_size:
+            return self.extract_information_sharded(chunks, shard_size)
+
+        # Run agent and get response
+        run_response = self.agent.run(prompt, stream=False)
+        result = self._parse_response(run_response.content)
+
+        # Re-run with the strong model when the cheap one is unsure
+        if self._should_escalate(result):
+            run_response = self.strong_agent.run(prompt, stream=False)
+            result = self._parse_response(run_response.content)
+
+        return result
+
+    async def aextract_information(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Async variant of ``extract_information``.
+
+        Awaits the model through agno's async API so several extractions can be
+        in flight at once (see ``agents.orchestration``).
+
+        Args:
+            chunks: List of document chunks with text, page, bbox, and element_type
+
+        Returns:
+            List of unit dictionaries with unit, sources, and confidence
+        """
+        canonical = _canonicalize_chunks(chunks)
+
+        cached, cache_key, embedding = self._lookup_cache(chunks, canonical)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_extraction_prompt(chunks, canonical)
+
+        shard_size = self._oversized_shard_size(prompt, chunks)
+        if shard_size:
+            return await self.aextract_information_sharded(chunks, shard_size)
+
+        run_response = await self.agent.arun(prompt, stream=False)
+        result = self._parse_response(run_response.content)
+
+        if self._should_escalate(result):
+            run_response = await self.strong_agent.arun(prompt, stream=False)
+            result = self._parse_response(run_response.content)
+
+        self._store_cache(cache_key, result, embedding)
+        return result
+
+    def iter_extract(self, chunks: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the units of a single document as the model generates them.
+
+        Each unit dictionary is yielded as soon as its JSON object is complete,
+        instead of waiting for the whole response as ``extract_information`` does.
+        Units are already handed out while generating, so this path never
+        escalates to the strong model.
+
+        Args:
+            chunks: List of document chunks with text, page, bbox, and element_type
+
+        Returns:
+            Iterator over unit dictionaries with unit, sources, and confidence
+        """
+        canonical = _canonicalize_chunks(chunks)
+
+        cached, cache_key, embedding = self._lookup_cache(chunks, canonical)
+        if cached is not None:
+            yield from cached
+            return
+
+        prompt = self._build_extraction_prompt(chunks, canonical)
+
+        content_parts = []
+
+        def _content_pieces() -> Iterator[str]:
+            for event in self._freeform_agent.run(prompt, stream=True):
+                if event.event == RunEvent.run_content.value and isinstance(event.content, str):
+                    content_parts.append(event.content)
+                    yield event.content
+
+        # The first '[' of a {"units": [...]} response opens the units array
+        result = []
+        for item in _iter_array_items(_content_pieces()):
+            if isinstance(item, dict):
+                result.append(item)
+                yield item
+
+        # Nothing could be streamed (e.g. malformed JSON): parse the full response instead
+        if not result:
+            result = self._parse_response("".join(content_parts))
+            yield from result
+
+        self._store_cache(cache_key, result, embedding)
+
+    def extract_information_sharded(
+        self,
+        chunks: List[Dict[str, Any]],
+        shard_size: int = 12
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract information from a large document by splitting it into shards.
+
+        Each shard of ``shard_size`` chunks is extracted concurrently and the
+        partial results are merged by unitCode. Shorter prompts and outputs keep
+        every call well inside the context window and decode faster.
+
+        Escalation is decided once, on the merged result: a shard may hold no
+        unit or only part of one, which says nothing about the model's certainty.
+        When the merged document is uncertain, the shards are re-run with the
+        strong model.
+
+        Shards run on a thread pool with the agents' sync client, so this is safe
+        to call from inside a running event loop and never shares the async
+        client across loops. Async callers should await
+        ``aextract_information_sharded`` instead.
+
+        Args:
+            chunks: List of document chunks
+            shard_size: Number of chunks per shard
+
+        Returns:
+            List of merged unit dictionaries
+        """
+        result = self._extract_shards(chunks, shard_size, self.agent)
+
+        if self._should_escalate(result):
+            result = self._extract_shards(chunks, shard_size, self.strong_agent)
+
+        return result
+
+    async def aextract_information_sharded(
+        self,
+        chunks: List[Dict[str, Any]],
+        shard_size: int = 12
+    ) -> List[Dict[str, Any]]:
+        """Async variant of ``extract_information_sharded``."""
+        result = await self._aextract_shards(chunks, shard_size, self.agent)
+
+        if self._should_escalate(result):
+            result = await self._aextract_shards(chunks, shard_size, self.strong_agent)
+
+        return result
+
+    def _extract_shards(
+        self,
+        chunks: List[Dict[str, Any]],
+        shard_size: int,
+        agent: Agent
+    ) -> List[Dict[str, Any]]:
+        """Extract every shard of ``chunks`` with ``agent`` and merge the results, without escalating."""
+        # Imported here: orchestration imports the concrete agents
+        from .orchestration import MAX_CONCURRENT_REQUESTS
+
+        shards = [chunks[i:i + shard_size] for i in range(0, len(chunks), shard_size)]
+        with ThreadPoolExecutor(max_workers=min(len(shards), MAX_CONCURRENT_REQUESTS)) as executor:
+            shard_results = list(executor.map(lambda shard: self._extract_shard(shard, agent), shards))
+
+        return merge_units_by_code(shard_results)
+
+    def _extract_shard(self, chunks: List[Dict[str, Any]], agent: Agent) -> List[Dict[str, Any]]:
+        """Run ``agent`` on a single shard, sharding it again if its prompt is still too large."""
+        prompt = self._build_extraction_prompt(chunks)
+
+        shard_size = self._oversized_shard_size(prompt, chunks)
+        if shard_size:
+            return self._extract_shards(chunks, shard_size, agent)
+
+        run_response = agent.run(prompt, stream=False)
+        return self._parse_response(run_response.content)
+
+    async def _aextract_shards(
+        self,
+        chunks: List[Dict[str, Any]],
+        shard_size: int,
+        agent: Agent
+    ) -> List[Dict[str, Any]]:
+        """Async variant of ``_extract_shards``."""
+        # Imported here: orchestration imports the concrete agents
+        from .orchestration import gather_limited
+
+        shards = [chunks[i:i + shard_size] for i in range(0, len(chunks), shard_size)]
+        shard_results = await gather_limited(self._aextract_shard(shard, agent) for shard in shards)
+
+        return merge_units_by_code(shard_results)
+
+    async def _aextract_shard(self, chunks: List[Dict[str, Any]], agent: Agent) -> List[Dict[str, Any]]:
+        """Async variant of ``_extract_shard``."""
+        prompt = self._build_extraction_prompt(chunks)
+
+        shard_size = self._oversized_shard_size(prompt, chunks)
+        if shard_size:
+            return await self._aextract_shards(chunks, shard_size, agent)
+
+        run_response = await agent.arun(prompt, stream=False)
+        return self._parse_response(run_response.content)
+
+    def extract_information_batch(
+        self,
+        docs: List[List[Dict[str, Any]]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Extract information from several documents, answering up to
+        ``max_batch_size`` documents (and ``max_input_tokens`` tokens) per LLM call.
+
+        The static system prompt is sent once per batch instead of once per
+        document, which cuts both input tokens and round trips. Documents found
+        in the result cache are answered from it and left out of the batches.
+
+        Args:
+            docs: List of documents, each one a list of chunks
+
+        Returns:
+            List of extraction results, element i corresponding to docs[i]
+        """
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(docs)
+
+        # (document index, canonical chunks, cache key, embedding) of the cache misses
+        pending = []
+        for doc_idx, chunks in enumerate(docs):
+            canonical = _canonicalize_chunks(chunks)
+            cached, cache_key, embedding = self._lookup_cache(chunks, canonical)
+            if cached is not None:
+                results[doc_idx] = cached
+            else:
+                pending.append((doc_idx, canonical, cache_key, embedding))
+
+        position = 0
+        for group in self._pack_batches([docs[doc_idx] for doc_idx, _, _, _ in pending]):
+            entries = pending[position:position + len(group)]
+            position += len(group)
+
+            # A batch of one is just a regular extraction
+            if len(group) == 1:
+                group_results = [self._extract_uncached(group[0], entries[0][1])]
+            else:
+                prompt = self._build_batch_prompt(group)
+                run_response = self._freeform_agent.run(prompt, stream=False)
+                group_results = self._split_batch_response(run_response.content, group)
+
+            for (doc_idx, _, cache_key, embedding), result in zip(entries, group_results):
+                self._store_cache(cache_key, result, embedding)
+                results[doc_idx] = result
+
+        return results
+
+    @cached_property
+    def _freeform_agent(self):
+        """
+        Agent answering in free-form JSON.
+
+        Batched (list of results) and streamed (incrementally decoded array)
+        responses do not fit the single-document output schema.
+        """
+        if self.output_schema is None:
+            return self.agent
+        return self._build_agent(self.model, structured=False)
+
+    def _pack_batches(self, docs: List[List[Dict[str, Any]]]) -> Iterator[List[List[Dict[str, Any]]]]:
+        """Greedily group consecutive documents into batches that fit the size and token budgets."""
+        group: List[List[Dict[str, Any]]] = []
+        group_tokens = 0
+
+        for chunks in docs:
+            doc_tokens = count_tokens("\n".join(chunk.get('text') or '' for chunk in chunks), self.model)
+            if group and (len(group) == self.max_batch_size or group_tokens + doc_tokens > self.max_input_tokens):
+                yield group
+                group, group_tokens = [], 0
+            group.append(chunks)
+            group_tokens += doc_tokens
+
+        if group:
+            yield group
+
+    def _oversized_shard_size(self, prompt: str, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Check the prompt against ``max_input_tokens`` before paying for the call.
+
+        Returns:
+            Shard size to re-run the document with, or 0 if the prompt fits
+        """
+        tokens = count_tokens(prompt, self.model)
+        if tokens <= self.max_input_tokens or len(chunks) < 2:
+            return 0
+
+        # Strictly fewer chunks per shard, so recursive checks always terminate
+        shard_size = max(1, min(len(chunks) - 1, len(chunks) * self.max_input_tokens // tokens))
+        print(f"⚠️  Prompt has {tokens} tokens (limit {self.max_input_tokens}), "
+              f"sharding {len(chunks)} chunks by {shard_size}")
+        return shard_size
+
+    def _lookup_cache(
+        self,
+        chunks: List[Dict[str, Any]],
+        canonical: List[Tuple[Dict[str, Any], str]]
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[Any]]:
+        """
+        Look up a previous result for these chunks.
+
+        Args:
+            chunks: Document chunks
+            canonical: ``chunks`` as returned by ``_canonicalize_chunks``
+
+        Returns:
+            Tuple of (cached result or None, exact cache key, embedding for the semantic tier)
+        """
+        if self.result_cache is None:
+            return None, None, None
+
+        # Keyed on the deduplicated chunks so repeated chunks do not change the key
+        cache_key = make_cache_key(self.model, self._prompt_fingerprint, [chunk for chunk, _ in canonical])
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            print(f"✓ Cache hit for {self.__class__.__name__}, skipping LLM call")
+            return cached, cache_key, None
+
+        # Only computed on an exact miss
+        text = "\n".join(chunk.get('text') or '' for chunk in chunks)
+        cached, embedding = self.result_cache.get_similar(text)
+        return cached, cache_key, embedding
+
+    def _store_cache(
+        self,
+        cache_key: Optional[str],
+        result: List[Dict[str, Any]],
+        embedding: Optional[Any] = None
+    ) -> None:
+        """Store a result, skipping the placeholder returned when parsing failed."""
+        if self.result_cache is None or cache_key is None:
+            return
+
+        if any(isinstance(item, dict) and item.get('unit') for item in result):
+            self.result_cache.put(cache_key, result, embedding)
+
+    def _build_extraction_prompt(
+        self,
+        chunks: List[Dict[str, Any]],
+        canonical: Optional[List[Tuple[Dict[str, Any], str]]] = None
+    ) -> str:
+        """
+        Build the extraction prompt for a single document.
+
+        Static text goes first and the document chunks strictly last, so the
+        system prompt plus the request section form a byte-identical prefix
+        that OpenAI prompt caching can reuse across calls.
+
+        ``canonical`` passes chunks already run through ``_canonicalize_chunks``,
+        so they are not normalized again.
+        """
+        return "\n".join(self._iter_prompt_lines(chunks, canonical))
+
+    def _iter_prompt_lines(
+        self,
+        chunks: List[Dict[str, Any]],
+        canonical: Optional[List[Tuple[Dict[str, Any], str]]] = None
+    ) -> Iterator[str]:
+        """Yield the lines of the single-document extraction prompt."""
+        yield from self._request_section
+        yield ""
+        yield from self._iter_chunk_lines(chunks, canonical)
+
+    @cached_property
+    def _prompt_fingerprint(self) -> str:
+        """
+        Version of the prompt used in result cache keys.
+
+        Hashes the instructions and request section along with ``prompt_cache_key``,
+        so editing the prompt invalidates cached results without a manual bump.
+        """
+        prompt = "\n".join((str(self.agent.instructions), *self._request_section))
+        return f"{self.prompt_cache_key}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]}"
+
+    @cached_property
+    def _request_section(self) -> Tuple[str, ...]:
+        """Request section lines, built once per agent since they never change between calls."""
+        return tuple(self._build_request_section())
+
+    def _build_batch_prompt(self, docs: List[List[Dict[str, Any]]]) -> str:
+        """Build one prompt asking for the extraction of every document in ``docs``."""
+        return "\n".join(self._iter_batch_prompt_lines(docs))
+
+    def _iter_batch_prompt_lines(self, docs: List[List[Dict[str, Any]]]) -> Iterator[str]:
+        """Yield the lines of the batched prompt (static request first, documents last)."""
+        yield from self._request_section
+        yield ""
+        yield "# BATCH RESPONSE FORMAT"
+        yield "• Apply the extraction request above to EACH document below independently"
+        yield "• Never mix units, sources or chunk IDs between documents"
+        yield f'• Return a JSON array of length {len(docs)}: element i is the {{"units": [...]}} result object for DOCUMENT i'
+        yield ""
+        yield "# DOCUMENTS"
+        yield f"Below are {len(docs)} independent documents, each starting with a '=== DOCUMENT N ===' separator."
+        yield ""
+
+        for doc_idx, chunks in enumerate(docs):
+            yield f"=== DOCUMENT {doc_idx + 1} ==="
+            yield from self._iter_chunk_lines(chunks)
+
+    def _split_batch_response(
+        self,
+        content: Any,
+        docs: List[List[Dict[str, Any]]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Dispatch a batched response back to its documents.
+
+        Falls back to one extraction per document if the model did not answer
+        with exactly one element per document.
+        """
+        batch_result = self._load_json(content)
+
+        if not isinstance(batch_result, list) or len(batch_result) != len(docs):
+            print(f"⚠️  Batched response did not match {len(docs)} documents, extracting them one by one")
+            return [self._extract_uncached(chunks) for chunks in docs]
+
+        results = [_unwrap_units(item) for item in batch_result]
+        results = [item if isinstance(item, list) else [item] for item in results]
+
+        # Escalate only the documents the cheap model was unsure about
+        for doc_idx, result in enumerate(results):
+            if self._should_escalate(result):
+                prompt = self._build_extraction_prompt(docs[doc_idx])
+                run_response = self.strong_agent.run(prompt, stream=False)
+                results[doc_idx] = self._parse_response(run_response.content)
+
+        return results
+
+    def _should_escalate(self, result: List[Dict[str, Any]]) -> bool:
+        """
+        Decide whether a cheap-model result must be re-run with the strong model.
+
+        A result is escalated when any confidence is "low" or a mandatory field is missing.
+
+        Args:
+            result: Parsed extraction result
+
+        Returns:
+            True if the strong model should be used
+        """
+        if self.strong_agent is None:
+            return False
+
+        needs_escalation = not result
+        for item in result:
+            unit = item.get('unit') or {}
+            confidence = item.get('confidence') or {}
+            if any(unit.get(field) is None for field in self.mandatory_fields) or "low" in confidence.values():
+                needs_escalation = True
+                break
+
+        # Shared agents are called from several threads at once
+        with self._stats_lock:
+            self._extractions += 1
+            self._escalations += needs_escalation
+            extractions, escalations = self._extractions, self._escalations
+
+        if needs_escalation:
+            print(f"⬆️  Escalating {self.__class__.__name__} to the strong model "
+                  f"(escalation rate {escalations}/{extractions})")
+
+        return needs_escalation
+
+    def _parse_response(self, content: Any) -> List[Dict[str, Any]]:
+        """
+        Parse the agent response content into a list of units.
+
+        Args:
+            content: Raw content returned by the agent
+
+        Returns:
+            List of unit dictionaries (a minimal placeholder if parsing fails)
+        """
+        result = _unwrap_units(self._load_json(content))
+
+        if result is None:
+            # Return a minimal structure to prevent complete failure
+            result = [{"unit": {}, "sources": [], "confidence": {}}]
+
+        # Ensure result is a list
+        if not isinstance(result, list):
+            result = [result]
+
+        return result
+
+    def _load_json(self, content: Any) -> Optional[Any]:
+        """
+        Decode the JSON returned by the agent.
+
+        Structured outputs arrive as ``output_schema`` instances. Otherwise the
+        agent should return JSON, but may wrap it in markdown code blocks or
+        surround it with explanations; the first JSON value found is returned.
+
+        Args:
+            content: Raw content returned by the agent
+
+        Returns:
+            Decoded JSON value, or None if it could not be parsed
+        """
+        # Structured output, already validated by agno against output_schema
+        if isinstance(content, BaseModel):
+            return content.model_dump()["units"]
+
+        if not isinstance(content, str):
+            return content
+
+        content = _strip_fences(content)
+
+        try:
+            return _loads(content)
+        except json.JSONDecodeError:
+            pass
+
+        # Prose before or after the JSON: decode the first value and ignore the rest
+        start = min((i for i in (content.find('['), content.find('{')) if i != -1), default=0)
+        try:
+            result, _ = _DECODER.raw_decode(content, start)
+            return result
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {e}")
+            print(f"Content preview: {content[:200]}...")
+            print(f"Error at position {e.pos}: {content[max(0, e.pos-50):e.pos+50]}")
+
+        # Try to fix common JSON issues
+        content = self._fix_json_issues(content[start:])
+        try:
+            result = _loads(content)
+            print("✓ Fixed JSON and parsed successfully")
+            return result
+        except json.JSONDecodeError as e2:
+            print(f"Still failed to parse JSON: {e2}")
+            return None
+
+    def _fix_json_issues(self, content: str) -> str:
+        """
+        Try to fix common JSON issues in the agent's response.
+
+        Args:
+            content: The JSON string that failed to parse
+
+        Returns:
+            Potentially fixed JSON string
+        """
+        for pattern, replacement in _FIX_PATTERNS:
+            content = pattern.sub(replacement, content)
+
+        return content
+
+    def _iter_chunk_lines(
+        self,
+        chunks: List[Dict[str, Any]],
+        canonical: Optional[List[Tuple[Dict[str, Any], str]]] = None
+    ) -> Iterator[str]:
+        """Yield the prompt lines listing the document chunks."""
+        yield "# DOCUMENT CHUNKS"
+        yield "Below are chunks extracted from a document:"
+        yield ""
+
+        if canonical is None:
+            canonical = _canonicalize_chunks(chunks)
+        kept_chars = 0
+        skipped = 0
+
+        # Add all unique chunks with their normalized text content
+        for chunk, text in canonical:
+            if len(text) < MIN_CHUNK_CHARS:
+                skipped += 1
+                continue
+            kept_chars += len(text)
+
+            yield _CHUNK_TEMPLATE.format_map({
+                "cid": chunk.get('chunk_id', 'unknown'),
+                "etype": chunk['element_type'],
+                "text": text,
+            })
+
+        if logger.isEnabledFor(logging.DEBUG):
+            # Rough estimate: ~4 characters per token
+            raw_chars = sum(len(chunk['text'] or '') for chunk in chunks)
+            logger.debug("Chunk normalization saved ~%d tokens (%d empty and %d duplicate chunks skipped)",
+                         (raw_chars - kept_chars) // 4, skipped, len(chunks) - len(canonical))
+
+    @abstractmethod
+    def _build_agent(self, model: str, structured: bool = True) -> Agent:
+        """Create the agno agent for ``model`` (free-form JSON unless ``structured``)."""
+
+    @abstractmethod
+    def _build_request_section(self) -> List[str]:
+        """Build the prompt lines describing what to extract."""
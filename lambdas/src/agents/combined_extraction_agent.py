@@ -0,0 +1,213 @@
+"""
+Combined extraction agent returning contract fields and installment plans in one call.
+
+Running the contract information and installment series agents on the same document
+sends the same chunks twice, with two large system prompts and two round trips.
+This agent asks for both in a single response and splits it back on the client.
+"""
+
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+from agno.agent import Agent
+from agno.models.openai import OpenAIChat
+
+from .base_agent import BaseExtractionAgent, load_env_once
+from .contract_information_agent import (
+    _BUSINESS_RULES as _CONTRACT_BUSINESS_RULES,
+    _FIELDS_TO_EXTRACT as _CONTRACT_FIELDS,
+    _IMPLEMENTATION_RULES,
+    _JSON_RULES,
+    calculate_price_per_m2,
+)
+from .installment_series_agent import (
+    _FIELDS_TO_EXTRACT as _INSTALLMENT_FIELDS,
+    _INSTALLMENT_RULES,
+)
+from .result_cache import DEFAULT_CACHE, ResultCache, get_default_cache
+from .schemas import CombinedExtraction
+
+load_env_once()
+
+# OpenAI prompt cache key - bump the version when the rules below change
+PROMPT_CACHE_KEY = "combined_extraction_agent_v2"
+
+# Union of the fields of both agents; installmentPlans lives inside each unit
+_FIELDS_TO_EXTRACT = {**_CONTRACT_FIELDS, **_INSTALLMENT_FIELDS}
+
+# Unit fields produced by the installment series extraction
+_INSTALLMENT_FIELD_NAMES = frozenset(_INSTALLMENT_FIELDS)
+
+# Entity identification, JSON and implementation rules are shared, so they are
+# taken once from the contract agent; only the installment rules are added.
+_INSTRUCTIONS = (
+    "You are a document analysis expert specializing in structured data extraction from real estate contracts. "
+    "Extract property information and payment schedules and organize them by unique entities (units).\n\n"
+    + _CONTRACT_BUSINESS_RULES
+    + "\n## BUSINESS RULES - INSTALLMENT SERIES EXTRACTION\n"
+    + _INSTALLMENT_RULES
+    + "\n" + _JSON_RULES + "\n" + _IMPLEMENTATION_RULES
+    + "\n• Include the installmentPlans array (possibly empty) within each unit object\n"
+)
+
+
+def split_combined_result(
+    result: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split a combined result into the shapes returned by the two specialized agents.
+
+    Args:
+        result: Combined extraction result (units with contract fields and installmentPlans)
+
+    Returns:
+        Tuple of (contract_result, installment_result), aligned unit by unit
+    """
+    contract_result = []
+    installment_result = []
+
+    for item in result:
+        unit = item.get('unit') or {}
+        sources = item.get('sources') or []
+        confidence = item.get('confidence') or {}
+
+        contract_result.append({
+            "unit": {k: v for k, v in unit.items() if k not in _INSTALLMENT_FIELD_NAMES},
+            "sources": [s for s in sources if s.get('field') not in _INSTALLMENT_FIELD_NAMES],
+            "confidence": {k: v for k, v in confidence.items() if k not in _INSTALLMENT_FIELD_NAMES},
+        })
+
+        installment_result.append({
+            "unit": {
+                "unitCode": unit.get('unitCode'),
+                "installmentPlans": unit.get('installmentPlans') or [],
+            },
+            "sources": [s for s in sources if s.get('field') in _INSTALLMENT_FIELD_NAMES],
+            "confidence": {
+                k: v for k, v in confidence.items()
+                if k == 'unitCode' or k in _INSTALLMENT_FIELD_NAMES
+            },
+        })
+
+    return contract_result, installment_result
+
+
+class CombinedExtractionAgent(BaseExtractionAgent):
+    """Agent extracting contract information and installment plans with a single LLM call."""
+
+    prompt_cache_key = PROMPT_CACHE_KEY
+    output_schema = CombinedExtraction
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        strong_model: Optional[str] = "gpt-4o",
+        result_cache: Optional[ResultCache] = DEFAULT_CACHE
+    ):
+        """
+        Initialize the combined extraction agent.
+
+        Args:
+            model: The LLM model to use for the first pass
+            strong_model: Model re-running uncertain results (None disables escalation)
+            result_cache: Cache of previous results (defaults to the shared cache,
+                which is only enabled by GCB_AGENT_CACHE_DIR; None disables caching)
+        """
+        self.model = model
+        self.result_cache = get_default_cache() if result_cache is DEFAULT_CACHE else result_cache
+
+        self.fields_to_extract = _FIELDS_TO_EXTRACT
+        self.instructions = _INSTRUCTIONS
+
+        self.agent = self._build_agent(model)
+        self.strong_agent = self._build_agent(strong_model) if strong_model else None
+
+    def _build_agent(self, model: str, structured: bool = True) -> Agent:
+        """Create the agno agent for ``model`` (free-form JSON unless ``structured``)."""
+        return Agent(
+            name="Combined Extraction Agent",
+            model=OpenAIChat(
+                id=model,
+                extra_body={"prompt_cache_key": self.prompt_cache_key}
+            ),
+            instructions=self.instructions,
+            tools=[calculate_price_per_m2],
+            output_schema=self.output_schema if structured else None,
+            markdown=False
+        )
+
+    def get_field_descriptions(self) -> Dict[str, str]:
+        """Get descriptions of fields this agent extracts."""
+        return {field: info["description"] for field, info in self.fields_to_extract.items()}
+
+    def extract_all(
+        self,
+        chunks: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Extract contract information and installment plans with one LLM call.
+
+        Args:
+            chunks: List of document chunks with text, page, bbox, and element_type
+
+        Returns:
+            Tuple of (contract_result, installment_result), in the formats returned by
+            ``ContractInformationAgent`` and ``InstallmentSeriesAgent``
+        """
+        return split_combined_result(self.extract_information(chunks))
+
+    async def aextract_all(
+        self,
+        chunks: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Async variant of ``extract_all``."""
+        return split_combined_result(await self.aextract_information(chunks))
+
+    def _build_request_section(self) -> List[str]:
+        """Build the prompt lines describing the combined extraction request."""
+        prompt_parts = [
+            "# EXTRACTION REQUEST",
+            "Extract the following information from the document chunks below:",
+            ""
+        ]
+
+        for field, field_info in self.fields_to_extract.items():
+            prompt_parts.append(f"• **{field}** ({field_info['type']}): {field_info['description']}")
+            for sub_field, sub_info in field_info.get("sub_fields", {}).items():
+                prompt_parts.append(f"    ◦ {sub_field} ({sub_info['type']}): {sub_info['description']}")
+
+        prompt_parts.extend([
+            "",
+            "# EXTRACTION INSTRUCTIONS",
+            "",
+            "## Document Analysis",
+            "• Analyze the document to identify ALL entities (units/properties) present",
+            "• If contract doesn't contain multiple units, use information from the first unit",
+            "",
+            "## Data Extraction Process",
+            "• Extract contract fields and installment plans for each entity separately",
+            "• If information is not found, set value to null and explain in sources",
+            "",
+            "## Field-Specific Implementation Notes",
+            "• signingDate: Do NOT use the dates of digital signatures",
+            "• installmentPlans: Look for payment patterns (e.g., 'X parcelas mensais', 'Y parcelas anuais')",
+            "• Information can be repeated between entities if the same"
+        ])
+
+        return prompt_parts
+
+
+@functools.lru_cache(maxsize=8)
+def get_combined_agent(model: str = "gpt-4o-mini") -> CombinedExtractionAgent:
+    """
+    Return a shared CombinedExtractionAgent for ``model``.
+
+    Warm Lambda invocations reuse the same instance, and with it the OpenAI
+    HTTP connection pool, instead of rebuilding the agent every time.
+
+    Args:
+        model: The LLM model to use for the first pass
+
+    Returns:
+        The cached agent instance
+    """
+    return CombinedExtractionAgent(model=model)
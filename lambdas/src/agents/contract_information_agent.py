@@ -1,75 +1,52 @@
 """Contract information agent for extracting property data from parsed PDF chunks."""
 
-import json
-from typing import Dict, List, Any
+import functools
+from typing import Dict, List, Any, Optional
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
-import dotenv
 
-env = dotenv.load_dotenv()
+from .base_agent import BaseExtractionAgent, dump_json, iter_chunks, load_env_once
+from .result_cache import DEFAULT_CACHE, ResultCache, get_default_cache
+from .schemas import ContractExtraction
 
+load_env_once()
 
-def calculate_price_per_m2(sell_value: float, area_m2: float) -> float:
-    """
-    Calculate the price per square meter.
-    
-    Args:
-        sell_value: Total selling price/value
-        area_m2: Area in square meters
-    
-    Returns:
-        Price per square meter rounded to 2 decimal places
-    """
-    if area_m2 < 0:
-        raise ValueError("Area must be greater than 0")
+# Routes every request of this agent to the same OpenAI prompt cache.
+# Bump the version whenever the instructions or rules text changes, so a new
+# cache is populated instead of mixing prompts.
+PROMPT_CACHE_KEY = "contract_info_agent_v2"
 
-    if area_m2 == 0:
-        return 0.00
-    
-    price_per_m2 = sell_value / area_m2
-    return round(price_per_m2, 2)
 
+# Field definitions - generalized and modular
+_FIELDS_TO_EXTRACT = {
+    "unitCode": {
+        "description": "Unique property identifier - can be a number, string, or complex identifier (e.g., '64', 'LOTE Nº 64 QUADRA D', 'APTO 101 BLOCO A', 'CASA 15 LOTEAMENTO XYZ') - MANDATORY: Every unit MUST have a unitCode",
+        "type": "string"
+    },
+    "sellValue": {
+        "description": "TOTAL selling price/value of the property - NOT installments, NOT partial payments, NOT commissions - ONLY the complete total value",
+        "type": "number"
+    },
+    "buyerName": {
+        "description": "Full name of the buyer/purchaser",
+        "type": "string"
+    },
+    "areaM2": {
+        "description": "Total area of the property in square meters",
+        "type": "number"
+    },
+    "pricePerM2": {
+        "description": "Price per square meter (use calculate_price_per_m2 tool)",
+        "type": "number"
+    },
+    "signingDate": {
+        "description": "Date when the contract was signed or executed - MUST be in ISO 8601 format (YYYY-MM-DD) - usually accompanying the city/state information.",
+        "type": "string"
+    },
+}
 
-class ContractInformationAgent:
-    """Agent that analyzes contract documents to extract structured property information."""
-    
-    def __init__(self, model: str = "gpt-4o-mini"):
-        """
-        Initialize the contract information agent.
-        
-        Args:
-            model: The LLM model to use
-        """
-        # Field definitions - generalized and modular
-        self.fields_to_extract = {
-            "unitCode": {
-                "description": "Unique property identifier - can be a number, string, or complex identifier (e.g., '64', 'LOTE Nº 64 QUADRA D', 'APTO 101 BLOCO A', 'CASA 15 LOTEAMENTO XYZ') - MANDATORY: Every unit MUST have a unitCode",
-                "type": "string"
-            },
-            "sellValue": {
-                "description": "TOTAL selling price/value of the property - NOT installments, NOT partial payments, NOT commissions - ONLY the complete total value",
-                "type": "number"
-            },
-            "buyerName": {
-                "description": "Full name of the buyer/purchaser",
-                "type": "string"
-            },
-            "areaM2": {
-                "description": "Total area of the property in square meters",
-                "type": "number"
-            },
-            "pricePerM2": {
-                "description": "Price per square meter (use calculate_price_per_m2 tool)",
-                "type": "number"
-            },
-            "signingDate": {
-                "description": "Date when the contract was signed or executed - MUST be in ISO 8601 format (YYYY-MM-DD) - usually accompanying the city/state information.",
-                "type": "string"
-            },
-        }
-        
-        # Business Rules - Domain-specific extraction rules
-        self.business_rules = """
+# Business Rules - Domain-specific extraction rules
+_BUSINESS_RULES = """
 ## BUSINESS RULES - CONTRACT INFORMATION EXTRACTION
 
 ### Entity Identification Rules
@@ -93,12 +70,12 @@ class ContractInformationAgent:
 • All dates must be converted to ISO 8601 format (YYYY-MM-DD) before returning
 """
 
-        # JSON Structure Rules - Technical implementation rules
-        self.json_rules = """
+# JSON Structure Rules - Technical implementation rules
+_JSON_RULES = """
 ## JSON STRUCTURE RULES
 
 ### Response Format
-Return a JSON array where each element contains:
+Return a JSON object with a 'units' array where each element contains:
 • 'unit': Object with all extracted field values
 • 'sources': Array of source citations for each field
 • 'confidence': Object with confidence levels (high/medium/low)
@@ -113,11 +90,11 @@ Return a JSON array where each element contains:
 • No trailing commas
 • All object keys must be quoted
 • Ensure proper nesting of objects and arrays
-• Return ONLY valid JSON array, no markdown or explanations
+• Return ONLY a valid JSON object, no markdown or explanations
 """
 
-        # Implementation Rules - How to use chunks and tools
-        self.implementation_rules = """
+# Implementation Rules - How to use chunks and tools
+_IMPLEMENTATION_RULES = """
 ## IMPLEMENTATION RULES
 
 ### Core Principles
@@ -138,102 +115,80 @@ Return a JSON array where each element contains:
 • MANDATORY: One unitCode = One unit object, regardless of how many buyers
 """
 
-        self.agent = Agent(
-            name="Contract Information Agent",
-            model=OpenAIChat(id=model),
-            instructions=(
-                "You are a document analysis expert specializing in structured data extraction from real estate contracts. "
-                "Extract specific property information and organize it by unique entities (units).\n\n"
-                + self.business_rules + "\n" + self.json_rules + "\n" + self.implementation_rules
-            ),
-            tools=[calculate_price_per_m2],
-            markdown=False
-        )
+_INSTRUCTIONS = (
+    "You are a document analysis expert specializing in structured data extraction from real estate contracts. "
+    "Extract specific property information and organize it by unique entities (units).\n\n"
+    + _BUSINESS_RULES + "\n" + _JSON_RULES + "\n" + _IMPLEMENTATION_RULES
+)
+
+
+def calculate_price_per_m2(sell_value: float, area_m2: float) -> float:
+    """
+    Calculate the price per square meter.
+    
+    Args:
+        sell_value: Total selling price/value
+        area_m2: Area in square meters
+    
+    Returns:
+        Price per square meter rounded to 2 decimal places
+    """
+    if area_m2 < 0:
+        raise ValueError("Area must be greater than 0")
+
+    if area_m2 == 0:
+        return 0.00
+    
+    price_per_m2 = sell_value / area_m2
+    return round(price_per_m2, 2)
+
+
+class ContractInformationAgent(BaseExtractionAgent):
+    """Agent that analyzes contract documents to extract structured property information."""
+    
+    prompt_cache_key = PROMPT_CACHE_KEY
+    output_schema = ContractExtraction
     
-    def extract_information(
+    def __init__(
         self,
-        chunks: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+        model: str = "gpt-4o-mini",
+        strong_model: Optional[str] = "gpt-4o",
+        result_cache: Optional[ResultCache] = DEFAULT_CACHE
+    ):
         """
-        Extract specific information from document chunks.
+        Initialize the contract information agent.
         
         Args:
-            chunks: List of document chunks with text, page, bbox, and element_type
-        
-        Returns:
-            Dictionary with extracted_data, sources, and confidence levels
+            model: The LLM model to use for the first pass
+            strong_model: Model re-running uncertain results (None disables escalation)
+            result_cache: Cache of previous results (defaults to the shared cache,
+                which is only enabled by GCB_AGENT_CACHE_DIR; None disables caching)
         """
-        # Create prompt with chunks and extraction request
-        prompt = self._build_extraction_prompt(chunks, self.fields_to_extract)
-        
-        # Run agent and get response
-        run_response = self.agent.run(prompt, stream=False)
+        self.model = model
+        self.result_cache = get_default_cache() if result_cache is DEFAULT_CACHE else result_cache
         
-        # Extract the content from the response
-        content = run_response.content
+        # Static prompt text is built once at import and shared by every instance
+        self.fields_to_extract = _FIELDS_TO_EXTRACT
+        self.business_rules = _BUSINESS_RULES
+        self.json_rules = _JSON_RULES
+        self.implementation_rules = _IMPLEMENTATION_RULES
         
-        # Parse JSON from the content
-        # The agent should return JSON, but may wrap it in markdown code blocks
-        if isinstance(content, str):
-            # Remove markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            # Try to parse JSON with better error handling
-            try:
-                result = json.loads(content)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Content preview: {content[:200]}...")
-                print(f"Error at position {e.pos}: {content[max(0, e.pos-50):e.pos+50]}")
-                
-                # Try to fix common JSON issues
-                content = self._fix_json_issues(content)
-                try:
-                    result = json.loads(content)
-                    print("✓ Fixed JSON and parsed successfully")
-                except json.JSONDecodeError as e2:
-                    print(f"Still failed to parse JSON: {e2}")
-                    # Return a minimal structure to prevent complete failure
-                    result = [{"unit": {}, "sources": [], "confidence": {}}]
-        else:
-            result = content
-        
-        return result
+        self.agent = self._build_agent(model)
+        self.strong_agent = self._build_agent(strong_model) if strong_model else None
     
-    def _fix_json_issues(self, content: str) -> str:
-        """
-        Try to fix common JSON issues in the agent's response.
-        
-        Args:
-            content: The JSON string that failed to parse
-            
-        Returns:
-            Potentially fixed JSON string
-        """
-        # Common fixes
-        fixes = [
-            # Fix trailing commas
-            (r',(\s*[}\]])', r'\1'),
-            # Fix missing quotes around keys
-            (r'(\w+):', r'"\1":'),
-            # Fix single quotes to double quotes
-            (r"'([^']*)'", r'"\1"'),
-            # Fix unescaped quotes in strings
-            (r'"(.*?)"(?=\s*:)', r'"\1"'),
-        ]
-        
-        import re
-        for pattern, replacement in fixes:
-            content = re.sub(pattern, replacement, content)
-        
-        return content
+    def _build_agent(self, model: str, structured: bool = True) -> Agent:
+        """Create the agno agent for ``model`` (free-form JSON unless ``structured``)."""
+        return Agent(
+            name="Contract Information Agent",
+            model=OpenAIChat(
+                id=model,
+                extra_body={"prompt_cache_key": self.prompt_cache_key}
+            ),
+            instructions=_INSTRUCTIONS,
+            tools=[calculate_price_per_m2],
+            output_schema=self.output_schema if structured else None,
+            markdown=False
+        )
     
     def get_field_descriptions(self) -> Dict[str, str]:
         """
@@ -244,36 +199,15 @@ Return a JSON array where each element contains:
         """
         return self.fields_to_extract.copy()
     
-    def _build_extraction_prompt(
-        self,
-        chunks: List[Dict[str, Any]],
-        fields_to_extract: Dict[str, str]
-    ) -> str:
-        """Build the prompt for information extraction."""
+    def _build_request_section(self) -> List[str]:
+        """Build the prompt lines describing the fields to extract."""
         prompt_parts = [
-            "# DOCUMENT CHUNKS",
-            "Below are chunks extracted from a document:",
-            ""
-        ]
-        
-        # Add all chunks with their full text content
-        for chunk in chunks:
-            chunk_id = chunk.get('chunk_id', 'unknown')
-            prompt_parts.extend([
-                f"[CHUNK ID: {chunk_id}]",
-                f"Type: {chunk['element_type']}",
-                f"Text:",
-                chunk['text'],
-                ""
-            ])
-        
-        prompt_parts.extend([
             "# EXTRACTION REQUEST",
-            "Extract the following information from the chunks above:",
+            "Extract the following information from the document chunks below:",
             ""
-        ])
+        ]
         
-        for field, field_info in fields_to_extract.items():
+        for field, field_info in self.fields_to_extract.items():
             if isinstance(field_info, dict):
                 description = field_info["description"]
                 field_type = field_info["type"]
@@ -298,17 +232,31 @@ Return a JSON array where each element contains:
             "• Information can be repeated between entities if the same"
         ])
         
-        return "\n".join(prompt_parts)
+        return prompt_parts
 
 
 def load_chunks(json_path: str) -> List[Dict[str, Any]]:
-    """Load document chunks from JSON file."""
-    with open(json_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load document chunks from JSON file (use ``iter_chunks`` to stream them instead)."""
+    return list(iter_chunks(json_path))
 
 
 def save_result(result: Dict[str, Any], output_path: str) -> None:
     """Save extraction result to JSON file."""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    dump_json(result, output_path)
+
+
+@functools.lru_cache(maxsize=8)
+def get_contract_agent(model: str = "gpt-4o-mini") -> ContractInformationAgent:
+    """
+    Return a shared ContractInformationAgent for ``model``.
 
+    Warm Lambda invocations reuse the same instance, and with it the OpenAI
+    HTTP connection pool, instead of rebuilding the agent every time.
+
+    Args:
+        model: The LLM model to use for the first pass
+
+    Returns:
+        The cached agent instance
+    """
+    return ContractInformationAgent(model=model)
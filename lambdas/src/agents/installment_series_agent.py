@@ -6,73 +6,63 @@ for units, including recurring and non-recurring payment patterns.
 """
 
 import json
-from typing import Dict, List, Any
+import functools
+from typing import Dict, List, Any, Optional
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
-import dotenv
 
-env = dotenv.load_dotenv()
+from .base_agent import BaseExtractionAgent, dump_json, iter_chunks, load_env_once
+from .result_cache import DEFAULT_CACHE, ResultCache, get_default_cache
+from .schemas import InstallmentExtraction
 
+load_env_once()
 
-class InstallmentSeriesAgent:
-    """
-    AI agent specialized in extracting installment series information from contract documents.
-    
-    This agent analyzes document chunks to identify payment schedules, installment patterns,
-    and series types for each unit in the contract.
-    """
-    
-    def __init__(self, model: str = "gpt-4o-mini"):
-        """
-        Initialize the Installment Series Agent.
-        
-        Args:
-            model: The OpenAI model to use for extraction
-        """
-        self.model = model
-        
-        # Define the fields to extract for installment series
-        self.fields_to_extract = {
-            "installmentPlans": {
-                "description": "Array of installment plans for each unit",
-                "type": "array",
-                "sub_fields": {
-                    "unitCode": {
-                        "description": "Unit identifier code",
-                        "type": "string",
-                    },
-                    "totalInstallments": {
-                        "description": "Total number of installments",
-                        "type": "integer",
-                    },
-                    "series": {
-                        "description": "Installment series type",
-                        "type": "string",
-                        "enum": ["MENSAL", "CHAVES", "ATO", "UNICA", "TRIMESTRAL", "ANUAL", "BIMESTRAL", "BIENAL"]
-                    },
-                    "indexerCode": {
-                        "description": "Indexer code for the installment plan",
-                        "type": "string",
-                        "enum": ["REAL", "INCC", "IPCA"]
-                    },
-                    "firstDueDate": {
-                        "description": "First due date of the installment plan - MUST be in ISO 8601 format (YYYY-MM-DD)",
-                        "type": "string",
-                    },
-                    "totalValue": {
-                        "description": "Total value of the installment plan",
-                        "type": "number",
-                    },
-                    "installmentAmount": {
-                        "description": "Amount per installment",
-                        "type": "number",
-                    }
-                }
+# OpenAI prompt cache key - bump the version when the rules below change
+PROMPT_CACHE_KEY = "installment_series_agent_v2"
+
+
+# Define the fields to extract for installment series
+_FIELDS_TO_EXTRACT = {
+    "installmentPlans": {
+        "description": "Array of installment plans for each unit",
+        "type": "array",
+        "sub_fields": {
+            "unitCode": {
+                "description": "Unit identifier code",
+                "type": "string",
+            },
+            "totalInstallments": {
+                "description": "Total number of installments",
+                "type": "integer",
+            },
+            "series": {
+                "description": "Installment series type",
+                "type": "string",
+                "enum": ["MENSAL", "CHAVES", "ATO", "UNICA", "TRIMESTRAL", "ANUAL", "BIMESTRAL", "BIENAL"]
+            },
+            "indexerCode": {
+                "description": "Indexer code for the installment plan",
+                "type": "string",
+                "enum": ["REAL", "INCC", "IPCA"]
+            },
+            "firstDueDate": {
+                "description": "First due date of the installment plan - MUST be in ISO 8601 format (YYYY-MM-DD)",
+                "type": "string",
+            },
+            "totalValue": {
+                "description": "Total value of the installment plan",
+                "type": "number",
+            },
+            "installmentAmount": {
+                "description": "Amount per installment",
+                "type": "number",
             }
         }
-        
-        # Business Rules - Domain-specific extraction rules
-        self.business_rules = """
+    }
+}
+
+# Business Rules - Domain-specific extraction rules
+_BUSINESS_RULES = """
 ## BUSINESS RULES - INSTALLMENT SERIES EXTRACTION
 
 ### Entity Identification Rules
@@ -83,7 +73,10 @@ class InstallmentSeriesAgent:
 - Different unitCodes = different entities
 - If no unitCode found, IGNORE that information
 - If a new UnitCode is found, create a new unit object
+"""
 
+# Installment-specific rules, also reused by the combined extraction agent
+_INSTALLMENT_RULES = """
 ### Installment Series Classification Rules
 **CRITICAL: MUST ALWAYS USE EXACT ENUM VALUES (MENSAL, TRIMESTRAL, ANUAL, BIMESTRAL, BIENAL, CHAVES, ATO, UNICA) - NO EXCEPTIONS**
 
@@ -119,14 +112,15 @@ class InstallmentSeriesAgent:
 - Extract installment amounts, dates, and indexer codes when available
 - All dates must be converted to ISO 8601 format (YYYY-MM-DD) before returning
 """
+_BUSINESS_RULES += _INSTALLMENT_RULES
 
-        # JSON Structure Rules - Technical implementation rules
-        self.json_rules = """
+# JSON Structure Rules - Technical implementation rules
+_JSON_RULES = """
 ## JSON STRUCTURE RULES
 
 ### Response Format
-- Return ONLY valid JSON array, no markdown or explanations
-- Each element must contain:
+- Return ONLY a valid JSON object with a 'units' array, no markdown or explanations
+- Each element of 'units' must contain:
   - 'unit': Object with unitCode and installmentPlans array
   - 'sources': Array of source citations for each field
   - 'confidence': Object with confidence levels (high/medium/low)
@@ -142,11 +136,11 @@ class InstallmentSeriesAgent:
 - No trailing commas
 - All object keys must be quoted
 - Ensure proper nesting of objects and arrays
-- Return ONLY the JSON array, no other text
+- Return ONLY the JSON object, no other text
 """
 
-        # Implementation Rules - How to use chunks and tools
-        self.implementation_rules = """
+# Implementation Rules - How to use chunks and tools
+_IMPLEMENTATION_RULES = """
 ## IMPLEMENTATION RULES
 
 ### Core Principles
@@ -156,7 +150,7 @@ class InstallmentSeriesAgent:
 - Always cite sources with chunk_id
 - Set confidence to LOW if uncertain about any information
 - Group related information by unique entity identifiers
-- Return ONLY valid JSON array, no markdown or explanations
+- Return ONLY a valid JSON object with a 'units' array, no markdown or explanations
 
 ### Chunk Processing
 - Use the EXACT [CHUNK ID: chunk_XXX] identifier shown in the prompt
@@ -169,15 +163,93 @@ class InstallmentSeriesAgent:
 - Group ALL installment information belonging to the same unitCode together
 """
 
-        # Agent instructions combining all rules
-        self.instructions = """
+# Agent instructions combining all rules
+_INSTRUCTIONS = """
 # INSTALLMENT SERIES EXTRACTION AGENT
-""" + self.business_rules + "\n" + self.json_rules + "\n" + self.implementation_rules
+""" + _BUSINESS_RULES + "\n" + _JSON_RULES + "\n" + _IMPLEMENTATION_RULES
+
+
+# Example of the expected response, serialized once at import
+_INSTALLMENT_EXAMPLE_JSON = json.dumps({
+    "units": [
+        {
+            "unit": {
+                "unitCode": "string",
+                "installmentPlans": [
+                    {
+                        "totalInstallments": "integer",
+                        "series": "string (enum)",
+                        "indexerCode": "string (optional)",
+                        "firstDueDate": "string (ISO 8601 format - YYYY-MM-DD)",
+                        "totalValue": "number (optional)",
+                        "installmentAmount": "number (optional)"
+                    }
+                ]
+            },
+            "sources": [
+                {
+                    "field": "string",
+                    "chunk_id": "string"
+                }
+            ],
+            "confidence": {
+                "unitCode": "high/medium/low",
+                "installmentPlans": "high/medium/low"
+            }
+        }
+    ]
+}, indent=2)
+
+
+class InstallmentSeriesAgent(BaseExtractionAgent):
+    """
+    AI agent specialized in extracting installment series information from contract documents.
+    
+    This agent analyzes document chunks to identify payment schedules, installment patterns,
+    and series types for each unit in the contract.
+    """
+    
+    prompt_cache_key = PROMPT_CACHE_KEY
+    output_schema = InstallmentExtraction
+    
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        strong_model: Optional[str] = "gpt-4o",
+        result_cache: Optional[ResultCache] = DEFAULT_CACHE
+    ):
+        """
+        Initialize the Installment Series Agent.
         
-        self.agent = Agent(
+        Args:
+            model: The OpenAI model to use for the first extraction pass
+            strong_model: Model re-running uncertain results (None disables escalation)
+            result_cache: Cache of previous results (defaults to the shared cache,
+                which is only enabled by GCB_AGENT_CACHE_DIR; None disables caching)
+        """
+        self.model = model
+        self.result_cache = get_default_cache() if result_cache is DEFAULT_CACHE else result_cache
+        
+        # Static prompt text is built once at import and shared by every instance
+        self.fields_to_extract = _FIELDS_TO_EXTRACT
+        self.business_rules = _BUSINESS_RULES
+        self.json_rules = _JSON_RULES
+        self.implementation_rules = _IMPLEMENTATION_RULES
+        self.instructions = _INSTRUCTIONS
+        
+        self.agent = self._build_agent(model)
+        self.strong_agent = self._build_agent(strong_model) if strong_model else None
+    
+    def _build_agent(self, model: str, structured: bool = True) -> Agent:
+        """Create the agno agent for ``model`` (free-form JSON unless ``structured``)."""
+        return Agent(
             name="Installment Series Agent",
-            model=OpenAIChat(id=model),
+            model=OpenAIChat(
+                id=model,
+                extra_body={"prompt_cache_key": self.prompt_cache_key}
+            ),
             instructions=self.instructions,
+            output_schema=self.output_schema if structured else None,
             markdown=False
         )
     
@@ -185,86 +257,11 @@ class InstallmentSeriesAgent:
         """Get descriptions of fields this agent extracts."""
         return {field: info["description"] for field, info in self.fields_to_extract.items()}
     
-    def extract_information(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """
-        Extract installment series information from document chunks.
-        
-        Args:
-            chunks: List of document chunks to analyze
-            
-        Returns:
-            List containing extracted installment series information
-        """
-        # Create prompt with chunks and extraction request
-        prompt = self._build_extraction_prompt(chunks)
-        
-        # Run agent and get response
-        run_response = self.agent.run(prompt, stream=False)
-        
-        # Extract the content from the response
-        content = run_response.content
-        
-        # Parse JSON from the content
-        # The agent should return JSON, but may wrap it in markdown code blocks
-        if isinstance(content, str):
-            # Remove markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            # Try to parse JSON with better error handling
-            try:
-                result = json.loads(content)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Content preview: {content[:200]}...")
-                print(f"Error at position {e.pos}: {content[max(0, e.pos-50):e.pos+50]}")
-                
-                # Try to fix common JSON issues
-                content = self._fix_json_issues(content)
-                try:
-                    result = json.loads(content)
-                    print("✓ Fixed JSON and parsed successfully")
-                except json.JSONDecodeError as e2:
-                    print(f"Still failed to parse JSON: {e2}")
-                    # Return a minimal structure to prevent complete failure
-                    result = [{"unit": {}, "sources": [], "confidence": {}}]
-        else:
-            result = content
-        
-        # Ensure result is a list
-        if not isinstance(result, list):
-            result = [result]
-        
-        return result
-    
-    def _build_extraction_prompt(self, chunks: List[Dict[str, Any]]) -> str:
-        """Build the extraction prompt from document chunks."""
-        prompt_parts = [
-            "# DOCUMENT CHUNKS",
-            "Below are chunks extracted from a document:",
-            ""
-        ]
-        
-        # Add all chunks with their full text content
-        for chunk in chunks:
-            chunk_id = chunk.get('chunk_id', 'unknown')
-            prompt_parts.extend([
-                f"[CHUNK ID: {chunk_id}]",
-                f"Type: {chunk['element_type']}",
-                f"Text:",
-                chunk['text'],
-                ""
-            ])
-        
-        prompt_parts.extend([
+    def _build_request_section(self) -> List[str]:
+        """Build the prompt lines describing the installment extraction request."""
+        return [
             "# EXTRACTION REQUEST",
-            "Extract installment series information from the chunks above:",
+            "Extract installment series information from the document chunks below:",
             "",
             "## Document Analysis",
             "• Analyze the document to identify ALL entities (units/properties) present",
@@ -280,74 +277,14 @@ class InstallmentSeriesAgent:
             "• Information can be repeated between entities if the same",
             "",
             "Return the result as valid JSON with the following structure:",
-            json.dumps([
-                {
-                    "unit": {
-                        "unitCode": "string",
-                        "installmentPlans": [
-                            {
-                                "totalInstallments": "integer",
-                                "series": "string (enum)",
-                                "indexerCode": "string (optional)",
-                                "firstDueDate": "string (ISO 8601 format - YYYY-MM-DD)",
-                                "totalValue": "number (optional)",
-                                "installmentAmount": "number (optional)"
-                            }
-                        ]
-                    },
-                    "sources": [
-                        {
-                            "field": "string",
-                            "chunk_id": "string"
-                        }
-                    ],
-                    "confidence": {
-                        "unitCode": "high/medium/low",
-                        "installmentPlans": "high/medium/low"
-                    }
-                }
-            ], indent=2)
-        ])
-        
-        return "\n".join(prompt_parts)
-    
-    
-    def _fix_json_issues(self, content: str) -> str:
-        """
-        Try to fix common JSON issues in the agent's response.
-        
-        Args:
-            content: The JSON string that failed to parse
-            
-        Returns:
-            Potentially fixed JSON string
-        """
-        import re
-        
-        # Common fixes
-        fixes = [
-            # Fix trailing commas
-            (r',(\s*[}\]])', r'\1'),
-            # Fix missing quotes around keys
-            (r'(\w+):', r'"\1":'),
-            # Fix single quotes to double quotes
-            (r"'([^']*)'", r'"\1"'),
-            # Fix unescaped quotes in strings
-            (r'"(.*?)"(?=\s*:)', r'"\1"'),
+            _INSTALLMENT_EXAMPLE_JSON
         ]
-        
-        for pattern, replacement in fixes:
-            content = re.sub(pattern, replacement, content)
-        
-        return content
 
 
 def load_chunks(file_path: str) -> List[Dict[str, Any]]:
     """Load document chunks from a JSON file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('chunks', [])
+        return list(iter_chunks(file_path))
     except Exception as e:
         print(f"Error loading chunks: {e}")
         return []
@@ -356,8 +293,24 @@ def load_chunks(file_path: str) -> List[Dict[str, Any]]:
 def save_result(result: Dict[str, Any], file_path: str) -> None:
     """Save extraction result to a JSON file."""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        dump_json(result, file_path)
         print(f"✓ Installment series result saved to {file_path}")
     except Exception as e:
         print(f"Error saving result: {e}")
+
+
+@functools.lru_cache(maxsize=8)
+def get_installment_agent(model: str = "gpt-4o-mini") -> InstallmentSeriesAgent:
+    """
+    Return a shared InstallmentSeriesAgent for ``model``.
+
+    Warm Lambda invocations reuse the same instance, and with it the OpenAI
+    HTTP connection pool, instead of rebuilding the agent every time.
+
+    Args:
+        model: The LLM model to use for the first pass
+
+    Returns:
+        The cached agent instance
+    """
+    return InstallmentSeriesAgent(model=model)
@@ -0,0 +1,92 @@
+"""
+Helpers to run extraction agents concurrently.
+
+Every extraction is a network-bound LLM call, so awaiting several of them together
+turns the total latency into roughly the latency of the slowest call.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Tuple
+
+from .base_agent import BaseExtractionAgent
+from .contract_information_agent import ContractInformationAgent, get_contract_agent
+from .installment_series_agent import InstallmentSeriesAgent, get_installment_agent
+
+# Upper bound of LLM requests in flight at the same time (OpenAI rate limits)
+MAX_CONCURRENT_REQUESTS = 8
+
+
+async def gather_limited(
+    coros: Iterable[Awaitable[Any]],
+    max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS
+) -> List[Any]:
+    """
+    Await coroutines concurrently, keeping at most ``max_concurrent_requests`` running.
+
+    Args:
+        coros: Coroutines to await
+        max_concurrent_requests: Maximum number of coroutines running at once
+
+    Returns:
+        List of results in the same order as ``coros``
+    """
+    # Created per call: a semaphore is bound to the event loop that first uses it
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def _limited(coro: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(_limited(coro) for coro in coros))
+
+
+async def extract_both(
+    chunks: List[Dict[str, Any]],
+    contract_agent: Optional[ContractInformationAgent] = None,
+    installment_agent: Optional[InstallmentSeriesAgent] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Run the contract information and installment series agents on the same document concurrently.
+
+    Args:
+        chunks: List of document chunks
+        contract_agent: Agent used for contract fields (shared default agent if not provided)
+        installment_agent: Agent used for installment plans (shared default agent if not provided)
+
+    Returns:
+        Tuple of (contract_result, installment_result)
+    """
+    contract_agent = contract_agent or get_contract_agent()
+    installment_agent = installment_agent or get_installment_agent()
+
+    contract_result, installment_result = await asyncio.gather(
+        contract_agent.aextract_information(chunks),
+        installment_agent.aextract_information(chunks)
+    )
+
+    return contract_result, installment_result
+
+
+async def extract_documents(
+    agent: BaseExtractionAgent,
+    docs: List[List[Dict[str, Any]]],
+    max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run one agent over many documents concurrently.
+
+    The same agent instance (and therefore the same underlying async OpenAI
+    client) is reused for every document.
+
+    Args:
+        agent: Extraction agent to use
+        docs: List of documents, each one a list of chunks
+        max_concurrent_requests: Maximum number of LLM calls in flight
+
+    Returns:
+        List of extraction results, element i corresponding to docs[i]
+    """
+    return await gather_limited(
+        (agent.aextract_information(chunks) for chunks in docs),
+        max_concurrent_requests=max_concurrent_requests
+    )
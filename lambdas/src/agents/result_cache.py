@@ -0,0 +1,167 @@
+"""
+Content-addressed cache for extraction results.
+
+Re-processing the same contract (re-uploads, SQS retries, pipeline re-runs) would
+otherwise pay the full LLM round trip again. Results are stored under the SHA256 of
+the model, agent prompt and chunks, in memory and on disk so they survive Lambda
+warm restarts. The shared cache is opt-in: it is only enabled when
+GCB_AGENT_CACHE_DIR is set.
+
+An optional semantic tier embeds the document text and serves near-duplicate
+documents whose cosine similarity is above a threshold.
+"""
+
+import copy
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Embedding model used by the optional semantic tier
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Text beyond this length is not embedded (keeps inside the embedding model context)
+MAX_EMBEDDING_CHARS = 24000
+
+
+def make_cache_key(model: str, agent_version: str, chunks: List[Dict[str, Any]]) -> str:
+    """
+    Build the exact-match cache key of an extraction.
+
+    Args:
+        model: LLM model id
+        agent_version: Version of the agent prompt (its prompt cache key)
+        chunks: Document chunks sent to the agent
+
+    Returns:
+        Hex SHA256 digest
+    """
+    payload = json.dumps({"m": model, "v": agent_version, "c": chunks}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of extraction results.
+
+    Attributes:
+        cache_dir: Directory holding one JSON file per cached result
+        semantic_threshold: Minimum cosine similarity for a semantic hit (None disables the tier)
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, semantic_threshold: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Cache directory (defaults to GCB_AGENT_CACHE_DIR or ~/.cache/gcb-agents)
+            semantic_threshold: Cosine similarity threshold (e.g. 0.97) to enable the semantic tier
+        """
+        self.cache_dir = Path(cache_dir or os.getenv("GCB_AGENT_CACHE_DIR") or Path.home() / ".cache" / "gcb-agents")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.semantic_threshold = semantic_threshold
+
+        self._memory: Dict[str, Any] = {}
+        # Semantic index of (key, normalized embedding) - kept per container
+        self._embeddings: List[Tuple[str, Any]] = []
+        self._openai_client = None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the cached result for ``key``, or None on a miss."""
+        # Callers mutate results (e.g. merging installment sources), so never hand out the stored object
+        if key in self._memory:
+            return copy.deepcopy(self._memory[key])
+
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        self._memory[key] = value
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Any, embedding: Optional[Any] = None) -> None:
+        """
+        Store a result.
+
+        Args:
+            key: Exact-match cache key
+            value: Extraction result (must be JSON serializable)
+            embedding: Embedding returned by ``get_similar`` to index the result semantically
+        """
+        self._memory[key] = copy.deepcopy(value)
+
+        try:
+            with open(self.cache_dir / f"{key}.json", 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"⚠️  Warning: Failed to persist cached result: {e}")
+
+        if embedding is not None:
+            self._embeddings.append((key, embedding))
+
+    def get_similar(self, text: str) -> Tuple[Optional[Any], Optional[Any]]:
+        """
+        Look up a semantically similar cached result.
+
+        Args:
+            text: Concatenated document text
+
+        Returns:
+            Tuple of (cached result or None, embedding of ``text`` or None).
+            The embedding should be passed back to ``put`` on a miss.
+        """
+        if self.semantic_threshold is None:
+            return None, None
+
+        import numpy as np
+
+        embedding = np.asarray(self._embed(text), dtype=np.float32)
+        embedding /= np.linalg.norm(embedding) or 1.0
+
+        best_key, best_score = None, -1.0
+        for key, other in self._embeddings:
+            score = float(np.dot(embedding, other))
+            if score > best_score:
+                best_key, best_score = key, score
+
+        if best_key is not None and best_score >= self.semantic_threshold:
+            print(f"✓ Semantic cache hit (similarity {best_score:.3f})")
+            return self.get(best_key), embedding
+
+        return None, embedding
+
+    def _embed(self, text: str) -> List[float]:
+        """Compute the embedding of ``text`` with the OpenAI embeddings API."""
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI()
+
+        response = self._openai_client.embeddings.create(model=EMBEDDING_MODEL, input=text[:MAX_EMBEDDING_CHARS])
+        return response.data[0].embedding
+
+
+# Default of the agents' ``result_cache`` argument: use ``get_default_cache()``.
+# Distinct from None, which disables caching.
+DEFAULT_CACHE: Any = object()
+
+_default_cache: Optional[ResultCache] = None
+
+
+def get_default_cache() -> Optional[ResultCache]:
+    """
+    Return the process-wide result cache shared by all agents.
+
+    Returns:
+        The shared cache stored in GCB_AGENT_CACHE_DIR, or None when the variable
+        is not set (caching disabled)
+    """
+    global _default_cache
+    if _default_cache is None:
+        cache_dir = os.getenv("GCB_AGENT_CACHE_DIR")
+        if not cache_dir:
+            return None
+        _default_cache = ResultCache(cache_dir)
+    return _default_cache
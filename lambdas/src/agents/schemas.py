@@ -0,0 +1,127 @@
+"""
+Response schemas of the extraction agents.
+
+Passed to agno as ``output_schema`` so OpenAI structured outputs guarantee a
+schema-valid answer. Strict mode needs every property to be required and objects
+to be closed, so optional values are ``Optional`` without defaults and confidence
+levels are explicit fields instead of a free-form dictionary. Top-level arrays are
+not allowed either, hence the ``units`` wrapper models.
+"""
+
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+Confidence = Optional[Literal["high", "medium", "low"]]
+
+Series = Literal["MENSAL", "CHAVES", "ATO", "UNICA", "TRIMESTRAL", "ANUAL", "BIMESTRAL", "BIENAL"]
+
+IndexerCode = Literal["REAL", "INCC", "IPCA"]
+
+
+class Source(BaseModel):
+    """Citation of the chunk a field value was read from."""
+
+    field: str
+    chunk_id: str
+
+
+class InstallmentPlan(BaseModel):
+    """One installment series of a unit."""
+
+    totalInstallments: Optional[int]
+    series: Optional[Series]
+    indexerCode: Optional[IndexerCode]
+    firstDueDate: Optional[str]
+    totalValue: Optional[float]
+    installmentAmount: Optional[float]
+
+
+class ContractUnit(BaseModel):
+    """Contract fields of a unit."""
+
+    unitCode: Optional[str]
+    sellValue: Optional[float]
+    buyerName: Optional[str]
+    areaM2: Optional[float]
+    pricePerM2: Optional[float]
+    signingDate: Optional[str]
+
+
+class ContractConfidence(BaseModel):
+    """Confidence level of each contract field."""
+
+    unitCode: Confidence
+    sellValue: Confidence
+    buyerName: Confidence
+    areaM2: Confidence
+    pricePerM2: Confidence
+    signingDate: Confidence
+
+
+class ContractUnitResult(BaseModel):
+    """Extraction result of one unit by the contract information agent."""
+
+    unit: ContractUnit
+    sources: List[Source]
+    confidence: ContractConfidence
+
+
+class ContractExtraction(BaseModel):
+    """Response of the contract information agent."""
+
+    units: List[ContractUnitResult]
+
+
+class InstallmentUnit(BaseModel):
+    """Installment plans of a unit."""
+
+    unitCode: Optional[str]
+    installmentPlans: List[InstallmentPlan]
+
+
+class InstallmentConfidence(BaseModel):
+    """Confidence level of the installment fields."""
+
+    unitCode: Confidence
+    installmentPlans: Confidence
+
+
+class InstallmentUnitResult(BaseModel):
+    """Extraction result of one unit by the installment series agent."""
+
+    unit: InstallmentUnit
+    sources: List[Source]
+    confidence: InstallmentConfidence
+
+
+class InstallmentExtraction(BaseModel):
+    """Response of the installment series agent."""
+
+    units: List[InstallmentUnitResult]
+
+
+class CombinedUnit(ContractUnit):
+    """Contract fields and installment plans of a unit."""
+
+    installmentPlans: List[InstallmentPlan]
+
+
+class CombinedConfidence(ContractConfidence):
+    """Confidence level of every combined field."""
+
+    installmentPlans: Confidence
+
+
+class CombinedUnitResult(BaseModel):
+    """Extraction result of one unit by the combined extraction agent."""
+
+    unit: CombinedUnit
+    sources: List[Source]
+    confidence: CombinedConfidence
+
+
+class CombinedExtraction(BaseModel):
+    """Response of the combined extraction agent."""
+
+    units: List[CombinedUnitResult]
@@ -1,23 +1,231 @@
 """Extract cutout images from PDF based on extraction results."""
 
 import fitz  # PyMuPDF
+import numpy as np
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+try:
+    from PIL import Image
+except ImportError:  # Pillow ships with docling; MuPDF encodes the PNGs without it
+    Image = None
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+import hashlib
+import io
 import json
+import logging
+import os
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Per-cutout messages go through logging: debug lines are skipped without being
+# formatted unless enabled, and extract_cutouts prints a single summary instead
+logger = logging.getLogger(__name__)
+
+# zlib level of the cutout PNGs. Cutouts are short-lived artifacts uploaded for
+# review, so encoding speed matters far more than file size.
+PNG_COMPRESS_LEVEL = zlib.Z_BEST_SPEED
+
+# Pillow PNG options, built once. Z_RLE suits the long runs of background pixels
+# of document cutouts: as fast as the default strategy at this level, about
+# half the size. ``optimize`` would add a second, much slower pass.
+_PNG_SAVE_OPTIONS = {
+    "format": "PNG",
+    "compress_level": PNG_COMPRESS_LEVEL,
+    "compress_type": zlib.Z_RLE,
+    "optimize": False,
+}
+
+# Quality of the cutouts saved as JPEG (image_format="jpeg")
+JPEG_QUALITY = 85
+
+# Minimum share of both the bbox and an embedded image that must overlap for the
+# image to be copied as the cutout instead of rendering the region
+EMBEDDED_IMAGE_MIN_OVERLAP = 0.95
+
+# Extensions a cutout can be saved with (rendered PNG or copied embedded image)
+CACHED_CUTOUT_EXTENSIONS = ('.png', '.jpeg')
+
+# Cutouts whose pixels are (almost) all gray are saved as 8-bit grayscale, and as
+# 1-bit when (almost) all pixels are also near black or white
+GRAYSCALE_MAX_SPREAD = 8
+BILEVEL_MARGIN = 32
+QUANTIZE_MIN_SHARE = 0.99
+
+# The cutouts of a page are sliced from a single render of the union of their
+# boxes, unless the boxes are scattered (union larger than this multiple of their
+# summed areas), in which case each box is rendered on its own
+UNION_MAX_AREA_RATIO = 4.0
+# Unions covering at least this share of the page render (and cache) the whole page
+FULL_PAGE_MIN_SHARE = 0.5
+
+
+def _to_image(region: np.ndarray) -> "Image.Image":
+    """
+    Build the image of a cutout, quantized when the content allows it.
+    
+    Black-on-white text is stored as 1-bit, other gray content as 8-bit
+    grayscale and anything with color as RGB. Fewer channels make both the
+    PNG encoding and the file smaller.
+    
+    Args:
+        region: Cutout pixels as a (height, width, channels) uint8 array
+    
+    Returns:
+        PIL image of the cutout
+    """
+    if region.ndim != 3 or region.shape[2] != 3 or region.size == 0:
+        return Image.fromarray(region)
+    
+    min_pixels = QUANTIZE_MIN_SHARE * region.shape[0] * region.shape[1]
+    
+    spread = region.max(axis=2) - region.min(axis=2)
+    if np.count_nonzero(spread < GRAYSCALE_MAX_SPREAD) < min_pixels:
+        return Image.fromarray(region)
+    
+    # Green is the channel closest to perceived luminance
+    gray = np.ascontiguousarray(region[:, :, 1])
+    bilevel = np.count_nonzero((gray < BILEVEL_MARGIN) | (gray > 255 - BILEVEL_MARGIN))
+    if bilevel >= min_pixels:
+        return Image.fromarray(gray > 127)
+    
+    return Image.fromarray(gray)
+
+
+def _encode_region(region: np.ndarray, image_format: str = "png") -> Tuple[Any, str]:
+    """
+    Encode cutout pixels in the requested format, keeping text lossless.
+    
+    With ``image_format="jpeg"`` only color content (photos, logos, stamps) is
+    saved as JPEG. Text quantizes to grayscale or 1-bit and stays PNG, which is
+    both smaller and sharp for those.
+    
+    Args:
+        region: Cutout pixels as a (height, width, channels) uint8 array
+        image_format: "png" or "jpeg"
+    
+    Returns:
+        Tuple of (encoded bytes or memoryview, extension)
+    """
+    if image_format != "jpeg" or Image is None:
+        return _encode_png(region), ".png"
+    
+    image = _to_image(region)
+    buffer = io.BytesIO()
+    if image.mode == "RGB":
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+        return buffer.getbuffer(), ".jpeg"
+    
+    image.save(buffer, **_PNG_SAVE_OPTIONS)
+    return buffer.getbuffer(), ".png"
+
+
+def _encode_png(region: np.ndarray):
+    """
+    PNG-encode cutout pixels straight from the raw samples, in a single pass.
+    
+    Favors encoding speed over file size (fastest zlib level, no optimize pass):
+    cutouts only live until they are uploaded.
+    
+    Args:
+        region: Cutout pixels as a (height, width, channels) uint8 array
+    
+    Returns:
+        Encoded PNG bytes (bytes or memoryview)
+    """
+    if Image is None:
+        # Only MuPDF is available: wrap the samples in a Pixmap and let it encode them
+        region = np.ascontiguousarray(region)
+        colorspace = fitz.csGRAY if region.shape[2] == 1 else fitz.csRGB
+        pix = fitz.Pixmap(colorspace, region.shape[1], region.shape[0], region.tobytes(), region.shape[2] == 4)
+        return pix.tobytes("png")
+    
+    buffer = io.BytesIO()
+    _to_image(region).save(buffer, **_PNG_SAVE_OPTIONS)
+    return buffer.getbuffer()
+
+
+def _write_bytes(path: str, data) -> None:
+    """
+    Write an encoded image to ``path`` without going through a buffered file object.
+    
+    Args:
+        path: Output file path
+        data: Encoded bytes (bytes or memoryview)
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+# Extractor owned by each process-pool worker (see CutoutExtractor.extract_cutouts)
+_worker_extractor: Optional["CutoutExtractor"] = None
+
+
+def _init_worker(pdf_path: str, pdf_bytes: Optional[bytes] = None) -> None:
+    """Open the PDF once per worker process."""
+    global _worker_extractor
+    _worker_extractor = CutoutExtractor(pdf_path, pdf_bytes=pdf_bytes)
+
+
+def _extract_page_cutouts_in_worker(**kwargs) -> List[Any]:
+    """Run ``_extract_page_cutouts`` on the worker's own document."""
+    return _worker_extractor._extract_page_cutouts(**kwargs)
 
 
 class CutoutExtractor:
     """Extract image cutouts from PDF based on bounding boxes."""
     
-    def __init__(self, pdf_path: str):
+    def __init__(
+        self,
+        pdf_path: str,
+        max_cached_pages: int = 8,
+        cache_dir: Optional[str] = None,
+        pdf_bytes: Optional[bytes] = None
+    ):
         """
         Initialize the cutout extractor.
         
         Args:
             pdf_path: Path to the PDF file
+            max_cached_pages: Number of rendered pages kept in memory for reuse
+            cache_dir: Directory of previously extracted cutouts (defaults to
+                GCB_CUTOUT_CACHE_DIR; the cache is disabled when neither is set, so
+                nothing accumulates in Lambda's /tmp across warm invocations)
+            pdf_bytes: Content of the PDF, when it is held in memory instead of
+                being read from ``pdf_path``
         """
         self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
+        self.pdf_bytes = pdf_bytes
+        # Explicit filetype: no content sniffing, and a clear error for non-PDF input
+        if pdf_bytes is not None:
+            self.doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        else:
+            self.doc = fitz.open(pdf_path, filetype="pdf")
+        
+        cache_dir = cache_dir or os.getenv("GCB_CUTOUT_CACHE_DIR")
+        self.cache_dir: Optional[Path] = Path(cache_dir) if cache_dir else None
+        # SHA256 prefix of the PDF content, computed on first use
+        self._pdf_hash: Optional[str] = None
+        
+        # Rendered pages keyed by (page_idx, scale), least recently used first
+        self.max_cached_pages = max_cached_pages
+        self._page_cache: "OrderedDict[Tuple[int, float], np.ndarray]" = OrderedDict()
+        # Display lists of the pages, so rendering several regions of a page (or the
+        # same page at another scale) interprets its content stream only once
+        self._display_lists: "OrderedDict[int, fitz.DisplayList]" = OrderedDict()
+        # fitz.Document is not thread-safe: rendering is serialized, encoding is not
+        self._render_lock = threading.Lock()
     
     def extract_cutouts(
         self,
@@ -25,8 +233,11 @@ class CutoutExtractor:
         output_dir: str = "/tmp/cutouts",
         padding: int = 5,
         scale: float = 2.0,
-        chunks: List[Dict[str, Any]] = None
-    ) -> Dict[str, List[str]]:
+        chunks: List[Dict[str, Any]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        image_format: str = "png"
+    ) -> Dict[Tuple[int, str], List[str]]:
         """
         Extract cutout images for each extracted field.
         
@@ -36,18 +247,125 @@ class CutoutExtractor:
             padding: Padding in pixels around the bounding box
             scale: Scale factor for image quality (higher = better quality)
             chunks: List of document chunks to get page and bbox information
+            max_workers: Workers rendering and encoding pages (defaults to the CPU count)
+            use_processes: Rasterize in worker processes, each with its own copy of the
+                document, instead of threads. MuPDF holds the GIL while rendering, so this
+                scales better on many-page documents; not available on AWS Lambda
+                (no /dev/shm for multiprocessing)
+            image_format: Encoding of rendered cutouts: "png", or "jpeg" to save the
+                ones with color content as JPEG (text stays PNG)
         
         Returns:
-            Dictionary mapping field names to lists of cutout image paths
+            Dictionary mapping (unit number, field name) to lists of cutout image paths
         """
         # Create output directory
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
+        # Cutout paths are built by string concatenation from this prefix,
+        # without a Path object and str() conversion per cutout
+        output_prefix = os.path.join(os.fspath(output_path), "")
+        
+        cutout_paths = {}
+        extracted = failed = 0
+        
+        for page_cutouts, results in self._iter_page_results(
+            extraction_result, chunks, padding, scale, max_workers, use_processes, image_format, output_prefix
+        ):
+            for (unit_idx, field, _, _), cutout_path in zip(page_cutouts, results):
+                if cutout_path:
+                    field_key = (unit_idx + 1, field)
+                    if field_key not in cutout_paths:
+                        cutout_paths[field_key] = []
+                    cutout_paths[field_key].append(cutout_path)
+                    extracted += 1
+                    logger.debug("Added cutout for %s (unit %d)", field, unit_idx + 1)
+                else:
+                    failed += 1
+                    logger.warning("Failed to extract cutout for %s (unit %d)", field, unit_idx + 1)
+        
+        print(f"✓ Extracted {extracted} cutouts ({failed} failed)")
+        return cutout_paths
+    
+    def iter_cutouts(
+        self,
+        extraction_result: Dict[str, Any],
+        padding: int = 5,
+        scale: float = 2.0,
+        chunks: List[Dict[str, Any]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        image_format: str = "png"
+    ) -> Iterator[Tuple[Tuple[int, str], bytes, str]]:
+        """
+        Extract cutout images for each extracted field, in memory.
         
+        Same as ``extract_cutouts`` but nothing is written to the output
+        directory: encoded images are yielded page by page as soon as they are
+        ready, so they can be uploaded while later pages are still rendered.
+        
+        Args:
+            extraction_result: The extraction result with sources
+            padding: Padding in pixels around the bounding box
+            scale: Scale factor for image quality (higher = better quality)
+            chunks: List of document chunks to get page and bbox information
+            max_workers: Workers rendering and encoding pages (defaults to the CPU count)
+            use_processes: Rasterize in worker processes (see ``extract_cutouts``)
+            image_format: Encoding of rendered cutouts (see ``extract_cutouts``)
+        
+        Returns:
+            Iterator over (field_key, encoded image bytes, extension) tuples,
+            e.g. ((1, "sellValue"), b"...", ".png")
+        """
+        extracted = failed = 0
+        
+        for page_cutouts, results in self._iter_page_results(
+            extraction_result, chunks, padding, scale, max_workers, use_processes, image_format, None
+        ):
+            for (unit_idx, field, _, _), encoded in zip(page_cutouts, results):
+                if encoded is None:
+                    failed += 1
+                    logger.warning("Failed to extract cutout for %s (unit %d)", field, unit_idx + 1)
+                    continue
+                extracted += 1
+                data, ext = encoded
+                yield (unit_idx + 1, field), data, ext
+        
+        print(f"✓ Extracted {extracted} cutouts ({failed} failed)")
+    
+    def _iter_page_results(
+        self,
+        extraction_result: Dict[str, Any],
+        chunks: Optional[List[Dict[str, Any]]],
+        padding: int,
+        scale: float,
+        max_workers: Optional[int],
+        use_processes: bool,
+        image_format: str,
+        output_prefix: Optional[str]
+    ) -> Iterator[Tuple[List[Tuple[int, str, str, List[float]]], List[Any]]]:
+        """
+        Extract the cutouts of every page concurrently.
+        
+        Args:
+            extraction_result: The extraction result with sources
+            chunks: List of document chunks to get page and bbox information
+            padding: Padding in pixels around the bounding box
+            scale: Scale factor
+            max_workers: Workers rendering and encoding pages
+            use_processes: Rasterize in worker processes instead of threads
+            image_format: Encoding of rendered cutouts ("png" or "jpeg")
+            output_prefix: Output directory with a trailing separator (None keeps the
+                cutouts in memory)
+        
+        Returns:
+            Iterator over (cutouts of a page, their results) in page submission order,
+            see ``_extract_page_cutouts``
+        """
         # Store chunks for lookup
         self.chunks = chunks or []
         
-        cutout_paths = {}
+        # Page and parsed bbox of every chunk, resolved once per chunk
+        self._chunk_locations = self._build_chunk_locations(self.chunks)
         
         # Handle new array structure
         if isinstance(extraction_result, list):
@@ -56,10 +374,98 @@ class CutoutExtractor:
             # Fallback for old structure
             units_data = extraction_result.get('units', [extraction_result])
         
+        # Group the cutouts by page so each page is rendered only once
+        # however many cutouts it holds
+        cutouts_by_page: Dict[int, List[Tuple[int, str, str, List[float]]]] = {}
+        for unit_idx, field, chunk_id, page_num, bbox in self._resolve_cutouts(units_data):
+            cutouts_by_page.setdefault(page_num, []).append((unit_idx, field, chunk_id, bbox))
+        
+        # Cutouts of this PDF extracted by previous runs are reused from disk (opt-in)
+        cache_prefix = None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            cache_prefix = str(self.cache_dir / self._get_pdf_hash())
+        
+        # Threads: PNG encoding and file writes release the GIL, so pages are processed
+        # concurrently while the rasterization itself stays serialized.
+        # Processes: every worker opens the PDF once and rasterizes in parallel.
+        if use_processes:
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                initializer=_init_worker,
+                initargs=(self.pdf_path, self.pdf_bytes)
+            )
+            extract_page_cutouts = _extract_page_cutouts_in_worker
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+            extract_page_cutouts = self._extract_page_cutouts
+        
+        with executor:
+            futures = [
+                (cutouts, executor.submit(
+                    extract_page_cutouts,
+                    page_num=page_num,
+                    cutouts=cutouts,
+                    output_prefix=output_prefix,
+                    padding=padding,
+                    scale=scale,
+                    cache_prefix=cache_prefix,
+                    image_format=image_format
+                ))
+                for page_num, cutouts in cutouts_by_page.items()
+            ]
+            
+            # Yielded in submission order so the result does not depend on thread timing
+            for cutouts, future in futures:
+                yield cutouts, future.result()
+    
+    def _build_chunk_locations(
+        self,
+        chunks: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[Any, Optional[List[float]], Any]]:
+        """
+        Index the location of every chunk by chunk_id.
+        
+        Args:
+            chunks: List of document chunks
+        
+        Returns:
+            Dictionary mapping chunk_id to (page number, parsed bbox or None, raw bbox);
+            the first chunk with a given ID wins
+        """
+        # Parse every chunk bbox up-front in one vectorized pass
+        rows, table = self._build_bbox_table(chunks)
+        parsed = ~np.isnan(table).any(axis=1)
+        bboxes = table.tolist()
+        
+        return {
+            chunk_id: (chunks[row].get('page'), bboxes[row] if parsed[row] else None, chunks[row].get('bbox'))
+            for chunk_id, row in rows.items()
+        }
+    
+    def _resolve_cutouts(
+        self,
+        units_data: List[Dict[str, Any]]
+    ) -> List[Tuple[int, str, str, int, List[float]]]:
+        """
+        Flatten the sources of all units into the cutouts to extract.
+        
+        Sources without a field, an existing chunk, a page or a valid bbox (with
+        a positive area) are filtered out here, once.
+        
+        Args:
+            units_data: List of unit results with their sources
+        
+        Returns:
+            List of (unit_index, field, chunk_id, page_num, bbox) tuples
+        """
+        locations = self._chunk_locations
+        cutouts = []
+        
         # Process each unit
         for unit_idx, unit_data in enumerate(units_data):
             sources = unit_data.get('sources', [])
-            print(f"Processing unit {unit_idx + 1} with {len(sources)} sources")
+            logger.debug("Processing unit %d with %d sources", unit_idx + 1, len(sources))
             
             for source in sources:
                 field = source.get('field')
@@ -69,52 +475,86 @@ class CutoutExtractor:
                 if not field or not chunk_id:
                     continue
                 
-                # Find the chunk to get page and bbox information
-                chunk_data = None
-                for chunk in self.chunks:
-                    if chunk.get('chunk_id') == chunk_id:
-                        chunk_data = chunk
-                        break
-                
-                if not chunk_data:
-                    print(f"Warning: Could not find chunk {chunk_id}")
+                location = locations.get(chunk_id)
+                if location is None:
+                    logger.warning("Could not find chunk %s", chunk_id)
                     continue
                 
-                page_num = chunk_data.get('page')
-                bbox = chunk_data.get('bbox')
+                page_num, bbox, raw_bbox = location
                 
                 # Skip if no bbox or page data
-                if not bbox or page_num is None:
+                if not raw_bbox or page_num is None:
                     continue
                 
-                # Parse bbox if it's a string
-                parsed_bbox = self._parse_bbox(bbox)
-                if not parsed_bbox:
-                    print(f"Warning: Could not parse bbox for {field}: {bbox}")
+                if bbox is None:
+                    logger.warning("Could not parse bbox for %s: %s", field, raw_bbox)
                     continue
                 
-                # Extract cutout
-                cutout_path = self._extract_single_cutout(
-                    field=field,
-                    unit_index=unit_idx,
-                    chunk_id=chunk_id,
-                    page_num=page_num,
-                    bbox=parsed_bbox,
-                    output_dir=output_path,
-                    padding=padding,
-                    scale=scale
-                )
+                # Zero or negative area: nothing to render
+                if bbox[2] <= bbox[0] or abs(bbox[1] - bbox[3]) < 1:
+                    logger.warning("Skipping degenerate bbox for %s: %s", field, raw_bbox)
+                    continue
                 
-                if cutout_path:
-                    field_key = f"unit{unit_idx + 1}_{field}"
-                    if field_key not in cutout_paths:
-                        cutout_paths[field_key] = []
-                    cutout_paths[field_key].append(cutout_path)
-                    print(f"✓ Added cutout for {field_key}")
-                else:
-                    print(f"✗ Failed to extract cutout for {field} (unit {unit_idx + 1})")
+                cutouts.append((unit_idx, field, chunk_id, page_num, bbox))
         
-        return cutout_paths
+        return cutouts
+    
+    def _build_bbox_table(
+        self,
+        chunks: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, int], np.ndarray]:
+        """
+        Parse the bounding boxes of all chunks at once.
+        
+        String bboxes ("(l, t, r, b)") are joined and parsed by a single
+        ``np.fromstring`` call; other formats go through ``_parse_bbox``.
+        
+        Args:
+            chunks: List of document chunks
+        
+        Returns:
+            Tuple of (chunk_id -> row index, (N, 4) float32 table with NaN rows for
+            missing or unparseable bboxes)
+        """
+        rows: Dict[str, int] = {}
+        table = np.full((len(chunks), 4), np.nan, dtype=np.float32)
+        string_rows: List[int] = []
+        string_values: List[str] = []
+        
+        for idx, chunk in enumerate(chunks):
+            chunk_id = chunk.get('chunk_id')
+            # The first chunk with a given ID wins, as with the lookup by ID
+            if not chunk_id or chunk_id in rows:
+                continue
+            rows[chunk_id] = idx
+            
+            bbox = chunk.get('bbox')
+            if not bbox:
+                continue
+            if isinstance(bbox, str):
+                string_rows.append(idx)
+                string_values.append(bbox.strip('()'))
+            else:
+                parsed = self._parse_bbox(bbox)
+                if parsed:
+                    table[idx] = parsed
+        
+        if string_rows:
+            try:
+                values = np.fromstring(','.join(string_values), dtype=np.float32, sep=',')
+            except ValueError:  # Non-numeric text (raised by numpy >= 2)
+                values = np.empty(0, dtype=np.float32)
+            # The comma check keeps a 3- and a 5-value bbox from pairing up into two rows
+            if values.size == 4 * len(string_rows) and all(v.count(',') == 3 for v in string_values):
+                table[string_rows] = values.reshape(-1, 4)
+            else:
+                # Some bbox is malformed: fall back to parsing them one by one
+                for idx, value in zip(string_rows, string_values):
+                    parsed = self._parse_bbox(value)
+                    if parsed:
+                        table[idx] = parsed
+        
+        return rows, table
     
     def _parse_bbox(self, bbox) -> List[float]:
         """
@@ -145,86 +585,489 @@ class CutoutExtractor:
             return None
             
         except (ValueError, AttributeError) as e:
-            print(f"Error parsing bbox '{bbox}': {e}")
+            logger.warning("Error parsing bbox '%s': %s", bbox, e)
             return None
     
-    def _extract_single_cutout(
+    def _extract_page_cutouts(
         self,
-        field: str,
-        unit_index: int,
-        chunk_id: str,
         page_num: int,
-        bbox: List[float],
-        output_dir: Path,
+        cutouts: List[Tuple[int, str, str, List[float]]],
+        output_prefix: Optional[str],
         padding: int,
-        scale: float
-    ) -> str:
+        scale: float,
+        cache_prefix: Optional[str] = None,
+        image_format: str = "png"
+    ) -> List[Union[str, Tuple[bytes, str], None]]:
         """
-        Extract a single cutout image.
+        Extract every cutout of a page from a single render of that page.
+        
+        Cutouts matching an embedded raster image are copied from the PDF. For
+        the others, the region of the page holding them is rasterized once at
+        ``scale`` (only if needed) and each cutout is sliced out of the rendered
+        pixels, instead of re-parsing and re-rasterizing the page content for
+        every bounding box.
         
         Args:
-            field: Field name
-            unit_index: Unit index (0 for first unit, 1 for second unit)
-            chunk_id: Chunk ID (e.g., "chunk_000")
             page_num: Page number (1-indexed)
-            bbox: Bounding box [left, top, right, bottom]
-            output_dir: Output directory path
+            cutouts: List of (unit_index, field, chunk_id, bbox) on this page
+            output_prefix: Output directory path, with a trailing separator
+                (None returns the encoded images instead of saving them)
             padding: Padding in pixels
             scale: Scale factor
+            cache_prefix: Path prefix of cached cutouts of this PDF (None disables the cache)
+            image_format: Encoding of rendered cutouts ("png" or "jpeg")
         
         Returns:
-            Path to the saved cutout image
+            Paths of the saved cutout images, or (encoded bytes, extension) tuples when
+            ``output_prefix`` is None, with None for failures, in the order of ``cutouts``
         """
+        # Convert to 0-indexed page number
+        page_idx = page_num - 1
+        
+        if page_idx < 0 or page_idx >= len(self.doc):
+            logger.warning("Page %d out of range", page_num)
+            return [None] * len(cutouts)
+        
         try:
-            # Convert to 0-indexed page number
-            page_idx = page_num - 1
+            with self._render_lock:
+                page = self.doc[page_idx]
+                page_rect = page.rect
+                images = page.get_image_info(xrefs=True)
+        except Exception as e:
+            logger.error("Error reading page %d: %s", page_num, e)
+            return [None] * len(cutouts)
+        
+        if page_rect.is_empty:
+            logger.warning("Page %d has an empty page rect", page_num)
+            return [None] * len(cutouts)
+        
+        # Output path (without extension) and cache key of every cutout. The key
+        # includes the bbox, so chunks re-parsed into other regions under the same
+        # chunk_id are not served a stale cutout
+        output_stems = [
+            f"{output_prefix}unit{unit_idx + 1}_{field}_{chunk_id}_page{page_num}" if output_prefix is not None else None
+            for unit_idx, field, chunk_id, _ in cutouts
+        ]
+        cache_keys = [
+            f"{cache_prefix}_{chunk_id}_b{'_'.join(f'{v:.1f}' for v in bbox)}_s{scale}_p{padding}_{image_format}"
+            if cache_prefix else None
+            for _, _, chunk_id, bbox in cutouts
+        ]
+        
+        # Cutouts that are exactly an embedded raster image are copied as is
+        results: List[Union[str, Tuple[bytes, str], None]] = [None] * len(cutouts)
+        to_render = []
+        for idx, (unit_idx, field, chunk_id, bbox) in enumerate(cutouts):
+            if cache_keys[idx]:
+                results[idx] = self._restore_cached_cutout(cache_keys[idx], output_stems[idx])
+                if results[idx] is not None:
+                    continue
             
-            if page_idx < 0 or page_idx >= len(self.doc):
-                print(f"Warning: Page {page_num} out of range")
-                return None
+            embedded = self._extract_embedded_image(bbox=bbox, page_rect=page_rect, images=images)
+            if embedded is None:
+                to_render.append(idx)
+            else:
+                results[idx] = self._save_cutout(field, *embedded, output_stems[idx], cache_keys[idx])
+        
+        if not to_render:
+            return results
+        
+        # Padded pixel boxes of all rendered cutouts, computed in one vectorized pass
+        boxes = self._pixel_boxes(
+            np.array([cutouts[idx][3] for idx in to_render], dtype=np.float64),
+            page_rect.width,
+            page_rect.height,
+            padding,
+            scale
+        )
+        
+        # Boxes lying outside the page are empty once clipped to it
+        nonempty = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        if not nonempty.all():
+            for idx, keep in zip(to_render, nonempty.tolist()):
+                if not keep:
+                    logger.warning("Bbox of %s is outside page %d", cutouts[idx][1], page_num)
+            to_render = [idx for idx, keep in zip(to_render, nonempty.tolist()) if keep]
+            boxes = boxes[nonempty]
+            if not to_render:
+                return results
+        
+        try:
+            with self._render_lock:
+                regions = self._render_regions(page_idx, scale, boxes)
+        except Exception as e:
+            logger.error("Error rendering page %d: %s", page_num, e)
+            return results
+        
+        for idx, (x0, y0, x1, y1), (pixels, origin_x, origin_y) in zip(to_render, boxes.tolist(), regions):
+            unit_idx, field, chunk_id, _ = cutouts[idx]
+            # Pixel box relative to the rendered region
+            box = [
+                max(x0 - origin_x, 0),
+                max(y0 - origin_y, 0),
+                x1 - origin_x,
+                y1 - origin_y
+            ]
+            encoded = self._encode_cutout(field=field, pixel_box=box, pixels=pixels, image_format=image_format)
+            if encoded is not None:
+                results[idx] = self._save_cutout(field, *encoded, output_stems[idx], cache_keys[idx])
+        
+        return results
+    
+    def _save_cutout(
+        self,
+        field: str,
+        data: Union[bytes, memoryview],
+        ext: str,
+        output_stem: Optional[str],
+        cache_key: Optional[str]
+    ) -> Union[str, Tuple[bytes, str], None]:
+        """
+        Save an encoded cutout to the output directory and the cache.
+        
+        Args:
+            field: Field name
+            data: Encoded image
+            ext: File extension of the encoding (".png" or ".jpeg")
+            output_stem: Output path without extension (None keeps the cutout in memory)
+            cache_key: Cache path of the cutout, without extension (None disables the cache)
+        
+        Returns:
+            Path to the saved cutout image, or (bytes, extension) when ``output_stem``
+            is None; None if it could not be written
+        """
+        try:
+            if output_stem is None:
+                data = bytes(data)
+                if cache_key and not os.path.exists(cache_key + ext):
+                    _write_bytes(cache_key + ext, data)
+                return data, ext
             
-            page = self.doc[page_idx]
-            page_rect = page.rect
-            page_height = page_rect.height
+            # Encoded in memory, written with a single system call
+            output_file = output_stem + ext
+            _write_bytes(output_file, data)
+            if cache_key:
+                self._store_cached_cutout(cache_key, output_file)
             
-            # Extract bbox coordinates
-            # Docling uses BOTTOMLEFT origin, PyMuPDF uses TOPLEFT
-            l, t, r, b = bbox
+            logger.debug("Extracted cutout: %s", output_file)
+            return output_file
             
-            # Convert coordinates from Docling (BOTTOMLEFT) to PyMuPDF (TOPLEFT)
-            pdf_y_top = page_height - t
-            pdf_y_bottom = page_height - b
+        except OSError as e:
+            logger.error("Error saving cutout for %s: %s", field, e)
+            return None
+    
+    def _extract_embedded_image(
+        self,
+        bbox: List[float],
+        page_rect: fitz.Rect,
+        images: List[Dict[str, Any]]
+    ) -> Optional[Tuple[bytes, str]]:
+        """
+        Get the embedded image matching a bbox with its original encoding.
+        
+        Copying the already encoded image stream avoids rasterizing and
+        re-encoding the region. Only upright PNG/JPEG images matching the bbox
+        on both sides (so a full-page scan is not returned for a single line)
+        are used.
+        
+        Args:
+            bbox: Bounding box [left, top, right, bottom] (Docling BOTTOMLEFT origin)
+            page_rect: Rectangle of the page in PDF points
+            images: Page images from ``Page.get_image_info(xrefs=True)``
+        
+        Returns:
+            Tuple of (image bytes, extension), or None if no embedded image matches the bbox
+        """
+        if not images:
+            return None
+        
+        l, t, r, b = bbox
+        rect = fitz.Rect(l, page_rect.height - t, r, page_rect.height - b)
+        rect_area = rect.get_area()
+        if rect_area <= 0:
+            return None
+        
+        for info in images:
+            xref = info.get('xref', 0)
+            transform = info.get('transform', (1, 0, 0, 1, 0, 0))
+            # Inline images have no xref; rotated or sheared images would come out unrotated
+            if not xref or transform[1] or transform[2]:
+                continue
             
-            # Add padding and ensure within page bounds
-            padded_rect = fitz.Rect(
-                max(0, l - padding),
-                max(0, pdf_y_top - padding),
-                min(page_rect.width, r + padding),
-                min(page_rect.height, pdf_y_bottom + padding)
-            )
+            image_rect = fitz.Rect(info['bbox'])
+            overlap = (rect & image_rect).get_area()
+            if overlap < EMBEDDED_IMAGE_MIN_OVERLAP * max(rect_area, image_rect.get_area()):
+                continue
             
-            # Extract the region as an image
-            matrix = fitz.Matrix(scale, scale)
-            pix = page.get_pixmap(clip=padded_rect, matrix=matrix)
+            try:
+                with self._render_lock:
+                    image = self.doc.extract_image(xref)
+            except Exception as e:
+                logger.warning("Error extracting embedded image %s: %s", xref, e)
+                return None
             
-            # Generate filename
-            filename = f"unit{unit_index + 1}_{field}_{chunk_id}_page{page_num}.png"
-            output_file = output_dir / filename
+            if not image or image.get('ext') not in ('png', 'jpeg'):
+                return None
             
-            # Save the image
-            pix.save(str(output_file))
+            logger.debug("Extracted embedded image %s", xref)
+            return image['image'], f".{image['ext']}"
+        
+        return None
+    
+    def _get_pdf_hash(self) -> str:
+        """Return a short SHA256 digest of the PDF content, hashing the file only once."""
+        if self._pdf_hash is None:
+            if self.pdf_bytes is not None:
+                self._pdf_hash = hashlib.sha256(self.pdf_bytes).hexdigest()[:16]
+            else:
+                with open(self.pdf_path, 'rb') as f:
+                    self._pdf_hash = hashlib.file_digest(f, 'sha256').hexdigest()[:16]
+        return self._pdf_hash
+    
+    @staticmethod
+    def _restore_cached_cutout(
+        cache_key: str,
+        output_stem: Optional[str]
+    ) -> Union[str, Tuple[bytes, str], None]:
+        """
+        Link a cached cutout into the output directory.
+        
+        Args:
+            cache_key: Cache path of the cutout, without extension
+            output_stem: Output path of the cutout, without extension
+                (None reads the cached image instead)
+        
+        Returns:
+            Path of the restored cutout, or (bytes, extension) when ``output_stem``
+            is None; None on a cache miss
+        """
+        for ext in CACHED_CUTOUT_EXTENSIONS:
+            cached = cache_key + ext
+            if not os.path.exists(cached):
+                continue
+            
+            if output_stem is None:
+                with open(cached, 'rb') as f:
+                    return f.read(), ext
             
-            print(f"✓ Extracted cutout: {filename}")
-            return str(output_file)
+            output_file = output_stem + ext
+            try:
+                if os.path.exists(output_file):
+                    os.unlink(output_file)
+                os.link(cached, output_file)
+            except OSError:
+                # Different filesystems: fall back to a copy
+                shutil.copyfile(cached, output_file)
+            
+            logger.debug("Reused cached cutout: %s", output_file)
+            return output_file
+        
+        return None
+    
+    @staticmethod
+    def _store_cached_cutout(cache_key: str, cutout_path: str) -> None:
+        """Keep a copy of a freshly extracted cutout under its cache key."""
+        cached = cache_key + os.path.splitext(cutout_path)[1]
+        try:
+            if not os.path.exists(cached):
+                os.link(cutout_path, cached)
+        except OSError:
+            try:
+                shutil.copyfile(cutout_path, cached)
+            except OSError as e:
+                logger.warning("Could not cache cutout %s: %s", cutout_path, e)
+    
+    def _render_regions(
+        self,
+        page_idx: int,
+        scale: float,
+        boxes: np.ndarray
+    ) -> List[Tuple[np.ndarray, int, int]]:
+        """
+        Render the regions of a page holding the given pixel boxes.
+        
+        Close boxes (e.g. the fields of a table) share one render of their
+        union, so MuPDF runs the page content once for all of them. Scattered
+        boxes are rendered one by one instead of rasterizing the space between
+        them, and large unions fall back to the cached full-page render.
+        
+        Must be called with ``self._render_lock`` held.
+        
+        Args:
+            page_idx: Page index (0-indexed)
+            scale: Scale factor
+            boxes: (N, 4) int array of [x0, y0, x1, y1] pixel coordinates
+        
+        Returns:
+            List of (pixels, origin_x, origin_y) per box, where the pixels are the
+            rendered region and the origin its top-left corner in page pixels
+        """
+        if (page_idx, scale) in self._page_cache:
+            return [(self._render_page(page_idx, scale), 0, 0)] * len(boxes)
+        
+        display_list = self._get_display_list(page_idx)
+        union = np.concatenate([boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)])
+        union_area = float(np.prod(union[2:] - union[:2]))
+        boxes_area = float(np.prod(boxes[:, 2:] - boxes[:, :2], axis=1).sum())
+        page_area = display_list.rect.width * display_list.rect.height * scale * scale
+        
+        if union_area >= FULL_PAGE_MIN_SHARE * page_area:
+            return [(self._render_page(page_idx, scale), 0, 0)] * len(boxes)
+        
+        if union_area <= UNION_MAX_AREA_RATIO * boxes_area:
+            return [self._render_clip(display_list, union.tolist(), scale)] * len(boxes)
+        
+        return [self._render_clip(display_list, box, scale) for box in boxes.tolist()]
+    
+    def _get_display_list(self, page_idx: int) -> fitz.DisplayList:
+        """
+        Return the display list of a page, reusing a previous one when cached.
+        
+        Must be called with ``self._render_lock`` held.
+        
+        Args:
+            page_idx: Page index (0-indexed)
+        
+        Returns:
+            Display list of the page
+        """
+        display_list = self._display_lists.get(page_idx)
+        if display_list is not None:
+            self._display_lists.move_to_end(page_idx)
+            return display_list
+        
+        display_list = self.doc[page_idx].get_displaylist()
+        self._display_lists[page_idx] = display_list
+        if len(self._display_lists) > self.max_cached_pages:
+            self._display_lists.popitem(last=False)
+        
+        return display_list
+    
+    @staticmethod
+    def _render_clip(
+        display_list: fitz.DisplayList,
+        pixel_box: List[int],
+        scale: float
+    ) -> Tuple[np.ndarray, int, int]:
+        """
+        Render a region of a page at ``scale``.
+        
+        Args:
+            display_list: Display list of the page
+            pixel_box: Region [x0, y0, x1, y1] in pixels of the page rendered at ``scale``
+            scale: Scale factor
+        
+        Returns:
+            Tuple of (pixels as a (height, width, channels) uint8 array, origin_x, origin_y)
+        """
+        clip = fitz.Rect(*(v / scale for v in pixel_box))
+        pix = display_list.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip)
+        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return pixels, pix.x, pix.y
+    
+    def _render_page(self, page_idx: int, scale: float) -> np.ndarray:
+        """
+        Render a page at ``scale``, reusing a previous render when cached.
+        
+        Must be called with ``self._render_lock`` held.
+        
+        Args:
+            page_idx: Page index (0-indexed)
+            scale: Scale factor
+        
+        Returns:
+            Page pixels as a (height, width, channels) uint8 array
+        """
+        key = (page_idx, scale)
+        pixels = self._page_cache.get(key)
+        if pixels is not None:
+            self._page_cache.move_to_end(key)
+            return pixels
+        
+        pix = self._get_display_list(page_idx).get_pixmap(matrix=fitz.Matrix(scale, scale))
+        # samples is a copy, so the pixmap can be released right away
+        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        pix = None
+        
+        self._page_cache[key] = pixels
+        if len(self._page_cache) > self.max_cached_pages:
+            self._page_cache.popitem(last=False)
+            # Give MuPDF's internal store back the memory of the evicted page
+            fitz.TOOLS.store_shrink(100)
+        
+        return pixels
+    
+    @staticmethod
+    def _pixel_boxes(
+        bboxes: np.ndarray,
+        page_width: float,
+        page_height: float,
+        padding: int,
+        scale: float
+    ) -> np.ndarray:
+        """
+        Convert Docling bboxes to padded pixel boxes of a page rendered at ``scale``.
+        
+        Args:
+            bboxes: (N, 4) array of [left, top, right, bottom] (Docling BOTTOMLEFT origin)
+            page_width: Page width in PDF points
+            page_height: Page height in PDF points
+            padding: Padding in pixels
+            scale: Scale factor
+        
+        Returns:
+            (N, 4) int array of [x0, y0, x1, y1] pixel coordinates
+        """
+        # Convert coordinates from Docling (BOTTOMLEFT) to PyMuPDF (TOPLEFT)
+        # and add padding, kept within page bounds
+        rects = np.empty_like(bboxes)
+        rects[:, 0] = bboxes[:, 0] - padding
+        rects[:, 1] = page_height - bboxes[:, 1] - padding
+        rects[:, 2] = bboxes[:, 2] + padding
+        rects[:, 3] = page_height - bboxes[:, 3] + padding
+        np.clip(rects, 0, [page_width, page_height, page_width, page_height], out=rects)
+        
+        # Same region in pixels of the rendered page
+        rects *= scale
+        rects[:, :2] = np.floor(rects[:, :2])
+        rects[:, 2:] = np.ceil(rects[:, 2:])
+        return rects.astype(np.int64)
+    
+    def _encode_cutout(
+        self,
+        field: str,
+        pixel_box: List[int],
+        pixels: np.ndarray,
+        image_format: str = "png"
+    ) -> Optional[Tuple[Any, str]]:
+        """
+        Encode a single cutout image from a rendered page.
+        
+        Args:
+            field: Field name
+            pixel_box: Padded cutout region [x0, y0, x1, y1] in pixels of the rendered page
+            pixels: Rendered page, as a (height, width, channels) array
+            image_format: "png" or "jpeg" (see ``_encode_region``)
+        
+        Returns:
+            Tuple of (encoded image, extension), or None on failure
+        """
+        try:
+            x0, y0, x1, y1 = pixel_box
+            return _encode_region(pixels[y0:y1, x0:x1], image_format)
             
         except Exception as e:
-            print(f"Error extracting cutout for {field}: {e}")
+            logger.error("Error extracting cutout for %s: %s", field, e)
             return None
     
     def close(self):
         """Close the PDF document."""
+        self._page_cache.clear()
+        self._display_lists.clear()
         if self.doc:
             self.doc.close()
+        # Give back the memory MuPDF still holds for this document
+        fitz.TOOLS.store_shrink(100)
     
     def __enter__(self):
         """Context manager entry."""
@@ -236,18 +1079,35 @@ class CutoutExtractor:
 
 
 def save_cutout_manifest(
-    cutout_paths: Dict[str, List[str]],
-    output_file: str = "/tmp/cutout_manifest.json"
+    cutout_paths: Dict[Tuple[int, str], List[str]],
+    output_file: str = "/tmp/cutout_manifest.json",
+    indent: bool = False
 ):
     """
     Save a manifest file with all cutout paths.
     
+    The manifest is only read back by the report generator, so it is written
+    compactly unless ``indent`` is set. Keys are serialized as "unit{N}_{field}".
+    
     Args:
-        cutout_paths: Dictionary of field names to cutout paths
+        cutout_paths: Dictionary of (unit number, field name) to cutout paths
         output_file: Output manifest file path
+        indent: Pretty-print the JSON with 2-space indentation
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(cutout_paths, f, indent=2, ensure_ascii=False)
+    cutout_paths = {
+        f"unit{unit_number}_{field}": paths for (unit_number, field), paths in cutout_paths.items()
+    }
+    if orjson is not None:
+        data = orjson.dumps(cutout_paths, option=orjson.OPT_INDENT_2 if indent else 0)
+    else:
+        data = json.dumps(
+            cutout_paths,
+            indent=2 if indent else None,
+            separators=None if indent else (',', ':'),
+            ensure_ascii=False
+        ).encode('utf-8')
+    
+    _write_bytes(output_file, data)
     
     print(f"✓ Saved cutout manifest to {output_file}")
 
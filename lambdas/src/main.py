@@ -1,13 +1,18 @@
 """Main script to parse PDF and extract information using agno agent."""
 
+import functools
 import json
 import argparse
+import logging
 import os
-import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from pdf_parser import parse_pdf_to_chunks
-from agents import ContractInformationAgent, InstallmentSeriesAgent
+from typing import Iterable, Optional, Tuple
+from pdf_parser import parse_pdf_to_chunks, save_chunks
+from agents import get_combined_agent, get_contract_agent, get_installment_agent
+from agents.base_agent import iter_chunks
 from agents.contract_information_agent import load_chunks, save_result
 from cutout_extractor import CutoutExtractor, save_cutout_manifest
 from report_generator import generate_units_report
@@ -16,112 +21,259 @@ from report_generator import generate_units_report
 import sys
 sys.path.insert(0, os.path.dirname(__file__))
 from s3_provider import S3Provider
-from sns_provider import SNSProvider
+from sns_provider import MAX_BATCH_BYTES, SNSProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+# The Lambda runtime leaves the root logger at WARNING
+logger.setLevel(logging.INFO)
+
+# VERBOSE=1 prints the extracted fields, sources and installment plans in full;
+# otherwise a one-line summary is logged
+VERBOSE = os.environ.get("VERBOSE") == "1"
+
+# Contract fields and installment plans are extracted by one combined LLM call,
+# so the chunks are sent (and prefilled) once; COMBINED_EXTRACTION=0 runs the
+# contract and installment agents separately instead
+COMBINED_EXTRACTION = os.environ.get("COMBINED_EXTRACTION", "1") == "1"
+
+# Cutout rendering: scale over the native PDF resolution (1.0 = 72 dpi), and
+# encoding ("jpeg" saves cutouts with color content as JPEG, text stays PNG)
+CUTOUT_SCALE = float(os.environ.get("CUTOUT_SCALE", 2.0))
+CUTOUT_FORMAT = os.environ.get("CUTOUT_FMT", "jpeg")
+
+# PDFs up to this size are read from S3 straight into memory; larger ones are
+# downloaded to /tmp so they do not compete with the parser for memory
+IN_MEMORY_PDF_MAX_BYTES = int(os.environ.get("IN_MEMORY_PDF_MAX_BYTES", 200 * 1024 * 1024))
+
+# Cutouts uploaded to S3 concurrently (small PUTs dominated by round-trip latency)
+S3_UPLOAD_CONCURRENCY = int(os.environ.get("S3_UPLOAD_CONCURRENCY", 16))
+
+# Bytes of the SNS size limit kept free for the request overhead counted with the
+# message (entry id, attributes), on top of the subject
+NOTIFICATION_SIZE_MARGIN = 1024
+
+# Content type of uploaded cutouts, by lowercase file extension
+_CONTENT_TYPE_MAP = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
+
+
+@functools.lru_cache(maxsize=1)
+def get_s3_provider() -> S3Provider:
+    """
+    Return the S3Provider shared by every record served by this container.
+    
+    Warm Lambda invocations reuse its boto3 client, and with it the credential
+    resolution and the pool of TLS connections.
+    """
+    return S3Provider()
+
+
+@functools.lru_cache(maxsize=1)
+def get_sns_provider() -> SNSProvider:
+    """Return the SNSProvider shared by every record served by this container."""
+    return SNSProvider()
+
+
+def _clear_directory(path: str) -> None:
+    """
+    Delete the contents of a directory, keeping the directory itself.
+    
+    Uses the file types cached by ``os.scandir`` instead of the extra
+    ``stat`` calls of ``shutil.rmtree``.
+    
+    Args:
+        path: Directory to empty
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _clear_directory(entry.path)
+                os.rmdir(entry.path)
+            else:
+                os.unlink(entry.path)
+
 
 def cleanup_output_directory(output_dir: str) -> None:
     """Clean up the output directory before each run."""
     output_path = Path(output_dir)
-    if output_path.exists():
-        print(f"🧹 Cleaning output directory: {output_dir}")
-        shutil.rmtree(output_path)
-    output_path.mkdir(parents=True, exist_ok=True)
+    if output_path.is_dir():
+        # Nothing to do on a cold container, where the directory is still empty
+        with os.scandir(output_dir) as entries:
+            is_empty = next(entries, None) is None
+        if not is_empty:
+            print(f"🧹 Cleaning output directory: {output_dir}")
+            _clear_directory(output_dir)
+    else:
+        output_path.mkdir(parents=True, exist_ok=True)
     print(f"✓ Output directory ready: {output_dir}")
 
 
-def upload_cutouts_to_s3(
+def _cutout_key_prefix(field_key: Tuple[int, str], job_id: str) -> str:
+    """
+    Build the S3 key (without extension) of the cutouts of a field.
+    
+    Args:
+        field_key: Cutout field key, as (unit number, field name)
+        job_id: Unique job identifier
+        
+    Returns:
+        Key prefix: contracts/{job_id}/unit_{index}/{fieldName}
+    """
+    unit_index, field_name = field_key
+    return f"contracts/{job_id}/unit_{unit_index}/{field_name}"
+
+
+def stream_cutouts_to_s3(
     s3_provider: S3Provider,
-    cutout_paths: dict,
+    cutouts: Iterable[Tuple[str, bytes, str]],
     bucket_name: str,
     job_id: str
 ) -> dict:
     """
-    Upload all cutout images to S3 with consistent key structure.
+    Upload cutout images to S3 straight from memory, as they are extracted.
+    
+    Each cutout is PUT while the following pages are still being rendered,
+    so the PNGs are never written to /tmp and read back.
     
-    New structure: contracts/{job_id}/unit_{index}/{fieldName}.png
+    Uploads run on a thread pool sharing the provider's boto3 client (and its
+    connection pool) rather than on an aioboto3 event loop: the cutouts are
+    produced by a synchronous generator, threads already overlap the PUT
+    round trips, and aiobotocore pins botocore to narrow ranges that would
+    hold back the boto3 version of the whole Lambda.
     
     Args:
         s3_provider: S3Provider instance
-        cutout_paths: Dictionary mapping field names to lists of local file paths
-                     Format: "unit{N}_{fieldName}" -> [local_paths]
+        cutouts: Iterator over (field_key, image bytes, extension) tuples,
+                 see ``CutoutExtractor.iter_cutouts``
         bucket_name: S3 bucket name
         job_id: Unique job identifier for organizing files
         
     Returns:
-        Dictionary mapping field names to lists of S3 URIs
+        Dictionary mapping (unit number, field name) to lists of S3 URIs
     """
     s3_cutout_paths = {}
     total_uploaded = 0
     
-    print(f"📤 Uploading cutouts to S3 bucket: {bucket_name}")
+    print(f"📤 Streaming cutouts to S3 bucket: {bucket_name}")
+    
+    with ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY) as executor:
+        futures = []
+        for field_key, data, ext in cutouts:
+            s3_key = _cutout_key_prefix(field_key, job_id) + ext
+            content_type = _CONTENT_TYPE_MAP.get(ext.lower(), 'application/octet-stream')
+            futures.append((
+                field_key,
+                s3_key,
+                executor.submit(s3_provider.upload_bytes, data, bucket_name, s3_key, content_type)
+            ))
+    
+    # Collected in submission order, so the URIs keep the order of the cutouts
+    for field_key, s3_key, future in futures:
+        uris = s3_cutout_paths.setdefault(field_key, [])
+        try:
+            uris.append(future.result())
+            total_uploaded += 1
+        except Exception as e:
+            print(f"⚠️  Warning: Failed to upload {s3_key}: {e}")
     
-    for field_key, local_paths in cutout_paths.items():
-        s3_cutout_paths[field_key] = []
+    print(f"✓ Uploaded {total_uploaded} cutout images to S3")
+    return s3_cutout_paths
+
+
+def _load_cited_chunks(chunks_path: str, combined_result: list) -> list:
+    """
+    Stream the saved chunks back, keeping only those cited as a source.
+    
+    Cutouts only need the page and bbox of the chunks the units point to, so
+    the rest of the document is not held in memory while pages are rendered.
+    
+    Args:
+        chunks_path: Path of the chunks JSON Lines file
+        combined_result: Units combined by ``combine_results``
         
-        # Extract unit index and field name from field_key
-        # Format: "unit1_fieldName" -> unit_index=1, field_name="fieldName"
-        if '_' in field_key:
-            parts = field_key.split('_', 1)
-            unit_part = parts[0]  # e.g., "unit1"
-            field_name = parts[1]  # e.g., "buyerName"
-            
-            # Extract unit index
-            unit_index = unit_part.replace('unit', '')
-        else:
-            # Fallback
-            unit_index = '0'
-            field_name = field_key
+    Returns:
+        The cited chunks, in document order
+    """
+    cited_ids = {
+        source.get('chunk_id')
+        for unit_data in combined_result
+        for source in unit_data.get('sources', [])
+    }
+    return [chunk for chunk in iter_chunks(chunks_path) if chunk.get('chunk_id') in cited_ids]
+
+
+def combine_results(contract_result, installment_result) -> list:
+    """
+    Combine contract and installment results unit by unit.
+    
+    The contract units are copied narrowly (the sources list and confidence
+    dict of each unit), so the extraction results themselves are not mutated.
+    
+    Args:
+        contract_result: List of contract extraction results
+        installment_result: List of installment extraction results
         
-        for local_path in local_paths:
-            try:
-                # Extract file extension
-                ext = os.path.splitext(local_path)[1]
-                
-                # Create new S3 key structure:
-                # contracts/{job_id}/unit_{index}/{fieldName}.png
-                s3_key = f"contracts/{job_id}/unit_{unit_index}/{field_name}{ext}"
-                
-                # Determine content type based on file extension
-                content_type_map = {
-                    '.png': 'image/png',
-                    '.jpg': 'image/jpeg',
-                    '.jpeg': 'image/jpeg',
-                    '.gif': 'image/gif',
-                    '.webp': 'image/webp'
-                }
-                content_type = content_type_map.get(ext.lower(), 'application/octet-stream')
-                
-                # Upload file to S3
-                s3_uri = s3_provider.upload_file_from_path(
-                    local_path=local_path,
-                    bucket_name=bucket_name,
-                    key=s3_key,
-                    extra_args={'ContentType': content_type}
-                )
-                
-                s3_cutout_paths[field_key].append(s3_uri)
-                total_uploaded += 1
-                
-            except Exception as e:
-                print(f"⚠️  Warning: Failed to upload {local_path}: {e}")
-                continue
+    Returns:
+        List of units with the installment plans, sources and confidence merged in
+    """
+    contract_units = contract_result if isinstance(contract_result, list) else [contract_result]
+    combined_result = [
+        {
+            'unit': dict(contract_unit.get('unit', {})),
+            'sources': list(contract_unit.get('sources', [])),
+            'confidence': dict(contract_unit.get('confidence', {}))
+        }
+        for contract_unit in contract_units
+    ]
     
-    print(f"✓ Uploaded {total_uploaded} cutout images to S3")
-    return s3_cutout_paths
+    if not isinstance(installment_result, list):
+        return combined_result
+    
+    for unit_idx, installment_unit in enumerate(installment_result):
+        if unit_idx >= len(combined_result):
+            # Add new unit if installment has more units than contract
+            combined_result.append(installment_unit)
+            continue
+        
+        combined_unit = combined_result[unit_idx]
+        
+        # Add installmentPlans to the unit data
+        combined_unit['unit']['installmentPlans'] = installment_unit.get('unit', {}).get('installmentPlans', [])
+        
+        # Add installment sources for fields the contract does not cite already
+        seen_fields = {source.get('field') for source in combined_unit['sources']}
+        for source in installment_unit.get('sources', []):
+            if source.get('field') not in seen_fields:
+                seen_fields.add(source.get('field'))
+                combined_unit['sources'].append(source)
+        
+        # Merge installment confidence with existing confidence
+        combined_unit['confidence'].update(installment_unit.get('confidence', {}))
+    
+    return combined_result
 
 
 def merge_results_with_cutouts(
-    contract_result: list,
-    installment_result: list,
+    combined_result: list,
     s3_cutout_paths: dict
 ) -> list:
     """
-    Merge contract and installment results and map chunk_id to chunk_file_key (S3 URIs).
+    Map the chunk_id of every source to its chunk_file_key (S3 URI).
     
     Args:
-        contract_result: List of contract extraction results
-        installment_result: List of installment extraction results
+        combined_result: Units combined by ``combine_results``
         s3_cutout_paths: Dictionary mapping field keys to S3 URIs
-                        Format: "unit1_fieldName" -> ["s3://..."]
+                        Format: (1, "fieldName") -> ["s3://..."]
         
     Returns:
         List of merged results with chunk_file_key instead of chunk_id
@@ -129,38 +281,26 @@ def merge_results_with_cutouts(
     merged_units = []
     
     # Process each unit
-    for unit_idx, contract_unit in enumerate(contract_result):
+    for unit_idx, combined_unit in enumerate(combined_result):
         unit_number = unit_idx + 1
         
-        # Start with contract data
+        unit = dict(combined_unit.get('unit', {}))
+        if not unit.get('installmentPlans'):
+            unit.pop('installmentPlans', None)
+        
         merged_unit = {
-            'unit': contract_unit.get('unit', {}).copy(),
+            'unit': unit,
             'sources': [],
-            'confidence': contract_unit.get('confidence', {}).copy()
+            'confidence': dict(combined_unit.get('confidence', {}))
         }
         
-        # Add installment data if available
-        if unit_idx < len(installment_result):
-            installment_unit = installment_result[unit_idx]
-            installment_plans = installment_unit.get('unit', {}).get('installmentPlans', [])
-            
-            if installment_plans:
-                merged_unit['unit']['installmentPlans'] = installment_plans
-            
-            # Merge confidence
-            installment_confidence = installment_unit.get('confidence', {})
-            merged_unit['confidence'].update(installment_confidence)
-        
-        # Process contract sources and map to S3 URIs
-        for source in contract_unit.get('sources', []):
+        # Process sources and map to S3 URIs
+        for source in combined_unit.get('sources', []):
             field = source.get('field')
             chunk_id = source.get('chunk_id')
             
-            # Build field key for lookup in s3_cutout_paths
-            field_key = f"unit{unit_number}_{field}"
-            
             # Get S3 URI from cutout paths
-            s3_uris = s3_cutout_paths.get(field_key, [])
+            s3_uris = s3_cutout_paths.get((unit_number, field), [])
             
             if s3_uris:
                 # Use the first S3 URI (usually there's only one per field)
@@ -174,75 +314,134 @@ def merge_results_with_cutouts(
                 'chunk_file_key': chunk_file_key
             })
         
-        # Add installment sources if available
-        if unit_idx < len(installment_result):
-            installment_sources = installment_result[unit_idx].get('sources', [])
-            
-            for source in installment_sources:
-                field = source.get('field')
-                chunk_id = source.get('chunk_id')
-                
-                # Skip if already in sources (from contract)
-                if any(s['field'] == field for s in merged_unit['sources']):
-                    continue
-                
-                field_key = f"unit{unit_number}_{field}"
-                s3_uris = s3_cutout_paths.get(field_key, [])
-                
-                if s3_uris:
-                    chunk_file_key = s3_uris[0]
-                else:
-                    chunk_file_key = chunk_id
-                
-                merged_unit['sources'].append({
-                    'field': field,
-                    'chunk_file_key': chunk_file_key
-                })
-        
         merged_units.append(merged_unit)
     
     return merged_units
 
 
-def send_sns_notification(
-    sns_provider: SNSProvider,
-    topic_arn: str,
+def build_notification_payload(
     merged_results: list,
     job_id: str,
     bucket_name: str,
     status: str = "success"
-) -> str:
+) -> dict:
     """
-    Send SNS notification with extraction results.
+    Build the SNS notification payload of a processed job.
     
     Args:
-        sns_provider: SNSProvider instance
-        topic_arn: ARN of the SNS topic
         merged_results: List of merged extraction results
         job_id: Job identifier
         bucket_name: S3 bucket name
         status: Processing status (default: "success")
         
     Returns:
-        Message ID from SNS
+        Notification payload
     """
-    # Build notification payload
-    notification_payload = {
+    return {
         'jobId': job_id,
         'bucketName': bucket_name,
         'status': status,
         'processedAt': datetime.utcnow().isoformat() + 'Z',
         'units': merged_results
     }
+
+
+def serialize_notification_payload(payload: dict) -> bytes:
+    """
+    Serialize a notification payload to compact UTF-8 JSON, once.
+    
+    The same bytes are saved to disk and published to SNS.
     
-    # Send to SNS
-    message_id = sns_provider.publish_message(
-        topic_arn=topic_arn,
-        message=notification_payload,
-        subject=f"Contract Processing Complete - {job_id}"
+    Args:
+        payload: Notification payload
+        
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(payload, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def offload_notification_payload(
+    s3_provider: S3Provider,
+    payload: dict,
+    payload_bytes: bytes,
+    bucket_name: str,
+    job_id: str,
+    subject: Optional[str] = None
+) -> bytes:
+    """
+    Keep a notification within the SNS message size limit.
+    
+    Payloads that fit are returned unchanged. Larger ones are uploaded to S3
+    and replaced by a message with the job metadata and the payload's S3 URI.
+    The subject counts towards the limit, and ``NOTIFICATION_SIZE_MARGIN``
+    bytes are left for the rest of the request.
+    
+    Args:
+        s3_provider: S3Provider instance
+        payload: Notification payload
+        payload_bytes: ``payload`` serialized by ``serialize_notification_payload``
+        bucket_name: S3 bucket name
+        job_id: Job identifier
+        subject: SNS subject the message is published with
+        
+    Returns:
+        JSON bytes of the message to publish
+    """
+    subject_bytes = len(subject.encode('utf-8')) if subject else 0
+    if len(payload_bytes) <= MAX_BATCH_BYTES - subject_bytes - NOTIFICATION_SIZE_MARGIN:
+        return payload_bytes
+    
+    payload_uri = s3_provider.upload_bytes(
+        payload_bytes,
+        bucket_name,
+        f"contracts/{job_id}/notification_payload.json",
+        'application/json'
     )
+    print(f"✓ Notification payload ({len(payload_bytes)} bytes) uploaded to {payload_uri}")
+    
+    return serialize_notification_payload({
+        'jobId': payload['jobId'],
+        'bucketName': payload['bucketName'],
+        'status': payload['status'],
+        'processedAt': payload['processedAt'],
+        'payloadUri': payload_uri
+    })
+
+
+def notification_subject(job_id: str) -> str:
+    """Return the SNS subject of the notification of ``job_id``."""
+    return f"Contract Processing Complete - {job_id}"
+
+
+def flush_notifications(pending_notifications: list) -> None:
+    """
+    Publish the notifications queued while processing a batch of SQS records.
     
-    return message_id
+    Notifications are grouped by topic and sent with SNS PublishBatch, up to
+    10 per API call instead of one call each.
+    
+    Args:
+        pending_notifications: List of (topic_arn, message, subject) tuples, the
+            message being a payload dict or its JSON string
+    """
+    if not pending_notifications:
+        return
+    
+    by_topic = {}
+    for topic_arn, payload, subject in pending_notifications:
+        by_topic.setdefault(topic_arn, []).append((payload, subject))
+    
+    for topic_arn, notifications in by_topic.items():
+        try:
+            message_ids = get_sns_provider().publish_messages_batch(topic_arn, notifications)
+            print(f"✓ {len(message_ids)} SNS notification(s) sent successfully")
+        except Exception as e:
+            print(f"⚠️  Warning: Failed to send SNS notifications: {e}")
+            import traceback
+            traceback.print_exc()
 
 
 # Entrypoint of the Lambda function
@@ -262,10 +461,13 @@ def handler(event, context):
     
     print(f"📦 Using S3 bucket: {bucket_name}")
     
-    # Inicializa o S3Provider
+    # S3Provider compartilhado pelo container (criado uma única vez)
     # Autenticação: Usa AWS_ACCESS_KEY_ID e AWS_SECRET_ACCESS_KEY se disponíveis,
     # caso contrário usa IAM Role do Lambda (default credential chain)
-    s3_provider = S3Provider()
+    s3_provider = get_s3_provider()
+    
+    # Notificações SNS acumuladas e enviadas em lote ao final
+    pending_notifications = []
     
     for record in event['Records']:
         try:
@@ -288,18 +490,26 @@ def handler(event, context):
             file_name = file_key.split('/')[-1]
             local_file_path = f"/tmp/{file_name}"
             
-            # Faz o download do arquivo do S3 usando S3Provider
-            print(f"⬇️  Downloading from S3 to {local_file_path}...")
-            s3_provider.download_file_to_path(bucket_name, file_key, local_file_path)
-            print(f"✓ File downloaded successfully")
+            # PDFs pequenos ficam em memória, sem passar pelo /tmp
+            pdf_bytes = s3_provider.get_file_as_bytes(bucket_name, file_key, max_size=IN_MEMORY_PDF_MAX_BYTES)
+            if pdf_bytes is not None:
+                print(f"✓ File loaded into memory ({len(pdf_bytes)} bytes)")
+            else:
+                # Faz o download do arquivo do S3 usando S3Provider
+                print(f"⬇️  Downloading from S3 to {local_file_path}...")
+                s3_provider.download_file_to_path(bucket_name, file_key, local_file_path)
+                print(f"✓ File downloaded successfully")
             
             job_id = contract_id
             
             # Processa o arquivo
             main(
                 pdf_path=local_file_path,
+                pdf_bytes=pdf_bytes,
+                s3_provider=s3_provider,
                 bucket_name=bucket_name,
-                job_id=job_id
+                job_id=job_id,
+                pending_notifications=pending_notifications
             )
             
             # Cleanup: remove o arquivo temporário após processamento
@@ -314,121 +524,22 @@ def handler(event, context):
             # Continue processando outras mensagens
             continue
     
-def main(pdf_path, bucket_name: str = None, job_id: str = None):
+    # Envia as notificações de todos os registros processados
+    flush_notifications(pending_notifications)
+    
+def _render_report(units_data: list, installment_result: list) -> None:
     """
-    Main execution flow.
+    Print the extracted fields, their sources and the installment plans in full.
     
     Args:
-        pdf_path: Path to the PDF file to process
-        bucket_name: S3 bucket name for uploading cutouts (optional)
-        job_id: Unique job identifier for organizing S3 files (optional)
+        units_data: List of contract extraction results
+        installment_result: List of installment extraction results
     """
-    print("=" * 60)
-    print("Contract Information Extraction System")
-    print("=" * 60)
-    
-    # Configuration
-    OUTPUT_DIR = "/tmp/output"
-    
-    # Generate job_id if not provided (use PDF filename and timestamp)
-    if job_id is None:
-        import time
-        pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-        timestamp = int(time.time())
-        job_id = f"{pdf_filename}_{timestamp}"
-    
-    print(f"📝 Job ID: {job_id}")
-    
-    # Clean up output directory
-    cleanup_output_directory(OUTPUT_DIR)
-
-    chunks_output = os.path.join(OUTPUT_DIR, "document_chunks.json")
-    result_output = os.path.join(OUTPUT_DIR, "extraction_result.json")
-    
-    # Step 1: Parse PDF to chunks (if not already done)
-    print("\n[1/7] Parsing PDF document...")
-    try:
-        # Try to load existing chunks
-        chunks = load_chunks(chunks_output)
-        print(f"✓ Loaded {len(chunks)} chunks from {chunks_output}")
-    except FileNotFoundError:
-        # Parse PDF if chunks don't exist
-        chunks = parse_pdf_to_chunks(pdf_path)
-        
-        # Save chunks
-        with open(chunks_output, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, indent=2, ensure_ascii=False)
-        
-        print(f"✓ Extracted {len(chunks)} chunks from {pdf_path}")
-        print(f"✓ Saved chunks to {chunks_output}")
-    
-    # Display chunk statistics
-    element_types = {}
-    for chunk in chunks:
-        etype = chunk['element_type'] or 'unknown'
-        element_types[etype] = element_types.get(etype, 0) + 1
-    
-    print("\n  Chunk Statistics:")
-    for etype, count in sorted(element_types.items(), key=lambda x: x[1], reverse=True):
-        print(f"    - {etype}: {count}")
-    
-    # Step 2: Initialize extraction agents
-    print("\n[2/7] Setting up extraction agents...")
-    contract_information_agent = ContractInformationAgent(model="gpt-4o-mini")
-    installment_series_agent = InstallmentSeriesAgent(model="gpt-4o-mini")
-    
-    # Display configured fields
-    contract_fields = contract_information_agent.get_field_descriptions()
-    installment_fields = installment_series_agent.get_field_descriptions()
-    
-    print(f"✓ Contract Information Agent: {len(contract_fields)} fields")
-    for field, desc in contract_fields.items():
-        print(f"    - {field}: {desc}")
-    
-    print(f"✓ Installment Series Agent: {len(installment_fields)} fields")
-    for field, desc in installment_fields.items():
-        print(f"    - {field}: {desc}")
-    
-    # Step 3: Run contract information extraction
-    print("\n[3/7] Running contract information agent for data extraction...")
-    contract_result = contract_information_agent.extract_information(chunks)
-    
-    # Save contract result
-    contract_output = os.path.join(OUTPUT_DIR, "contract_extraction_result.json")
-    save_result(contract_result, contract_output)
-    
-    print(f"✓ Contract information extraction complete!")
-    print(f"✓ Results saved to {contract_output}")
-    
-    # Step 4: Run installment series extraction
-    print("\n[4/7] Running installment series agent for payment extraction...")
-    installment_result = installment_series_agent.extract_information(chunks)
-    
-    # Save installment result
-    from agents.installment_series_agent import save_result as save_installment_result
-    # Save installment result in our Database
-    installment_output = os.path.join(OUTPUT_DIR, "installment_extraction_result.json")
-    save_installment_result(installment_result, installment_output)
-    
-    print(f"✓ Installment series extraction complete!")
-    print(f"✓ Results saved to {installment_output}")
-    
-    # Combine results for backward compatibility
-    result = contract_result
-    
-    # Display results
     print("\n" + "=" * 60)
     print("EXTRACTION RESULTS")
     print("=" * 60)
     
     print("\n📋 Extracted Data:")
-    # Handle new array structure
-    if isinstance(result, list):
-        units_data = result
-    else:
-        # Fallback for old structure
-        units_data = result.get('units', [result])
-    
     print(f"  Found {len(units_data)} unit(s) in the contract")
     
     for unit_idx, unit_data in enumerate(units_data):
@@ -447,22 +558,20 @@ def main(pdf_path, bucket_name: str = None, job_id: str = None):
     
     print(f"\n📍 Sources Used:")
     
-    # Collect all sources for display
-    all_sources = []
-    for unit_idx, unit_data in enumerate(units_data):
-        sources = unit_data.get('sources', [])
-        for source in sources:
-            source['unit_index'] = unit_idx
-            all_sources.append(source)
+    # Collect all sources for display, with the index of their unit
+    all_sources = [
+        (unit_idx, source)
+        for unit_idx, unit_data in enumerate(units_data)
+        for source in unit_data.get('sources', [])
+    ]
     
     print(f"  Total chunks referenced: {len(all_sources)}")
     
-    for source in all_sources[:5]:  # Show first 5 sources
-        unit_idx = source.get('unit_index', 'N/A')
+    for unit_idx, source in all_sources[:5]:  # Show first 5 sources
         field = source.get('field', 'unknown')
         chunk_id = source.get('chunk_id', 'N/A')
         page = source.get('page', 'N/A')
-        print(f"\n  Unit {unit_idx + 1 if unit_idx != 'N/A' else 'N/A'} - Field: {field}")
+        print(f"\n  Unit {unit_idx + 1} - Field: {field}")
         print(f"    Chunk: {chunk_id} (Page {page})")
         
         excerpt = source.get('text_excerpt')
@@ -505,70 +614,198 @@ def main(pdf_path, bucket_name: str = None, job_id: str = None):
                         print(f"      Amount: N/A")
     else:
         print("  No installment plans found")
+
+
+def main(
+    pdf_path,
+    pdf_bytes: bytes = None,
+    s3_provider: S3Provider = None,
+    bucket_name: str = None,
+    job_id: str = None,
+    pending_notifications: list = None
+):
+    """
+    Main execution flow.
+    
+    Args:
+        pdf_path: Path to the PDF file to process
+        pdf_bytes: Content of the PDF, when it is held in memory instead of
+            being read from ``pdf_path`` (optional)
+        s3_provider: S3Provider used for the uploads (defaults to the shared one,
+            so every record reuses the handler's connection pool)
+        bucket_name: S3 bucket name for uploading cutouts (optional)
+        job_id: Unique job identifier for organizing S3 files (optional)
+        pending_notifications: List the SNS notification is queued on, as a
+            (topic_arn, payload, subject) tuple, instead of being published
+            right away (optional, see ``flush_notifications``)
+    """
+    print("=" * 60)
+    print("Contract Information Extraction System")
+    print("=" * 60)
+    
+    # Configuration
+    OUTPUT_DIR = "/tmp/output"
+    
+    # Generate job_id if not provided (use PDF filename and timestamp)
+    if job_id is None:
+        import time
+        pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+        timestamp = int(time.time())
+        job_id = f"{pdf_filename}_{timestamp}"
+    
+    print(f"📝 Job ID: {job_id}")
+    
+    # Clean up output directory
+    cleanup_output_directory(OUTPUT_DIR)
+
+    chunks_output = os.path.join(OUTPUT_DIR, "document_chunks.jsonl")
+    result_output = os.path.join(OUTPUT_DIR, "extraction_result.json")
+    
+    # Step 1: Parse PDF to chunks (if not already done)
+    print("\n[1/7] Parsing PDF document...")
+    if not os.path.exists(chunks_output):
+        # Each page batch is written as it is parsed, without keeping the chunks
+        chunk_count = save_chunks(parse_pdf_to_chunks(pdf_path, pdf_bytes=pdf_bytes), chunks_output)
+        
+        print(f"✓ Extracted {chunk_count} chunks from {pdf_path}")
+        print(f"✓ Saved chunks to {chunks_output}")
+    
+    # The agents need the text of every chunk in their prompt
+    chunks = load_chunks(chunks_output)
+    print(f"✓ Loaded {len(chunks)} chunks from {chunks_output}")
+    
+    # Display chunk statistics
+    element_types = Counter(chunk['element_type'] or 'unknown' for chunk in chunks)
+    print(f"  Chunk Statistics: {element_types.most_common()}")
+    
+    # Step 2: Initialize extraction agents
+    print("\n[2/7] Setting up extraction agents...")
+    # Shared instances, reused across warm Lambda invocations
+    if COMBINED_EXTRACTION:
+        extraction_agents = [("Combined Extraction Agent", get_combined_agent("gpt-4o-mini"))]
+    else:
+        extraction_agents = [
+            ("Contract Information Agent", get_contract_agent("gpt-4o-mini")),
+            ("Installment Series Agent", get_installment_agent("gpt-4o-mini")),
+        ]
+    
+    # Display configured fields
+    for agent_name, agent in extraction_agents:
+        fields = agent.get_field_descriptions()
+        print(f"✓ {agent_name}: {len(fields)} fields")
+        if VERBOSE:
+            for field, desc in fields.items():
+                print(f"    - {field}: {desc}")
+    
+    if COMBINED_EXTRACTION:
+        # Steps 3 and 4: One LLM call returns the contract fields and the
+        # installment plans, split back into the two agents' formats
+        print("\n[3/7] Running combined extraction agent for data and payment extraction...")
+        print("\n[4/7] Installment plans extracted in the same call")
+        contract_result, installment_result = extraction_agents[0][1].extract_all(chunks)
+    else:
+        # Steps 3 and 4: Run both extractions concurrently. They are independent
+        # LLM round trips over the same chunks, so the wall time becomes the
+        # slowest of the two instead of their sum.
+        print("\n[3/7] Running contract information agent for data extraction...")
+        print("\n[4/7] Running installment series agent for payment extraction...")
+        (_, contract_information_agent), (_, installment_series_agent) = extraction_agents
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            contract_future = executor.submit(contract_information_agent.extract_information, chunks)
+            installment_future = executor.submit(installment_series_agent.extract_information, chunks)
+            contract_result = contract_future.result()
+            installment_result = installment_future.result()
+    
+    # The full chunk list is not needed past the extraction; the cutouts
+    # re-read only the chunks cited as sources (see _load_cited_chunks)
+    del chunks
+    
+    # Save contract result
+    contract_output = os.path.join(OUTPUT_DIR, "contract_extraction_result.json")
+    save_result(contract_result, contract_output)
+    
+    print(f"✓ Contract information extraction complete!")
+    print(f"✓ Results saved to {contract_output}")
+    
+    # Save installment result
+    from agents.installment_series_agent import save_result as save_installment_result
+    # Save installment result in our Database
+    installment_output = os.path.join(OUTPUT_DIR, "installment_extraction_result.json")
+    save_installment_result(installment_result, installment_output)
+    
+    print(f"✓ Installment series extraction complete!")
+    print(f"✓ Results saved to {installment_output}")
+    
+    # Combine results for backward compatibility
+    result = contract_result
+    
+    # Handle new array structure
+    if isinstance(result, list):
+        units_data = result
+    else:
+        # Fallback for old structure
+        units_data = result.get('units', [result])
+    
+    # Display results
+    if VERBOSE:
+        _render_report(units_data, installment_result)
+    else:
+        total_sources = sum(len(unit_data.get('sources', [])) for unit_data in units_data)
+        total_plans = sum(
+            len(unit_data.get('unit', {}).get('installmentPlans', []))
+            for unit_data in installment_result
+        ) if isinstance(installment_result, list) else 0
+        logger.info("units=%d sources=%d plans=%d", len(units_data), total_sources, total_plans)
     
     # Step 5: Extract cutouts
     print("\n[5/7] Extracting cutout images from PDF...")
     cutouts_dir = os.path.join(OUTPUT_DIR, "cutouts")
     
-    # Combine contract and installment results for cutout extraction
-    combined_result = contract_result.copy() if isinstance(contract_result, list) else [contract_result]
-    
-    # Add installment data to the combined result
-    if isinstance(installment_result, list):
-        for unit_idx, installment_unit in enumerate(installment_result):
-            if unit_idx < len(combined_result):
-                # Add installment sources and installmentPlans to existing unit
-                installment_sources = installment_unit.get('sources', [])
-                installment_plans = installment_unit.get('unit', {}).get('installmentPlans', [])
-                installment_confidence = installment_unit.get('confidence', {})
-                
-                combined_result[unit_idx]['sources'].extend(installment_sources)
-                
-                # Add installmentPlans to the unit data
-                if 'unit' not in combined_result[unit_idx]:
-                    combined_result[unit_idx]['unit'] = {}
-                combined_result[unit_idx]['unit']['installmentPlans'] = installment_plans
-                
-                # Merge installment confidence with existing confidence
-                if 'confidence' not in combined_result[unit_idx]:
-                    combined_result[unit_idx]['confidence'] = {}
-                combined_result[unit_idx]['confidence'].update(installment_confidence)
-            else:
-                # Add new unit if installment has more units than contract
-                combined_result.append(installment_unit)
-    
-    # Extract cutout images
-    with CutoutExtractor(pdf_path) as extractor:
-        cutout_paths = extractor.extract_cutouts(
-            extraction_result=combined_result,
-            output_dir=cutouts_dir,
-            padding=10,
-            scale=2.0,
-            chunks=chunks
-        )
-    
-    print(f"\n✓ Extracted {sum(len(paths) for paths in cutout_paths.values())} cutout images")
+    # Combine contract and installment results once, for the cutouts,
+    # the report and the notification
+    combined_result = combine_results(contract_result, installment_result)
     
-    # Upload cutouts to S3 if bucket_name is provided
-    final_cutout_paths = cutout_paths  # Will be replaced with S3 URIs if upload succeeds
     s3_cutout_paths = None  # Track if S3 upload was successful
     
-    if bucket_name:
-        try:
-            # S3Provider usa credenciais de ambiente ou IAM role automaticamente
-            s3_provider = S3Provider()
-            s3_cutout_paths = upload_cutouts_to_s3(
-                s3_provider=s3_provider,
-                cutout_paths=cutout_paths,
-                bucket_name=bucket_name,
-                job_id=job_id
+    cited_chunks = _load_cited_chunks(chunks_output, combined_result)
+    
+    with CutoutExtractor(pdf_path, pdf_bytes=pdf_bytes) as extractor:
+        if bucket_name:
+            # Cutouts are uploaded from memory while the next pages are rendered
+            try:
+                # S3Provider usa credenciais de ambiente ou IAM role automaticamente
+                s3_cutout_paths = stream_cutouts_to_s3(
+                    s3_provider=s3_provider or get_s3_provider(),
+                    cutouts=extractor.iter_cutouts(
+                        extraction_result=combined_result,
+                        padding=10,
+                        scale=CUTOUT_SCALE,
+                        chunks=cited_chunks,
+                        image_format=CUTOUT_FORMAT
+                    ),
+                    bucket_name=bucket_name,
+                    job_id=job_id
+                )
+                print(f"✓ All cutouts uploaded to S3")
+            except Exception as e:
+                print(f"⚠️  Warning: Failed to upload cutouts to S3: {e}")
+                print(f"   Using local paths in manifest instead")
+                s3_cutout_paths = None
+        
+        # Without S3 (or if the upload failed) the cutouts are saved locally
+        if s3_cutout_paths is None:
+            cutout_paths = extractor.extract_cutouts(
+                extraction_result=combined_result,
+                output_dir=cutouts_dir,
+                padding=10,
+                scale=CUTOUT_SCALE,
+                chunks=cited_chunks,
+                image_format=CUTOUT_FORMAT
             )
-            final_cutout_paths = s3_cutout_paths
-            print(f"✓ All cutouts uploaded to S3")
-        except Exception as e:
-            print(f"⚠️  Warning: Failed to upload cutouts to S3: {e}")
-            print(f"   Using local paths in manifest instead")
-            s3_cutout_paths = None
+            print(f"\n✓ Extracted {sum(len(paths) for paths in cutout_paths.values())} cutout images")
+    
+    # Manifest with S3 URIs if uploaded, otherwise local paths
+    final_cutout_paths = s3_cutout_paths if s3_cutout_paths is not None else cutout_paths
     
     # Save cutout manifest (with S3 URIs if uploaded, otherwise local paths)
     cutout_manifest_path = os.path.join(OUTPUT_DIR, "cutout_manifest.json")
@@ -588,21 +825,19 @@ def main(pdf_path, bucket_name: str = None, job_id: str = None):
     if bucket_name and s3_cutout_paths is not None:
         # Merge results and map chunk IDs to S3 file keys
         merged_results = merge_results_with_cutouts(
-            contract_result=contract_result,
-            installment_result=installment_result,
+            combined_result=combined_result,
             s3_cutout_paths=s3_cutout_paths
         )
         
+        notification_payload = build_notification_payload(merged_results, job_id, bucket_name, 'success')
+        
+        # Serialized once: the same bytes are saved and published
+        payload_bytes = serialize_notification_payload(notification_payload)
+        
         # Save merged results for inspection
         merged_output = os.path.join(OUTPUT_DIR, "merged_notification_payload.json")
-        with open(merged_output, 'w', encoding='utf-8') as f:
-            json.dump({
-                'jobId': job_id,
-                'bucketName': bucket_name,
-                'status': 'success',
-                'processedAt': datetime.utcnow().isoformat() + 'Z',
-                'units': merged_results
-            }, f, indent=2, ensure_ascii=False)
+        with open(merged_output, 'wb') as f:
+            f.write(payload_bytes)
         print(f"✓ Merged notification payload saved to: {merged_output}")
         
         # Get SNS topic ARN from environment
@@ -610,16 +845,27 @@ def main(pdf_path, bucket_name: str = None, job_id: str = None):
         
         if sns_topic_arn:
             try:
-                sns_provider = SNSProvider()
-                message_id = send_sns_notification(
-                    sns_provider=sns_provider,
-                    topic_arn=sns_topic_arn,
-                    merged_results=merged_results,
-                    job_id=job_id,
+                # Payloads over the SNS size limit are published as an S3 pointer
+                message = offload_notification_payload(
+                    s3_provider=s3_provider or get_s3_provider(),
+                    payload=notification_payload,
+                    payload_bytes=payload_bytes,
                     bucket_name=bucket_name,
-                    status='success'
-                )
-                print(f"✓ SNS notification sent successfully! Message ID: {message_id}")
+                    job_id=job_id,
+                    subject=notification_subject(job_id)
+                ).decode('utf-8')
+                
+                if pending_notifications is not None:
+                    # Published in a batch with the other records (see flush_notifications)
+                    pending_notifications.append((sns_topic_arn, message, notification_subject(job_id)))
+                    print(f"✓ SNS notification queued")
+                else:
+                    message_id = get_sns_provider().publish_message(
+                        topic_arn=sns_topic_arn,
+                        message=message,
+                        subject=notification_subject(job_id)
+                    )
+                    print(f"✓ SNS notification sent successfully! Message ID: {message_id}")
             except Exception as e:
                 print(f"⚠️  Warning: Failed to send SNS notification: {e}")
                 import traceback
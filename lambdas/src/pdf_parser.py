@@ -1,51 +1,214 @@
 """PDF parsing module using Docling to extract structured chunks with coordinates."""
 
+import functools
+import gc
+import json
+import os
+import re
+from collections import Counter
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-def parse_pdf_to_chunks(pdf_path):
+import fitz  # PyMuPDF
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None  # type: ignore[assignment]
+
+# Pages converted by Docling at a time; bounds the size of the in-memory DoclingDocument
+BATCH_PAGES = 50
+
+# Leading pages checked for a text layer before deciding whether OCR is needed
+TEXT_LAYER_PROBE_PAGES = 2
+
+# Born-digital PDFs are chunked straight from their text layer, without Docling's
+# layout model (PDF_PARSER_FAST_PATH=0 always uses Docling)
+FAST_PATH = os.environ.get("PDF_PARSER_FAST_PATH", "1") == "1"
+
+# Fast path layout rules: header/footer bands (share of the page height),
+# minimum font size ratio of section headers to the body text
+MARGIN_BAND = 0.06
+HEADER_FONT_RATIO = 1.15
+HEADER_MAX_CHARS = 120
+
+# Span flag of bold fonts in PyMuPDF text dicts
+_BOLD_FLAG = 16
+
+# List items: bullets, "1.", "1)", "a)", "I -"
+_LIST_ITEM_RE = re.compile(r'^\s*(?:[•●▪◦\-–*]|\d{1,3}[.)]|[a-zA-Z][.)]|[IVXLC]{1,5}\s*[-–.)])\s+')
+
+
+@functools.lru_cache(maxsize=2)
+def _get_converter(do_ocr: bool = True):
+    """
+    Return a DocumentConverter shared by every document parsed by this container.
+    
+    Its pipeline loads the layout (and OCR) models on first use, so warm Lambda
+    invocations reuse them instead of paying that again.
+    
+    Args:
+        do_ocr: Run OCR on the pages (not needed when the PDF has a text layer)
+    
+    Returns:
+        The cached converter for this OCR setting
+    """
+    # Lazy import to avoid loading heavy ML dependencies during Lambda initialization
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    
+    pipeline_options = PdfPipelineOptions(do_ocr=do_ocr)
+    return DocumentConverter(
+        format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+    )
+
+
+def _has_text_layer(pdf: fitz.Document, max_pages: int = TEXT_LAYER_PROBE_PAGES) -> bool:
+    """
+    Check whether a PDF is born-digital, i.e. its leading pages carry extractable text.
+    
+    Args:
+        pdf: Open PyMuPDF document
+        max_pages: Number of leading pages checked
+    
+    Returns:
+        True if any of the checked pages has text (scanned PDFs have none)
+    """
+    return any(pdf[page_idx].get_text("text").strip() for page_idx in range(min(max_pages, pdf.page_count)))
+
+
+def parse_pdf_to_chunks(
+    pdf_path,
+    batch_pages: int = BATCH_PAGES,
+    fast_path: bool = FAST_PATH,
+    pdf_bytes: Optional[bytes] = None
+) -> Iterator[Dict[str, Any]]:
     """
     Extract all text chunks from PDF with their coordinates.
     
+    Born-digital PDFs are chunked with layout rules over their text layer
+    (see ``_iter_text_layer_chunks``). Scanned PDFs, or every PDF when
+    ``fast_path`` is off, are converted by Docling ``batch_pages`` pages at a
+    time and chunks are yielded as each batch is done, so peak memory depends
+    on the batch size instead of the document size.
+    
     Args:
         pdf_path: Path to the PDF file
+        batch_pages: Number of pages converted per Docling call
+        fast_path: Chunk born-digital PDFs without Docling
+        pdf_bytes: Content of the PDF, when it is held in memory instead of being
+            read from ``pdf_path`` (which then only names the document)
     
     Returns:
-        List of dictionaries containing text, page, bbox, element_type, and chunk_id
+        Iterator over dictionaries containing text, page, bbox, element_type, and chunk_id
     """
-    # Lazy import to avoid loading heavy ML dependencies during Lambda initialization
-    from docling.document_converter import DocumentConverter
+    chunk_counter: int = 0
+    
+    if pdf_bytes is not None:
+        pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
+    else:
+        pdf = fitz.open(pdf_path)
+    
+    with pdf:
+        page_count = pdf.page_count
+        # Born-digital PDFs already have their text; only scanned ones need OCR
+        born_digital = _has_text_layer(pdf)
+        
+        if born_digital and fast_path:
+            for chunk in _iter_text_layer_chunks(pdf):
+                chunk["chunk_id"] = f"chunk_{chunk_counter:03d}"
+                chunk_counter += 1
+                yield chunk
+            return
+    
+    converter = _get_converter(not born_digital)
+    if pdf_bytes is not None:
+        from docling.datamodel.base_models import DocumentStream
+    
+    for first_page in range(1, page_count + 1, batch_pages):
+        last_page = min(first_page + batch_pages - 1, page_count)
+        
+        # convert this page range to DoclingDocument (page numbers stay absolute)
+        if pdf_bytes is not None:
+            # A fresh stream per batch: Docling reads it to the end
+            source = DocumentStream(name=os.path.basename(pdf_path), stream=BytesIO(pdf_bytes))
+        else:
+            source = pdf_path
+        conv_res = converter.convert(source=source, page_range=(first_page, last_page))
+        doc = conv_res.document
+        
+        for chunk in _iter_document_chunks(doc):
+            chunk["chunk_id"] = f"chunk_{chunk_counter:03d}"
+            chunk_counter += 1
+            yield chunk
+        
+        # Release the batch before converting the next one
+        conv_res = None
+        doc = None
+        gc.collect()
+
+
+def save_chunks(chunks: Iterable[Dict[str, Any]], output_path: str) -> int:
+    """
+    Write chunks to a JSON Lines file (one compact JSON object per line).
     
-    # convert PDF to DoclingDocument
-    converter = DocumentConverter()
-    conv_res = converter.convert(source=pdf_path)
-    doc = conv_res.document
+    Chunks are written as they are produced and not kept, so passing the iterator
+    returned by ``parse_pdf_to_chunks`` holds only one page batch in memory at a
+    time. Read them back with ``agents.base_agent.iter_chunks``.
+    
+    Args:
+        chunks: Chunks to save
+        output_path: Output file path (``.jsonl``)
+    
+    Returns:
+        Number of chunks saved
+    """
+    count = 0
+    with open(output_path, 'wb') as f:
+        for chunk in chunks:
+            if orjson is not None:
+                f.write(orjson.dumps(chunk, option=orjson.OPT_APPEND_NEWLINE))
+            else:
+                f.write(json.dumps(chunk, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+            count += 1
+    return count
+
 
-    chunks = []
-    chunk_counter = 0
+def _iter_document_chunks(doc) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the chunks of a DoclingDocument, tables first (chunk_id is set by the caller).
+    
+    Args:
+        doc: Converted DoclingDocument
     
+    Returns:
+        Iterator over dictionaries containing text, page, bbox and element_type
+    """
     # Extract tables first (they have special handling)
     for table in doc.tables:
         # Get table provenance for location
-        if hasattr(table, 'prov') and table.prov:
-            prov = table.prov[0]
+        prov_list = getattr(table, "prov", None)
+        if prov_list:
+            prov = prov_list[0]
             bbox = prov.bbox
             page_ix = prov.page_no - 1
             
             # Export table as markdown for structured text
             table_text = table.export_to_markdown()
             
-            chunks.append({
-                "chunk_id": f"chunk_{chunk_counter:03d}",
+            yield {
+                "chunk_id": None,
                 "text": table_text,
                 "page": page_ix + 1,
                 "bbox": (bbox.l, bbox.t, bbox.r, bbox.b),
                 "element_type": "table"
-            })
-            chunk_counter += 1
+            }
     
     # Extract text items
-    skipped_no_text = 0
-    skipped_no_prov = 0
-    max_page_seen = 0
+    skipped_no_text: int = 0
+    skipped_no_prov: int = 0
+    max_page_seen: int = 0
     
     for item, _level in doc.iterate_items():
         text = getattr(item, "text", None)
@@ -54,59 +217,146 @@ def parse_pdf_to_chunks(pdf_path):
             continue
         
         # Get provenance (location info)
-        if not hasattr(item, 'prov') or not item.prov:
+        prov_list = getattr(item, "prov", None)
+        if not prov_list:
             skipped_no_prov += 1
             continue
-            
-        prov = item.prov[0]
+        
+        prov = prov_list[0]
         bbox = prov.bbox
         page_ix = prov.page_no - 1
         max_page_seen = max(max_page_seen, page_ix + 1)
         
         # Get element type
-        element_type = item.label.value if hasattr(item, 'label') and hasattr(item.label, 'value') else None
+        label = getattr(item, "label", None)
+        element_type = getattr(label, "value", None) if label is not None else None
         
-        chunks.append({
-            "chunk_id": f"chunk_{chunk_counter:03d}",
+        yield {
+            "chunk_id": None,
             "text": text,
             "page": page_ix + 1,
             "bbox": (bbox.l, bbox.t, bbox.r, bbox.b),
             "element_type": element_type
-        })
-        chunk_counter += 1
+        }
+
+def _iter_text_layer_chunks(pdf: fitz.Document) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the chunks of a born-digital PDF from its text layer (chunk_id is set by the caller).
+    
+    Rule-based layout: every page's tables become one chunk each (as markdown),
+    and every text block outside them one paragraph chunk, classified by its
+    position and fonts. Bboxes use Docling's bottom-left origin.
+    
+    Args:
+        pdf: Open PyMuPDF document
+    
+    Returns:
+        Iterator over dictionaries containing text, page, bbox and element_type
+    """
+    for page in pdf:
+        height = page.rect.height
+        
+        # Tables first, as in the Docling output
+        table_rects = []
+        if hasattr(page, "find_tables"):
+            for table in page.find_tables().tables:
+                rect = fitz.Rect(table.bbox)
+                table_rects.append(rect)
+                yield {
+                    "chunk_id": None,
+                    "text": table.to_markdown(),
+                    "page": page.number + 1,
+                    "bbox": (rect.x0, height - rect.y0, rect.x1, height - rect.y1),
+                    "element_type": "table"
+                }
+        
+        blocks = [
+            block for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+            if block.get("type") == 0
+        ]
+        
+        # Body text size: the most common span size on the page
+        sizes = Counter(
+            round(span["size"]) for block in blocks for line in block["lines"] for span in line["spans"]
+        )
+        body_size = sizes.most_common(1)[0][0] if sizes else 0
+        
+        for block in blocks:
+            rect = fitz.Rect(block["bbox"])
+            if any(rect.intersects(table_rect) for table_rect in table_rects):
+                continue
+            
+            lines = block["lines"]
+            spans = [span for line in lines for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            
+            text = " ".join(
+                "".join(span["text"] for span in line["spans"]).strip() for line in lines
+            ).strip()
+            
+            yield {
+                "chunk_id": None,
+                "text": text,
+                "page": page.number + 1,
+                "bbox": (rect.x0, height - rect.y0, rect.x1, height - rect.y1),
+                "element_type": _classify_block(text, rect, height, spans, body_size)
+            }
+
+
+def _classify_block(text: str, rect: fitz.Rect, page_height: float, spans: List[Dict[str, Any]], body_size: float) -> str:
+    """
+    Label a text block with the Docling element type it most likely is.
     
-    return chunks
+    Args:
+        text: Block text
+        rect: Block rectangle (top-left origin)
+        page_height: Page height in points
+        spans: Non-blank text spans of the block
+        body_size: Most common font size on the page
+    
+    Returns:
+        "page_header", "page_footer", "section_header", "list_item" or "text"
+    """
+    if rect.y1 <= page_height * MARGIN_BAND:
+        return "page_header"
+    if rect.y0 >= page_height * (1 - MARGIN_BAND):
+        return "page_footer"
+    
+    if len(text) <= HEADER_MAX_CHARS:
+        max_size = max(span["size"] for span in spans)
+        all_bold = all(span["flags"] & _BOLD_FLAG for span in spans)
+        if all_bold or (body_size and max_size >= body_size * HEADER_FONT_RATIO):
+            return "section_header"
+    
+    if _LIST_ITEM_RE.match(text):
+        return "list_item"
+    
+    return "text"
+
 
 if __name__ == "__main__":
-    import json
-    
     pdf_path = "contrato.pdf"
     
     # Extract all chunks from the entire document
     print("Parsing entire document...")
-    chunks = parse_pdf_to_chunks(pdf_path)
+    chunk_count = save_chunks(parse_pdf_to_chunks(pdf_path), "/tmp/document_chunks.jsonl")
     
     print("\n" + "=" * 50)
-    print(f"EXTRACTED {len(chunks)} CHUNKS")
+    print(f"EXTRACTED {chunk_count} CHUNKS")
     print("=" * 50)
     
-    # Save chunks to JSON (with previews for agno agent)
-    with open("/tmp/document_chunks.json", "w", encoding="utf-8") as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
-    
-    # Display summary
-    element_types = {}
-    for chunk in chunks:
-        etype = chunk['element_type'] or 'unknown'
-        element_types[etype] = element_types.get(etype, 0) + 1
+    # Display summary, streaming the saved chunks back
+    with open("/tmp/document_chunks.jsonl", 'rb') as f:
+        element_types = Counter(json.loads(line)['element_type'] or 'unknown' for line in f)
     
     print("\nElement Type Summary:")
-    for etype, count in sorted(element_types.items(), key=lambda x: x[1], reverse=True):
+    for etype, count in element_types.most_common():
         print(f"  {etype}: {count}")
     
     print("\n" + "=" * 50)
-    print("✅ All chunks saved to /tmp/document_chunks.json")
-    print(f"✅ Total chunks: {len(chunks)}")
+    print("✅ All chunks saved to /tmp/document_chunks.jsonl")
+    print(f"✅ Total chunks: {chunk_count}")
     print("\n🎯 Ready for agno agent integration!")
     print("   Each chunk contains:")
     print("   - text: Content")
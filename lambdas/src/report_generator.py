@@ -1,11 +1,81 @@
 """Report generation module for units extraction results."""
 
+import functools
+import json
 import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
 
-def generate_units_report(extraction_result: List[Dict[str, Any]], output_dir: str, cutout_manifest_path: str = None) -> str:
+# Cutout manifest keys: "unit1_fieldName" -> ("1", "fieldName")
+_UNIT_KEY_RE = re.compile(r'^unit(\d+)_(.+)$')
+
+# Marker of each confidence level
+_CONFIDENCE_EMOJI = {"high": "🟢", "medium": "🟡", "low": "🔴"}
+
+# Constant report segments, built once
+_REPORT_INTRO = (
+    "## Table of Contents\n\n"
+    "- [Units Information](#units-information)\n"
+    "- [Installment Plans](#installment-plans)\n"
+    "- [Summary](#summary)\n\n"
+    "## Units Information\n\n"
+)
+_NO_IMAGE_ROW = "| **Image** | *No image available* |\n"
+_SEPARATOR = "---\n\n"
+
+# Templates of the per-field and per-plan tables, each filled with a single
+# format_map() call
+_FIELD_TEMPLATE = (
+    "### {label}\n\n"
+    "| | |\n"
+    "|---|---|\n"
+    "| **Name** | {label} |\n"
+    "| **Value** | {value} |\n"
+    "| **Confidence** | {emoji} {conf} |\n"
+    "{image_row}"
+    "\n"
+)
+_PLAN_TEMPLATE = (
+    "#### Plan {number}\n\n"
+    "| Field | Value |\n"
+    "|-------|-------|\n"
+    "| **Series** | {series} |\n"
+    "| **Total Installments** | {total_installments} |\n"
+    "| **Installment Amount** | {installment_amount} |\n"
+    "| **Total Value** | {total_value} |\n"
+    "| **First Due Date** | {first_due_date} |\n"
+    "| **Indexer Code** | {indexer_code} |\n"
+    "| **Confidence** | {confidence} |\n"
+)
+
+
+@dataclass
+class _ReportAggregates:
+    """Totals and cutout lookups of a report, computed in a single pass."""
+    
+    total_value: float = 0
+    total_area: float = 0
+    valid_units: int = 0
+    total_installment_plans: int = 0
+    low_conf_count: int = 0
+    cutouts_by_unit: Dict[int, Dict[str, List[str]]] = field(default_factory=dict)
+    installment_cutouts_by_unit: Dict[int, List[str]] = field(default_factory=dict)
+
+
+def generate_units_report(
+    extraction_result: List[Dict[str, Any]],
+    output_dir: str,
+    cutout_manifest_path: str = None,
+    generated_at: Optional[str] = None
+) -> str:
     """
     Generate a comprehensive markdown report containing all units information and installment plans.
     
@@ -13,215 +83,278 @@ def generate_units_report(extraction_result: List[Dict[str, Any]], output_dir: s
         extraction_result: List of unit data from extraction
         output_dir: Output directory path
         cutout_manifest_path: Path to cutout manifest file (optional)
+        generated_at: Timestamp shown in the report header (optional, defaults to
+            now). Callers rendering several reports can compute it once and pass it
+            to every call
     
     Returns:
         Path to the generated markdown report file
     """
     report_path = os.path.join(output_dir, "report.md")
+    generated_at = generated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     # Load cutout manifest if provided
     cutout_manifest = {}
     if cutout_manifest_path and os.path.exists(cutout_manifest_path):
-        import json
-        with open(cutout_manifest_path, 'r', encoding='utf-8') as f:
-            cutout_manifest = json.load(f)
-    
-    with open(report_path, 'w', encoding='utf-8') as f:
-        # Header
-        f.write("# Contract Information Extraction Report\n\n")
-        f.write(f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | **Units:** {len(extraction_result)}\n\n")
+        with open(cutout_manifest_path, 'rb') as f:
+            manifest_bytes = f.read()
+        if orjson is not None:
+            cutout_manifest = orjson.loads(manifest_bytes)
+        else:
+            cutout_manifest = json.loads(manifest_bytes)
+    
+    # Totals and per-unit cutouts, computed once before rendering
+    aggregates = _aggregate(extraction_result, cutout_manifest)
+    
+    # Cutout paths relative to the report; relpath resolves the working
+    # directory on every call, so each path is only relativized once
+    relative = functools.lru_cache(maxsize=None)(lambda path: os.path.relpath(path, output_dir))
+    
+    # The report is built in memory and written with a single call; each table
+    # is rendered from its template with one call
+    parts: List[str] = []
+    append = parts.append
+    extend = parts.extend
+    
+    # Header, table of contents and Units Information heading
+    extend((
+        "# Contract Information Extraction Report\n\n",
+        f"**Generated:** {generated_at} | **Units:** {len(extraction_result)}\n\n",
+        _REPORT_INTRO,
+    ))
+    
+    # Process each unit
+    for unit_idx, unit_data in enumerate(extraction_result):
+        unit = unit_data.get('unit', unit_data)
+        confidence = unit_data.get('confidence', {})
         
-        # Table of Contents
-        f.write("## Table of Contents\n\n")
-        f.write("- [Units Information](#units-information)\n")
-        f.write("- [Installment Plans](#installment-plans)\n")
-        f.write("- [Summary](#summary)\n\n")
+        append(f"### Unit {unit_idx + 1}\n\n")
         
-        # Units Information Section
-        f.write("## Units Information\n\n")
+        # Get cutout images for this unit
+        unit_cutouts = aggregates.cutouts_by_unit.get(unit_idx + 1, {})
         
-        # Process each unit
-        for unit_idx, unit_data in enumerate(extraction_result):
-            unit = unit_data.get('unit', unit_data)
-            confidence = unit_data.get('confidence', {})
-            
-            f.write(f"### Unit {unit_idx + 1}\n\n")
-            
-            # Get cutout images for this unit
-            unit_cutouts = {}
-            for field_key, cutout_paths in cutout_manifest.items():
-                if f"unit{unit_idx + 1}_" in field_key:
-                    field_name = field_key.replace(f"unit{unit_idx + 1}_", "")
-                    unit_cutouts[field_name] = cutout_paths
+        # Create table for each field
+        for field_key, field_label, format_value in _FIELD_INFO:
+            conf = confidence.get(field_key, 'unknown')
+            conf_emoji = _CONFIDENCE_EMOJI.get(conf, "⚪")
             
-            # Define field order and labels
-            field_info = [
-                ("unitCode", "Unit Code"),
-                ("areaM2", "Area (m²)"),
-                ("sellValue", "Sell Value (R$)"),
-                ("pricePerM2", "Price per m² (R$)"),
-                ("buyerName", "Buyer Name"),
-                ("signingDate", "Signing Date"),
-            ]
+            # Format values based on field type
+            formatted_value = format_value(unit.get(field_key))
             
-            # Create table for each field
-            for field_key, field_label in field_info:
-                value = unit.get(field_key, 'N/A')
-                conf = confidence.get(field_key, 'unknown')
-                conf_emoji = {"high": "🟢", "medium": "🟡", "low": "🔴"}.get(conf, "⚪")
-                
-                # Format values based on field type
-                formatted_value = _format_field_value(field_key, value)
-                
-                f.write(f"### {field_label}\n\n")
-                
-                f.write("| | |\n")
-                f.write("|---|---|\n")
-                f.write(f"| **Name** | {field_label} |\n")
-                f.write(f"| **Value** | {formatted_value} |\n")
-                f.write(f"| **Confidence** | {conf_emoji} {conf} |\n")
-                
-                # Add image row if cutout exists
-                if field_key in unit_cutouts and unit_cutouts[field_key]:
-                    relative_path = os.path.relpath(unit_cutouts[field_key][0], output_dir)
-                    f.write(f"| **Image** | ![{field_label}]({relative_path}) |\n")
-                else:
-                    f.write(f"| **Image** | *No image available* |\n")
-                
-                f.write("\n")
+            # Add image row if cutout exists
+            if field_key in unit_cutouts and unit_cutouts[field_key]:
+                image_row = f"| **Image** | ![{field_label}]({relative(unit_cutouts[field_key][0])}) |\n"
+            else:
+                image_row = _NO_IMAGE_ROW
             
-            f.write("---\n\n")
+            append(_FIELD_TEMPLATE.format_map({
+                'label': field_label,
+                'value': formatted_value,
+                'emoji': conf_emoji,
+                'conf': conf,
+                'image_row': image_row,
+            }))
         
-        # Installment Plans Section
-        f.write("## Installment Plans\n\n")
+        append(_SEPARATOR)
+    
+    # Installment Plans Section
+    append("## Installment Plans\n\n")
+    
+    # Process installment plans for each unit
+    for unit_idx, unit_data in enumerate(extraction_result):
+        unit = unit_data.get('unit', unit_data)
+        installment_plans = unit.get('installmentPlans', [])
         
-        # Process installment plans for each unit
-        for unit_idx, unit_data in enumerate(extraction_result):
-            unit = unit_data.get('unit', unit_data)
-            installment_plans = unit.get('installmentPlans', [])
+        if installment_plans:
+            append(f"### Unit {unit_idx + 1} - {unit.get('unitCode', 'Unknown Unit')}\n\n")
             
-            if installment_plans:
-                f.write(f"### Unit {unit_idx + 1} - {unit.get('unitCode', 'Unknown Unit')}\n\n")
-                
-                for plan_idx, plan in enumerate(installment_plans):
-                    f.write(f"#### Plan {plan_idx + 1}\n\n")
-                    
-                    # Create table for installment plan details
-                    f.write("| Field | Value |\n")
-                    f.write("|-------|-------|\n")
-                    f.write(f"| **Series** | {plan.get('series', 'N/A')} |\n")
-                    f.write(f"| **Total Installments** | {plan.get('totalInstallments', 'N/A')} |\n")
-                    f.write(f"| **Installment Amount** | {_format_currency(plan.get('installmentAmount', 'N/A'))} |\n")
-                    f.write(f"| **Total Value** | {_format_currency(plan.get('totalValue', 'N/A'))} |\n")
-                    f.write(f"| **First Due Date** | {plan.get('firstDueDate', 'N/A')} |\n")
-                    f.write(f"| **Indexer Code** | {plan.get('indexerCode', 'N/A')} |\n")
-                    f.write(f"| **Confidence** | {plan.get('confidence', 'N/A')} |\n")
-                    
-                    # Add cutout images for installment plans
-                    installment_cutouts = []
-                    for field_key, cutout_paths in cutout_manifest.items():
-                        if f"unit{unit_idx + 1}_installmentPlans" in field_key:
-                            installment_cutouts.extend(cutout_paths)
-                    
-                    if installment_cutouts:
-                        f.write(f"\n**Source Images:**\n\n")
-                        for cutout_path in installment_cutouts:
-                            relative_path = os.path.relpath(cutout_path, output_dir)
-                            f.write(f"![Installment Plan Source]({relative_path})\n\n")
-                    else:
-                        f.write(f"\n*No source images available*\n\n")
-                    
-                    f.write("---\n\n")
+            # Cutout images of the unit's installment plans, repeated under every plan
+            installment_cutouts = aggregates.installment_cutouts_by_unit.get(unit_idx + 1, ())
+            if installment_cutouts:
+                sources_block = "\n**Source Images:**\n\n" + "".join(
+                    f"![Installment Plan Source]({relative(cutout_path)})\n\n"
+                    for cutout_path in installment_cutouts
+                )
             else:
-                f.write(f"### Unit {unit_idx + 1} - {unit.get('unitCode', 'Unknown Unit')}\n\n")
-                f.write("*No installment plans found - Unit may be paid (QUITADA)*\n\n")
-        
-        # Summary statistics
-        f.write("## Summary\n\n")
-        
-        # Calculate totals
-        total_value = 0
-        total_area = 0
-        valid_units = 0
-        total_installment_plans = 0
-        
-        for unit_data in extraction_result:
-            unit = unit_data.get('unit', unit_data)
-            installment_plans = unit.get('installmentPlans', [])
-            total_installment_plans += len(installment_plans)
+                sources_block = "\n*No source images available*\n\n"
             
-            try:
-                if unit.get('sellValue'):
-                    total_value += float(unit.get('sellValue', 0))
-                if unit.get('areaM2'):
-                    total_area += float(unit.get('areaM2', 0))
-                valid_units += 1
-            except (ValueError, TypeError):
-                continue
+            for plan_idx, plan in enumerate(installment_plans):
+                # Create table for installment plan details
+                append(_PLAN_TEMPLATE.format_map({
+                    'number': plan_idx + 1,
+                    'series': plan.get('series', 'N/A'),
+                    'total_installments': plan.get('totalInstallments', 'N/A'),
+                    'installment_amount': _format_currency(plan.get('installmentAmount', 'N/A')),
+                    'total_value': _format_currency(plan.get('totalValue', 'N/A')),
+                    'first_due_date': plan.get('firstDueDate', 'N/A'),
+                    'indexer_code': plan.get('indexerCode', 'N/A'),
+                    'confidence': plan.get('confidence', 'N/A'),
+                }))
+                extend((sources_block, _SEPARATOR))
+        else:
+            extend((
+                f"### Unit {unit_idx + 1} - {unit.get('unitCode', 'Unknown Unit')}\n\n",
+                "*No installment plans found - Unit may be paid (QUITADA)*\n\n",
+            ))
+    
+    # Summary statistics
+    append("## Summary\n\n")
+    
+    total_value = aggregates.total_value
+    total_area = aggregates.total_area
+    
+    append(f"**Total Value:** R$ {total_value:,.2f} | ")
+    append(f"**Total Area:** {total_area:,.2f} m² | ")
+    if total_area > 0:
+        append(f"**Avg Price/m²:** R$ {total_value/total_area:.2f} | ")
+    append(f"**Total Installment Plans:** {aggregates.total_installment_plans}\n\n")
+    
+    # Confidence summary (simplified)
+    if aggregates.low_conf_count > 0:
+        append(f"⚠️ **{aggregates.low_conf_count} fields with low confidence**\n\n")
+    
+    append("*Report complete*\n")
+    
+    _write_bytes(report_path, "".join(parts).encode('utf-8'))
+    
+    return report_path
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """
+    Write already encoded data to a file with raw os.write calls.
+    
+    The report is encoded once up front, so the text and buffering layers of
+    open() would only add overhead.
+    
+    Args:
+        path: Path of the file to create or truncate
+        data: Bytes to write
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _aggregate(
+    extraction_result: List[Dict[str, Any]],
+    cutout_manifest: Dict[str, List[str]]
+) -> _ReportAggregates:
+    """
+    Compute the report totals and cutout lookups in a single pass over the units.
+    
+    Args:
+        extraction_result: List of unit data from extraction
+        cutout_manifest: Manifest mapping "unit{N}_{fieldName}" keys to cutout paths
+        
+    Returns:
+        The aggregates of the report
+    """
+    aggregates = _ReportAggregates()
+    aggregates.cutouts_by_unit, aggregates.installment_cutouts_by_unit = _index_cutouts(cutout_manifest)
+    
+    for unit_data in extraction_result:
+        unit = unit_data.get('unit', unit_data)
+        aggregates.total_installment_plans += len(unit.get('installmentPlans', []))
         
-        f.write(f"**Total Value:** R$ {total_value:,.2f} | ")
-        f.write(f"**Total Area:** {total_area:,.2f} m² | ")
-        if total_area > 0:
-            f.write(f"**Avg Price/m²:** R$ {total_value/total_area:.2f} | ")
-        f.write(f"**Total Installment Plans:** {total_installment_plans}\n\n")
+        for conf in unit_data.get('confidence', {}).values():
+            aggregates.low_conf_count += (conf == 'low')
         
-        # Confidence summary (simplified)
-        all_confidences = {}
-        for unit_data in extraction_result:
-            confidence = unit_data.get('confidence', {})
-            for field, conf in confidence.items():
-                if field not in all_confidences:
-                    all_confidences[field] = []
-                all_confidences[field].append(conf)
+        try:
+            if unit.get('sellValue'):
+                aggregates.total_value += float(unit.get('sellValue', 0))
+            if unit.get('areaM2'):
+                aggregates.total_area += float(unit.get('areaM2', 0))
+            aggregates.valid_units += 1
+        except (ValueError, TypeError):
+            continue
+    
+    return aggregates
+
+
+def _index_cutouts(
+    cutout_manifest: Dict[str, List[str]]
+) -> Tuple[Dict[int, Dict[str, List[str]]], Dict[int, List[str]]]:
+    """
+    Index the cutout manifest by unit, parsing every key once.
+    
+    Args:
+        cutout_manifest: Manifest mapping "unit{N}_{fieldName}" keys to cutout paths
         
-        low_conf_count = sum(1 for confs in all_confidences.values() for conf in confs if conf == 'low')
-        if low_conf_count > 0:
-            f.write(f"⚠️ **{low_conf_count} fields with low confidence**\n\n")
+    Returns:
+        Tuple of (unit number -> field name -> cutout paths,
+        unit number -> cutout paths of its installment plans)
+    """
+    cutouts_by_unit = defaultdict(dict)
+    installment_cutouts_by_unit = defaultdict(list)
+    
+    for field_key, cutout_paths in cutout_manifest.items():
+        match = _UNIT_KEY_RE.match(field_key)
+        if not match:
+            continue
         
-        f.write("*Report complete*\n")
+        unit_number = int(match.group(1))
+        field_name = match.group(2)
+        cutouts_by_unit[unit_number][field_name] = cutout_paths
+        if field_name.startswith('installmentPlans'):
+            installment_cutouts_by_unit[unit_number].extend(cutout_paths)
     
-    return report_path
+    # Plain dicts, so lookups of units without cutouts do not insert empty buckets
+    return dict(cutouts_by_unit), dict(installment_cutouts_by_unit)
 
 
-def _format_field_value(field_key: str, value) -> str:
+def _format_text(value) -> str:
     """
-    Format field values based on their type.
+    Format text values.
     
     Args:
-        field_key: The field key
         value: The value to format
         
     Returns:
-        Formatted string value
+        The value as a string
     """
     if value is None or value == 'N/A':
         return 'N/A'
+    return str(value)
+
+
+def _format_date(value) -> str:
+    """
+    Format date values.
     
-    # Format currency fields
-    if field_key in ['sellValue', 'pricePerM2']:
-        try:
-            num_value = float(value)
-            return f"R$ {num_value:,.2f}"
-        except (ValueError, TypeError):
-            return str(value)
-    
-    # Format area fields
-    elif field_key == 'areaM2':
-        try:
-            num_value = float(value)
-            return f"{num_value:,.2f} m²"
-        except (ValueError, TypeError):
-            return str(value)
+    Args:
+        value: The value to format
+        
+    Returns:
+        The date string, or 'N/A' when empty
+    """
+    if value and value != 'N/A':
+        return str(value)
+    return 'N/A'
+
+
+def _format_area(value) -> str:
+    """
+    Format area values.
     
-    # Format dates
-    elif field_key == 'signingDate':
-        if value and value != 'N/A':
-            return str(value)
+    Args:
+        value: The value to format
+        
+    Returns:
+        Formatted area string
+    """
+    if value is None or value == 'N/A':
         return 'N/A'
     
-    
-    # Default formatting
-    return str(value)
+    try:
+        return _format_area_number(float(value))
+    except (ValueError, TypeError):
+        return str(value)
 
 
 def _format_currency(value) -> str:
@@ -238,7 +371,32 @@ def _format_currency(value) -> str:
         return 'N/A'
     
     try:
-        num_value = float(value)
-        return f"R$ {num_value:,.2f}"
+        return _format_currency_number(float(value))
     except (ValueError, TypeError):
-        return str(value)
\ No newline at end of file
+        return str(value)
+
+
+# Installment series and unit prices repeat the same amounts, so the formatted
+# strings are memoized per value
+@functools.lru_cache(maxsize=4096)
+def _format_currency_number(value: float) -> str:
+    """Format a number as Brazilian reais, e.g. "R$ 1,234.50"."""
+    return f"R$ {value:,.2f}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_area_number(value: float) -> str:
+    """Format a number as square meters, e.g. "1,234.50 m²"."""
+    return f"{value:,.2f} m²"
+
+
+# Unit fields of the report, in order: (key, label, formatter). Defined after
+# the formatters they reference
+_FIELD_INFO = (
+    ("unitCode", "Unit Code", _format_text),
+    ("areaM2", "Area (m²)", _format_area),
+    ("sellValue", "Sell Value (R$)", _format_currency),
+    ("pricePerM2", "Price per m² (R$)", _format_currency),
+    ("buyerName", "Buyer Name", _format_text),
+    ("signingDate", "Signing Date", _format_date),
+)
@@ -1,13 +1,30 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError
+from collections import OrderedDict
 from io import BytesIO
-from typing import Optional, Union, Dict, Any
+import logging
+from typing import TYPE_CHECKING, ClassVar, Optional, Union, Dict, Any, List, Tuple
 import os
-import pandas as pd
-import dotenv
+import threading
 
-env = dotenv.load_dotenv()
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Inside Lambda the configuration comes from environment variables; a .env file is
+# only read for local runs that opt in
+if os.getenv('GCB_LOAD_DOTENV'):
+    import dotenv
+    dotenv.load_dotenv()
+
+# Total size of the objects kept by get_file_as_bytes(use_cache=True)
+OBJECT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# read_parquet_to_df arguments that pyarrow.parquet.read_table understands as well
+_ARROW_PARQUET_KWARGS = frozenset({'columns', 'filters'})
 
 class S3Provider:
     """
@@ -21,6 +38,9 @@ class S3Provider:
         s3_client: The boto3 S3 client instance used for AWS operations
     """
     
+    # boto3 clients shared by every instance, keyed by (region, access key ID)
+    _client_cache: ClassVar[Dict[Tuple[Optional[str], Optional[str]], Any]] = {}
+    
     def __init__(self, credentials: dict[str, str] = None):
         """
         Initialize the S3Provider with a boto3 S3 client.
@@ -53,14 +73,44 @@ class S3Provider:
         if aws_access_key_id and aws_secret_access_key:
             client_params['aws_access_key_id'] = aws_access_key_id
             client_params['aws_secret_access_key'] = aws_secret_access_key
-            print("🔑 Using explicit AWS credentials (access key + secret key)")
+            logger.info("Using explicit AWS credentials (access key + secret key)")
         else:
-            print("🔐 Using default AWS credential chain (IAM role/profile)")
+            logger.info("Using default AWS credential chain (IAM role/profile)")
         
         # Include region if specified
         if region_name:
             client_params['region_name'] = region_name
         
+        # Credentials and region, reused by the pyarrow filesystem
+        self._session_params = dict(client_params)
+        
+        # Room for concurrent uploads from a thread pool (botocore's default pool
+        # of 10 connections would make extra threads wait for a free connection),
+        # kept-alive connections and adaptive retries for the life of the container
+        client_params['config'] = Config(
+            max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', 50)),
+            tcp_keepalive=True,
+            retries={'max_attempts': 3, 'mode': 'adaptive'}
+        )
+        
+        # Transfer settings shared by every upload_file and download_file call:
+        # objects above 8 MiB are transferred as parallel 8 MiB parts / ranged GETs
+        self.transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=10,
+            use_threads=True
+        )
+        
+        # Objects read with get_file_as_bytes(use_cache=True), keyed by (bucket, key)
+        # with their ETag, least recently used first
+        self._object_cache: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+        self._object_cache_bytes = 0
+        self._object_cache_lock = threading.Lock()
+        
+        # pyarrow S3 filesystem used by read_parquet_to_df, created on first use
+        self._arrow_fs = None
+        
         # Localstack support (commented out, but structure preserved)
         # endpoint_url = credentials.get('endpoint_url') or os.getenv('S3_ENDPOINT')
         # if endpoint_url:
@@ -69,11 +119,18 @@ class S3Provider:
         #     config = Config(s3={'addressing_style': 'path'})
         #     client_params['config'] = config
 
-        try:
-            print('client_params', client_params)
-            self.s3_client = boto3.client('s3', **client_params)
-        except Exception as e:
-            raise ValueError(f"Failed to initialize S3 client: {e}")
+        # Building a client (endpoint resolution, config files, TLS setup) is
+        # expensive, so instances with the same region and credentials share one
+        cache_key = (client_params.get('region_name'), client_params.get('aws_access_key_id'))
+        s3_client = S3Provider._client_cache.get(cache_key)
+        if s3_client is None:
+            try:
+                logger.debug("Creating S3 client (region=%s)", client_params.get('region_name'))
+                s3_client = boto3.client('s3', **client_params)
+            except Exception as e:
+                raise ValueError(f"Failed to initialize S3 client: {e}")
+            s3_client = S3Provider._client_cache.setdefault(cache_key, s3_client)
+        self.s3_client = s3_client
 
     def get_object(self, bucket_name: str, key: str) -> Dict[str, Any]:
         """
@@ -178,12 +235,10 @@ class S3Provider:
             >>> content = buffer.read().decode('utf-8')
             >>> buffer.seek(0)  # Reset position for another read
         """
-        # Get the object from S3
-        response = self.s3_client.get_object(Bucket=bucket_name, Key=key)
-        file_content = response['Body'].read()
-        
-        # Create a BytesIO buffer
-        buffer = BytesIO(file_content)
+        # Stream the object into the buffer; objects above the multipart
+        # threshold are fetched as concurrent ranged GETs
+        buffer = BytesIO()
+        self.s3_client.download_fileobj(bucket_name, key, buffer, Config=self.transfer_config)
         buffer.seek(0)  # Reset position to beginning
         
         return buffer
@@ -215,8 +270,8 @@ class S3Provider:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(local_path) if os.path.dirname(local_path) else '.', exist_ok=True)
         
-        # Download file
-        self.s3_client.download_file(bucket_name, key, local_path)
+        # Download file (large files as concurrent ranged GETs)
+        self.s3_client.download_file(bucket_name, key, local_path, Config=self.transfer_config)
         
         return local_path
     
@@ -248,7 +303,9 @@ class S3Provider:
             raise FileNotFoundError(f"Local file not found: {local_path}")
         
         # Upload file
-        self.s3_client.upload_file(local_path, bucket_name, key, ExtraArgs=extra_args)
+        self.s3_client.upload_file(
+            local_path, bucket_name, key, ExtraArgs=extra_args, Config=self.transfer_config
+        )
         
         return f"s3://{bucket_name}/{key}"
     
@@ -279,11 +336,24 @@ class S3Provider:
         if content_type:
             extra_args['ContentType'] = content_type
         
-        self.s3_client.put_object(Bucket=bucket_name, Key=key, Body=data, **extra_args)
+        if len(data) >= self.transfer_config.multipart_threshold:
+            # Large payloads: parallel multipart upload
+            self.s3_client.upload_fileobj(
+                BytesIO(data), bucket_name, key, ExtraArgs=extra_args, Config=self.transfer_config
+            )
+        else:
+            # Small payloads (cutouts): a single PUT, without starting a transfer manager
+            self.s3_client.put_object(Bucket=bucket_name, Key=key, Body=data, **extra_args)
         
         return f"s3://{bucket_name}/{key}"
     
-    def get_file_as_bytes(self, bucket_name: str, key: str) -> bytes:
+    def get_file_as_bytes(
+        self,
+        bucket_name: str,
+        key: str,
+        max_size: Optional[int] = None,
+        use_cache: bool = False
+    ) -> Optional[bytes]:
         """
         Get file content as raw bytes directly from S3.
         
@@ -295,9 +365,15 @@ class S3Provider:
         Args:
             bucket_name: The name of the S3 bucket containing the file
             key: The S3 object key (path) of the file to download
+            max_size: Size limit in bytes; larger objects are not read
+                (the body is closed after the response headers)
+            use_cache: Keep the object in memory for later calls. Repeated reads
+                are a conditional GET on its ETag, answered without a body
+                while the object is unchanged
             
         Returns:
-            bytes: The raw file content as bytes
+            bytes: The raw file content as bytes, or None if the object is
+                larger than ``max_size``
             
         Raises:
             botocore.exceptions.ClientError: If the file doesn't exist or
@@ -307,10 +383,60 @@ class S3Provider:
             >>> file_bytes = s3_provider.get_file_as_bytes('my-bucket', 'data/file.bin')
             >>> # Process bytes directly
         """
-        response = self.s3_client.get_object(Bucket=bucket_name, Key=key)
-        return response['Body'].read()
+        cache_key = (bucket_name, key)
+        cached = None
+        get_params = {'Bucket': bucket_name, 'Key': key}
+        if use_cache:
+            with self._object_cache_lock:
+                cached = self._object_cache.get(cache_key)
+            if cached is not None:
+                get_params['IfNoneMatch'] = cached[0]
+        
+        try:
+            response = self.s3_client.get_object(**get_params)
+        except ClientError as e:
+            # 304 Not Modified: the cached copy is still current
+            if cached is not None and e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                with self._object_cache_lock:
+                    if cache_key in self._object_cache:
+                        self._object_cache.move_to_end(cache_key)
+                return cached[1]
+            raise
+        
+        if max_size is not None and response['ContentLength'] > max_size:
+            response['Body'].close()
+            return None
+        data = response['Body'].read()
+        
+        if use_cache:
+            self._cache_object(cache_key, response['ETag'], data)
+        return data
+    
+    def _cache_object(self, cache_key: Tuple[str, str], etag: str, data: bytes) -> None:
+        """
+        Store an object in the in-memory cache, evicting the least recently used ones.
+        
+        Args:
+            cache_key: (bucket name, key) of the object
+            etag: ETag of the object
+            data: Object content
+        """
+        if len(data) > OBJECT_CACHE_MAX_BYTES:
+            return
+        
+        with self._object_cache_lock:
+            previous = self._object_cache.pop(cache_key, None)
+            if previous is not None:
+                self._object_cache_bytes -= len(previous[1])
+            
+            self._object_cache[cache_key] = (etag, data)
+            self._object_cache_bytes += len(data)
+            
+            while self._object_cache_bytes > OBJECT_CACHE_MAX_BYTES:
+                _, (_, evicted) = self._object_cache.popitem(last=False)
+                self._object_cache_bytes -= len(evicted)
     
-    def read_parquet_to_df(self, bucket_name: str, key: str, **kwargs) -> pd.DataFrame:
+    def read_parquet_to_df(self, bucket_name: str, key: str, **kwargs) -> "pd.DataFrame":
         """
         Download a Parquet file from S3 and return it as a pandas DataFrame.
         
@@ -323,8 +449,12 @@ class S3Provider:
             key: The S3 object key (path) of the Parquet file (must end with .parquet)
             **kwargs: Additional arguments to pass to pd.read_parquet(), such as:
                 - columns: List of column names to read
+                - filters: Row filters, applied while reading the row groups
                 - engine: Parquet engine to use ('pyarrow' or 'fastparquet')
                 - dtype: Data types for columns
+                When only ``columns`` and/or ``filters`` are given and pyarrow is
+                installed, the file is read straight from S3 with pyarrow: only the
+                footer and the needed row groups/columns are fetched.
                 
         Returns:
             pd.DataFrame: A pandas DataFrame containing the Parquet data
@@ -344,5 +474,41 @@ class S3Provider:
         if not key.lower().endswith('.parquet'):
             raise ValueError(f"File key '{key}' does not have a .parquet extension")
         
+        if set(kwargs) <= _ARROW_PARQUET_KWARGS:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                pq = None
+            
+            if pq is not None:
+                # Ranged reads of the footer and the needed row groups/columns, decoded
+                # in threads; Arrow buffers are released as pandas takes them over
+                table = pq.read_table(
+                    f"{bucket_name}/{key}",
+                    filesystem=self._get_arrow_filesystem(),
+                    use_threads=True,
+                    **kwargs
+                )
+                return table.to_pandas(split_blocks=True, self_destruct=True)
+        
+        # pandas is heavy to import, so it is only loaded when a Parquet file is read
+        import pandas as pd
+        
         buffer = self.download_file(bucket_name, key)
-        return pd.read_parquet(buffer, **kwargs)
\ No newline at end of file
+        return pd.read_parquet(buffer, **kwargs)
+    
+    def _get_arrow_filesystem(self) -> Any:
+        """Return the pyarrow S3 filesystem of this provider, creating it on first use."""
+        if self._arrow_fs is None:
+            from pyarrow import fs
+            
+            fs_params = {}
+            if self._session_params.get('aws_access_key_id'):
+                fs_params['access_key'] = self._session_params['aws_access_key_id']
+                fs_params['secret_key'] = self._session_params['aws_secret_access_key']
+            if self._session_params.get('region_name'):
+                fs_params['region'] = self._session_params['region_name']
+            
+            self._arrow_fs = fs.S3FileSystem(**fs_params)
+        
+        return self._arrow_fs
\ No newline at end of file
@@ -1,13 +1,38 @@
 """SNS Provider for publishing messages to AWS SNS topics."""
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Optional, Dict, Any
+from typing import ClassVar, Optional, Dict, Any, List, Tuple, Union
 import json
+import logging
 import os
-import dotenv
 
-env = dotenv.load_dotenv()
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+# Inside Lambda the configuration comes from environment variables; a .env file is
+# only read for local runs that opt in
+if os.getenv('GCB_LOAD_DOTENV'):
+    import dotenv
+    dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Limits of a single SNS PublishBatch request
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+def _to_json(message: Union[Dict[str, Any], str]) -> str:
+    """Serialize a message to JSON, passing already serialized strings through."""
+    if isinstance(message, str):
+        return message
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(message, ensure_ascii=False, default=str, separators=(',', ':'))
+
 
 class SNSProvider:
     """
@@ -19,6 +44,9 @@ class SNSProvider:
         sns_client: The boto3 SNS client instance used for AWS operations
     """
     
+    # boto3 clients shared by every instance, keyed by (region, access key ID)
+    _client_cache: ClassVar[Dict[Tuple[Optional[str], Optional[str]], Any]] = {}
+    
     def __init__(self, credentials: Optional[Dict[str, str]] = None):
         """
         Initialize the SNSProvider with a boto3 SNS client.
@@ -40,22 +68,40 @@ class SNSProvider:
         aws_secret_access_key = credentials.get('aws_secret_access_key')
         region_name = credentials.get('region_name', 'us-east-1')
         
+        # Instances with the same region and credentials share one client
+        has_explicit_keys = bool(aws_access_key_id and aws_secret_access_key)
+        cache_key = (region_name, aws_access_key_id if has_explicit_keys else None)
+        sns_client = SNSProvider._client_cache.get(cache_key)
+        if sns_client is not None:
+            self.sns_client = sns_client
+            return
+        
+        # Kept-alive connections and adaptive retries for the life of the container
+        config = Config(
+            max_pool_connections=50,
+            tcp_keepalive=True,
+            retries={'max_attempts': 3, 'mode': 'adaptive'}
+        )
+        
         # Initialize SNS client
-        if aws_access_key_id and aws_secret_access_key:
-            self.sns_client = boto3.client(
+        if has_explicit_keys:
+            sns_client = boto3.client(
                 'sns',
                 aws_access_key_id=aws_access_key_id,
                 aws_secret_access_key=aws_secret_access_key,
-                region_name=region_name
+                region_name=region_name,
+                config=config
             )
         else:
             # Use default credentials from environment or IAM role
-            self.sns_client = boto3.client('sns', region_name=region_name)
+            sns_client = boto3.client('sns', region_name=region_name, config=config)
+        
+        self.sns_client = SNSProvider._client_cache.setdefault(cache_key, sns_client)
     
     def publish_message(
         self,
         topic_arn: str,
-        message: Dict[str, Any],
+        message: Union[Dict[str, Any], str],
         subject: Optional[str] = None
     ) -> str:
         """
@@ -63,7 +109,8 @@ class SNSProvider:
         
         Args:
             topic_arn: The ARN of the SNS topic
-            message: Dictionary containing the message data (will be JSON serialized)
+            message: Dictionary containing the message data (will be JSON serialized),
+                or an already serialized JSON string
             subject: Optional subject for the message
             
         Returns:
@@ -74,7 +121,7 @@ class SNSProvider:
         """
         try:
             # Convert message dict to JSON string
-            message_json = json.dumps(message, ensure_ascii=False, default=str)
+            message_json = _to_json(message)
             
             # Prepare publish parameters
             publish_params = {
@@ -89,18 +136,161 @@ class SNSProvider:
             response = self.sns_client.publish(**publish_params)
             
             message_id = response['MessageId']
-            print(f"✓ SNS message published successfully. MessageId: {message_id}")
+            logger.info("SNS message published. MessageId: %s", message_id)
             
             return message_id
             
         except ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"❌ Error publishing to SNS: {error_code} - {error_message}")
+            logger.error("Error publishing to SNS: %s - %s", error_code, error_message)
             raise
         except Exception as e:
-            print(f"❌ Unexpected error publishing to SNS: {e}")
+            logger.error("Unexpected error publishing to SNS: %s", e)
+            raise
+    
+    def publish_batch(
+        self,
+        topic_arn: str,
+        messages: List[Union[Dict[str, Any], str]],
+        subjects: Optional[List[Optional[str]]] = None
+    ) -> List[str]:
+        """
+        Publish several messages to an SNS topic with as few PublishBatch calls as possible.
+        
+        Messages are packed into batches of up to 10 entries and 256 KB.
+        
+        Args:
+            topic_arn: The ARN of the SNS topic
+            messages: Dictionaries containing the message data (will be JSON serialized),
+                or already serialized JSON strings
+            subjects: Optional subject of each message
+            
+        Returns:
+            The message IDs returned by SNS for the published messages
+            
+        Raises:
+            ValueError: If a single message is larger than 256 KB
+            RuntimeError: If SNS rejected some of the entries
+            ClientError: If a publish batch operation fails
+        """
+        if subjects is None:
+            subjects = [None] * len(messages)
+        
+        # Build the entries and pack them into batches within the SNS limits
+        batches = [[]]
+        batch_bytes = 0
+        for idx, (message, subject) in enumerate(zip(messages, subjects)):
+            entry = {
+                'Id': str(idx),
+                'Message': _to_json(message),
+            }
+            if subject:
+                entry['Subject'] = subject
+            
+            # The subject counts towards the size limit along with the message
+            entry_bytes = len(entry['Message'].encode('utf-8')) + len((subject or '').encode('utf-8'))
+            if entry_bytes > MAX_BATCH_BYTES:
+                raise ValueError(
+                    f"SNS message {idx} is {entry_bytes} bytes, above the {MAX_BATCH_BYTES} bytes limit"
+                )
+            if batches[-1] and (
+                len(batches[-1]) == MAX_BATCH_ENTRIES or batch_bytes + entry_bytes > MAX_BATCH_BYTES
+            ):
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append(entry)
+            batch_bytes += entry_bytes
+        
+        message_ids = []
+        failures = []
+        try:
+            for batch in batches:
+                if not batch:
+                    continue
+                
+                response = self.sns_client.publish_batch(
+                    TopicArn=topic_arn,
+                    PublishBatchRequestEntries=batch
+                )
+                
+                for success in response.get('Successful', []):
+                    message_ids.append(success['MessageId'])
+                for failure in response.get('Failed', []):
+                    logger.error("Error publishing SNS batch entry %s: %s - %s",
+                                 failure.get('Id'), failure.get('Code'), failure.get('Message'))
+                    failures.append(failure.get('Id'))
+            
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            error_message = e.response['Error']['Message']
+            logger.error("Error publishing to SNS: %s - %s", error_code, error_message)
             raise
+        except Exception as e:
+            logger.error("Unexpected error publishing to SNS: %s", e)
+            raise
+        
+        logger.info("SNS batch published. %d/%d messages", len(message_ids), len(messages))
+        if failures:
+            raise RuntimeError(
+                f"SNS rejected {len(failures)}/{len(messages)} message(s): entries {', '.join(failures)}"
+            )
+        return message_ids
+    
+    def publish_messages_batch(
+        self,
+        topic_arn: str,
+        entries: List[Tuple[Union[Dict[str, Any], str], Optional[str]]]
+    ) -> List[str]:
+        """
+        Publish (message, subject) pairs to an SNS topic with PublishBatch.
+        
+        Args:
+            topic_arn: The ARN of the SNS topic
+            entries: (message, subject) pairs, each message being a dictionary or an
+                already serialized JSON string and each subject optional
+            
+        Returns:
+            The message IDs returned by SNS for the published messages
+            
+        Raises:
+            ValueError: If a single message is larger than 256 KB
+            RuntimeError: If SNS rejected some of the entries
+            ClientError: If a publish batch operation fails
+        """
+        return self.publish_batch(
+            topic_arn=topic_arn,
+            messages=[message for message, _ in entries],
+            subjects=[subject for _, subject in entries]
+        )
+    
+    def publish_tabular(
+        self,
+        topic_arn: str,
+        keys: Tuple[str, ...],
+        rows: List[Tuple[Any, ...]],
+        subject: Optional[str] = None
+    ) -> str:
+        """
+        Publish records sharing the same keys as a single compact message.
+        
+        The keys are sent once, followed by the value tuples:
+        ``{"k": [key, ...], "v": [[value, ...], ...]}``. Subscribers rebuild each
+        record with ``dict(zip(message["k"], row))``.
+        
+        Args:
+            topic_arn: The ARN of the SNS topic
+            keys: Keys shared by every record
+            rows: Values of each record, in the order of ``keys``
+            subject: Optional subject for the message
+            
+        Returns:
+            The message ID returned by SNS
+            
+        Raises:
+            ClientError: If the publish operation fails
+        """
+        return self.publish_message(topic_arn, {'k': keys, 'v': rows}, subject)
     
     def publish_text_message(
         self,
@@ -134,16 +324,16 @@ class SNSProvider:
             response = self.sns_client.publish(**publish_params)
             
             message_id = response['MessageId']
-            print(f"✓ SNS text message published successfully. MessageId: {message_id}")
+            logger.info("SNS text message published. MessageId: %s", message_id)
             
             return message_id
             
         except ClientError as e:
             error_code = e.response['Error']['Code']
             error_message = e.response['Error']['Message']
-            print(f"❌ Error publishing to SNS: {error_code} - {error_message}")
+            logger.error("Error publishing to SNS: %s - %s", error_code, error_message)
             raise
         except Exception as e:
-            print(f"❌ Unexpected error publishing to SNS: {e}")
+            logger.error("Unexpected error publishing to SNS: %s", e)
             raise
 
@@ -0,0 +1,239 @@
+"""Tests of the shared extraction logic of agents/base_agent.py."""
+
+import json
+from types import SimpleNamespace
+
+from agents.base_agent import (
+    BaseExtractionAgent,
+    _canonicalize_chunks,
+    _iter_array_items,
+    _normalize_chunk_text,
+    merge_units_by_code,
+)
+from agents.result_cache import ResultCache
+
+
+class ScriptedAgent:
+    """Stand-in for an agno agent answering every prompt with ``respond(prompt)``."""
+
+    instructions = "Extract the units."
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.prompts = []
+
+    def run(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=self.respond(prompt))
+
+
+class FakeExtractionAgent(BaseExtractionAgent):
+    """Minimal concrete agent driven by ScriptedAgent instances."""
+
+    prompt_cache_key = "fake_agent_v1"
+
+    def __init__(self, agent, strong_agent=None, result_cache=None):
+        self.model = "gpt-4o-mini"
+        self.agent = agent
+        self.strong_agent = strong_agent
+        self.result_cache = result_cache
+
+    def _build_agent(self, model, structured=True):
+        return self.agent
+
+    def _build_request_section(self):
+        return ["# EXTRACTION REQUEST"]
+
+
+def _doc(code):
+    """Single-chunk document mentioning unit ``code``."""
+    return [{"chunk_id": f"chunk_{code}", "text": f"Unidade {code}", "page": 1, "element_type": "text"}]
+
+
+def _unit(code):
+    return {"unit": {"unitCode": code}, "sources": [{"field": "unitCode", "chunk_id": f"chunk_{code}"}],
+            "confidence": {"unitCode": "high"}}
+
+
+def test_extract_information_batch_uses_the_result_cache(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    agent = ScriptedAgent(lambda prompt: json.dumps([{"units": [_unit("A")]}, {"units": [_unit("C")]}]))
+    extractor = FakeExtractionAgent(agent, result_cache=cache)
+
+    # Document B was already extracted on its own
+    cache_agent = ScriptedAgent(lambda prompt: json.dumps({"units": [_unit("B")]}))
+    FakeExtractionAgent(cache_agent, result_cache=cache).extract_information(_doc("B"))
+
+    results = extractor.extract_information_batch([_doc("A"), _doc("B"), _doc("C")])
+
+    assert results == [[_unit("A")], [_unit("B")], [_unit("C")]]
+    assert len(agent.prompts) == 1
+    assert "Unidade A" in agent.prompts[0] and "Unidade C" in agent.prompts[0]
+    assert "Unidade B" not in agent.prompts[0]
+
+    # The batched results were stored: a single-document call is answered from the cache
+    assert extractor.extract_information(_doc("C")) == [_unit("C")]
+    assert len(agent.prompts) == 1
+
+
+def test_extract_information_batch_of_one_miss_runs_a_single_extraction(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    agent = ScriptedAgent(lambda prompt: json.dumps({"units": [_unit("A")]}))
+    extractor = FakeExtractionAgent(agent, result_cache=cache)
+
+    assert extractor.extract_information_batch([_doc("A")]) == [[_unit("A")]]
+    assert extractor.extract_information_batch([_doc("A")]) == [[_unit("A")]]
+    assert len(agent.prompts) == 1
+    assert "=== DOCUMENT" not in agent.prompts[0]
+
+
+def test_normalize_chunk_text_collapses_whitespace_and_rulers():
+    assert _normalize_chunk_text("  Valor   total\n\n R$ 10  ") == "Valor total R$ 10"
+    assert _normalize_chunk_text("Preço ------------ 10") == "Preço --- 10"
+    assert _normalize_chunk_text(None) == ""
+
+
+def test_normalize_chunk_text_drops_page_numbers_but_keeps_bare_numbers():
+    assert _normalize_chunk_text("Página 3") == ""
+    assert _normalize_chunk_text("3 de 10") == ""
+    assert _normalize_chunk_text("101") == "101"
+
+
+def test_normalize_chunk_text_keeps_table_rows():
+    text = "| a |  b |\n\n\n| 1 | 2 |"
+
+    assert _normalize_chunk_text(text, "table") == "| a | b |\n| 1 | 2 |"
+
+
+def test_merge_units_by_code_combines_partial_results():
+    first = [{
+        "unit": {"unitCode": "101", "areaM2": None, "installmentPlans": [{"series": "MENSAL"}]},
+        "sources": [{"field": "unitCode", "chunk_id": "chunk_1"}],
+        "confidence": {"unitCode": "high"},
+    }]
+    second = [{
+        "unit": {"unitCode": "101", "areaM2": 50.0, "installmentPlans": [{"series": "ANUAL"}]},
+        "sources": [
+            {"field": "unitCode", "chunk_id": "chunk_1"},
+            {"field": "areaM2", "chunk_id": "chunk_7"},
+        ],
+        "confidence": {"unitCode": "low", "areaM2": "medium"},
+    }]
+
+    merged = merge_units_by_code([first, second])
+
+    assert len(merged) == 1
+    assert merged[0]["unit"]["areaM2"] == 50.0
+    assert merged[0]["unit"]["installmentPlans"] == [{"series": "MENSAL"}, {"series": "ANUAL"}]
+    assert merged[0]["sources"] == [
+        {"field": "unitCode", "chunk_id": "chunk_1"},
+        {"field": "areaM2", "chunk_id": "chunk_7"},
+    ]
+    assert merged[0]["confidence"] == {"unitCode": "high", "areaM2": "medium"}
+
+
+def test_merge_units_by_code_keeps_units_without_code_and_drops_placeholders():
+    results = [
+        [{"unit": {"unitCode": None, "buyerName": "Ana"}}, {"unit": {}, "sources": [], "confidence": {}}],
+        [{"unit": {"unitCode": None, "buyerName": "Bruno"}}],
+    ]
+
+    merged = merge_units_by_code(results)
+
+    assert [item["unit"]["buyerName"] for item in merged] == ["Ana", "Bruno"]
+    assert all(item["sources"] == [] and item["confidence"] == {} for item in merged)
+
+
+def _respond_per_shard(prompt):
+    """Unit A lives in its own shard; the other shards hold no unit."""
+    return json.dumps({"units": [_unit("A")] if "Unidade A" in prompt else []})
+
+
+def test_sharded_extraction_escalates_on_the_merged_result_only():
+    agent = ScriptedAgent(_respond_per_shard)
+    strong_agent = ScriptedAgent(_respond_per_shard)
+    extractor = FakeExtractionAgent(agent, strong_agent=strong_agent)
+
+    result = extractor.extract_information_sharded(_doc("A") + _doc("B") + _doc("C"), shard_size=1)
+
+    assert result == [_unit("A")]
+    assert len(agent.prompts) == 3
+    assert strong_agent.prompts == []
+    assert (extractor._extractions, extractor._escalations) == (1, 0)
+
+
+def test_sharded_extraction_reruns_every_shard_with_the_strong_model_when_unsure():
+    uncertain = dict(_unit("A"), confidence={"unitCode": "low"})
+    agent = ScriptedAgent(lambda prompt: json.dumps({"units": [uncertain] if "Unidade A" in prompt else []}))
+    strong_agent = ScriptedAgent(_respond_per_shard)
+    extractor = FakeExtractionAgent(agent, strong_agent=strong_agent)
+
+    result = extractor.extract_information_sharded(_doc("A") + _doc("B"), shard_size=1)
+
+    assert result == [_unit("A")]
+    assert len(strong_agent.prompts) == 2
+    assert (extractor._extractions, extractor._escalations) == (1, 1)
+
+
+def test_canonicalize_chunks_keeps_document_order():
+    # Lexicographic order would put chunk_1000 before chunk_101
+    chunks = [
+        {"chunk_id": "chunk_101", "text": "Unidade 101", "element_type": "text"},
+        {"chunk_id": "chunk_1000", "text": "Unidade 1000", "element_type": "text"},
+        {"chunk_id": "chunk_2", "text": "Mesmo valor do anterior", "element_type": "text"},
+    ]
+
+    canonical = _canonicalize_chunks(chunks)
+
+    assert [chunk["chunk_id"] for chunk, _ in canonical] == ["chunk_101", "chunk_1000", "chunk_2"]
+
+
+def test_canonicalize_chunks_drops_duplicates_after_normalization():
+    chunks = [
+        {"chunk_id": "chunk_1", "text": "Cláusula  1", "element_type": "text"},
+        {"chunk_id": "chunk_2", "text": "Cláusula 1\n", "element_type": "text"},
+        {"chunk_id": "chunk_3", "text": "Cláusula 1", "element_type": "table"},
+    ]
+
+    canonical = _canonicalize_chunks(chunks)
+
+    assert [(chunk["chunk_id"], text) for chunk, text in canonical] == [
+        ("chunk_1", "Cláusula 1"),
+        ("chunk_3", "Cláusula 1"),
+    ]
+
+
+def _pieces(text, size=5):
+    """Split ``text`` into fixed-size fragments, like streamed model tokens."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_iter_array_items_decodes_streamed_elements():
+    text = '[{"unit": {"unitCode": "101"}}, {"unit": {"unitCode": "102", "plans": [1, 2]}}]'
+
+    items = list(_iter_array_items(_pieces(text)))
+
+    assert items == [
+        {"unit": {"unitCode": "101"}},
+        {"unit": {"unitCode": "102", "plans": [1, 2]}},
+    ]
+
+
+def test_iter_array_items_yields_each_element_before_the_end_of_the_stream():
+    pieces = iter(['[{"a": 1}', ', {"b"', ': 2}', ']'])
+    items = _iter_array_items(pieces)
+
+    assert next(items) == {"a": 1}
+    assert next(pieces) == ', {"b"'
+
+
+def test_iter_array_items_ignores_fences_and_units_wrapper():
+    text = '```json\n{"units": [{"unit": {"unitCode": "A"}}, {"unit": {"unitCode": "B"}}]}\n```'
+
+    items = list(_iter_array_items(_pieces(text, size=3)))
+
+    assert [item["unit"]["unitCode"] for item in items] == ["A", "B"]
+
+
+def test_iter_array_items_without_array():
+    assert list(_iter_array_items(["no json here"])) == []
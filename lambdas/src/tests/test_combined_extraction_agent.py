@@ -0,0 +1,42 @@
+"""Tests of split_combined_result in agents/combined_extraction_agent.py."""
+
+from agents.combined_extraction_agent import split_combined_result
+
+
+def test_split_combined_result_separates_contract_and_installment_fields():
+    result = [{
+        "unit": {
+            "unitCode": "101",
+            "sellValue": 300000.0,
+            "installmentPlans": [{"series": "MENSAL", "totalInstallments": 60}],
+        },
+        "sources": [
+            {"field": "sellValue", "chunk_id": "chunk_3"},
+            {"field": "installmentPlans", "chunk_id": "chunk_9"},
+        ],
+        "confidence": {"unitCode": "high", "sellValue": "medium", "installmentPlans": "low"},
+    }]
+
+    contract_result, installment_result = split_combined_result(result)
+
+    assert contract_result == [{
+        "unit": {"unitCode": "101", "sellValue": 300000.0},
+        "sources": [{"field": "sellValue", "chunk_id": "chunk_3"}],
+        "confidence": {"unitCode": "high", "sellValue": "medium"},
+    }]
+    assert installment_result == [{
+        "unit": {"unitCode": "101", "installmentPlans": [{"series": "MENSAL", "totalInstallments": 60}]},
+        "sources": [{"field": "installmentPlans", "chunk_id": "chunk_9"}],
+        "confidence": {"unitCode": "high", "installmentPlans": "low"},
+    }]
+
+
+def test_split_combined_result_fills_missing_parts():
+    contract_result, installment_result = split_combined_result([{"unit": {"unitCode": "102"}}])
+
+    assert contract_result == [{"unit": {"unitCode": "102"}, "sources": [], "confidence": {}}]
+    assert installment_result == [{
+        "unit": {"unitCode": "102", "installmentPlans": []},
+        "sources": [],
+        "confidence": {},
+    }]
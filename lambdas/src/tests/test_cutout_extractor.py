@@ -0,0 +1,173 @@
+"""Tests of cutout rendering and encoding in cutout_extractor.py."""
+
+import io
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from cutout_extractor import CutoutExtractor, _encode_png, _encode_region, _to_image
+
+
+@pytest.fixture
+def pdf_bytes():
+    """A 200x200 pt page with a line of text and a filled red rectangle."""
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=200)
+    page.insert_text((20, 40), "Unidade 101 - R$ 300.000,00", fontsize=9)
+    page.draw_rect(fitz.Rect(120, 120, 180, 180), color=(1, 0, 0), fill=(1, 0, 0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def extractor(pdf_bytes):
+    with CutoutExtractor("memory.pdf", pdf_bytes=pdf_bytes) as cutout_extractor:
+        yield cutout_extractor
+
+
+def _text_region(height=40, width=60):
+    """White region with a black bar, like a line of black-on-white text."""
+    region = np.full((height, width, 3), 255, dtype=np.uint8)
+    region[15:25, 5:55] = 0
+    return region
+
+
+def test_to_image_stores_black_on_white_text_as_bilevel():
+    image = _to_image(_text_region())
+
+    assert image.mode == "1"
+    assert np.array_equal(np.array(image), _text_region()[:, :, 1] > 127)
+
+
+def test_to_image_stores_gray_content_as_grayscale():
+    gray = np.tile(np.linspace(64, 192, 60, dtype=np.uint8), (40, 1))
+    region = np.repeat(gray[:, :, None], 3, axis=2)
+
+    image = _to_image(region)
+
+    assert image.mode == "L"
+    assert np.array_equal(np.array(image), gray)
+
+
+def test_to_image_keeps_color_content_rgb():
+    region = _text_region()
+    region[:, :30] = (200, 30, 30)
+
+    assert _to_image(region).mode == "RGB"
+
+
+def test_to_image_tolerates_a_few_colored_pixels():
+    # Below 1% of colored pixels (e.g. anti-aliasing fringes) still quantizes
+    region = _text_region(height=100, width=100)
+    region[0, :50] = (255, 0, 0)
+
+    assert _to_image(region).mode == "1"
+
+
+def test_encode_png_round_trips_quantized_pixels():
+    encoded = _encode_png(_text_region())
+
+    decoded = Image.open(io.BytesIO(bytes(encoded)))
+
+    assert decoded.format == "PNG"
+    assert decoded.mode == "1"
+    assert np.array_equal(np.array(decoded.convert("L")), _text_region()[:, :, 1])
+
+
+def _slices(regions, boxes):
+    """Cut every pixel box out of its rendered region, offset by the region origin."""
+    return [
+        pixels[y0 - origin_y:y1 - origin_y, x0 - origin_x:x1 - origin_x]
+        for (pixels, origin_x, origin_y), (x0, y0, x1, y1) in zip(regions, boxes.tolist())
+    ]
+
+
+def test_render_regions_renders_close_boxes_in_one_clip(extractor):
+    boxes = np.array([[40, 60, 100, 80], [110, 60, 170, 80]], dtype=np.int64)
+
+    regions = extractor._render_regions(0, 2.0, boxes)
+
+    assert regions[0] is regions[1]
+    pixels, origin_x, origin_y = regions[0]
+    assert (origin_x, origin_y) == (40, 60)
+    assert pixels.shape[:2] == (20, 130)
+    page = extractor._render_page(0, 2.0)
+    for cutout, (x0, y0, x1, y1) in zip(_slices(regions, boxes), boxes.tolist()):
+        assert np.array_equal(cutout, page[y0:y1, x0:x1])
+
+
+def test_render_regions_renders_scattered_boxes_one_by_one(extractor):
+    boxes = np.array([[0, 0, 20, 20], [200, 200, 220, 220]], dtype=np.int64)
+
+    regions = extractor._render_regions(0, 2.0, boxes)
+
+    assert [(origin_x, origin_y) for _, origin_x, origin_y in regions] == [(0, 0), (200, 200)]
+    assert all(pixels.shape[:2] == (20, 20) for pixels, _, _ in regions)
+    assert extractor._page_cache == {}
+
+
+def test_render_regions_renders_large_unions_as_the_cached_page(extractor):
+    boxes = np.array([[0, 0, 400, 300]], dtype=np.int64)
+
+    regions = extractor._render_regions(0, 2.0, boxes)
+
+    pixels, origin_x, origin_y = regions[0]
+    assert (origin_x, origin_y) == (0, 0)
+    assert pixels.shape[:2] == (400, 400)
+    assert (0, 2.0) in extractor._page_cache
+
+
+def test_pixel_boxes_converts_bottom_left_bboxes_and_clips_to_the_page():
+    # [left, top, right, bottom] with a bottom-left origin; the second box overflows the page
+    bboxes = np.array([[20, 170, 80, 150], [150, 30, 260, -10]], dtype=np.float64)
+
+    boxes = CutoutExtractor._pixel_boxes(bboxes, 200, 200, padding=5, scale=2.0)
+
+    assert boxes.tolist() == [[30, 50, 170, 110], [290, 330, 400, 400]]
+
+
+def test_encode_region_saves_only_color_content_as_jpeg():
+    color = _text_region()
+    color[:, :30] = (200, 30, 30)
+
+    data, ext = _encode_region(color, "jpeg")
+    assert ext == ".jpeg"
+    assert bytes(data[:2]) == b"\xff\xd8"
+
+    data, ext = _encode_region(_text_region(), "jpeg")
+    assert ext == ".png"
+    assert bytes(data[:8]) == b"\x89PNG\r\n\x1a\n"
+
+    assert _encode_region(color, "png")[1] == ".png"
+
+
+@pytest.mark.parametrize("scale, size", [(1.0, 70), (2.0, 140)])
+def test_iter_cutouts_honours_scale_and_format(extractor, scale, size):
+    chunks = [
+        {"chunk_id": "chunk_0", "page": 1, "bbox": "(18, 172, 160, 156)"},
+        {"chunk_id": "chunk_1", "page": 1, "bbox": [120, 80, 180, 20]},
+    ]
+    extraction_result = [{
+        "unit": {"unitCode": "101"},
+        "sources": [
+            {"field": "sellValue", "chunk_id": "chunk_0"},
+            {"field": "logo", "chunk_id": "chunk_1"},
+        ],
+    }]
+
+    cutouts = {
+        field_key: (data, ext)
+        for field_key, data, ext in extractor.iter_cutouts(
+            extraction_result, padding=5, scale=scale, chunks=chunks, image_format="jpeg"
+        )
+    }
+
+    assert cutouts[(1, "sellValue")][1] == ".png"
+    data, ext = cutouts[(1, "logo")]
+    assert ext == ".jpeg"
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "JPEG"
+    assert image.size == (size, size)
@@ -0,0 +1,78 @@
+"""Tests of the SNS notification helpers in main.py."""
+
+import json
+
+import pytest
+
+from main import (
+    NOTIFICATION_SIZE_MARGIN,
+    notification_subject,
+    offload_notification_payload,
+    serialize_notification_payload,
+)
+from sns_provider import MAX_BATCH_BYTES
+
+
+class FakeS3Provider:
+    """Records upload_bytes calls and returns their S3 URI."""
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_bytes(self, data, bucket_name, key, content_type=None):
+        self.uploads.append((data, bucket_name, key, content_type))
+        return f"s3://{bucket_name}/{key}"
+
+
+def _payload(size):
+    """Notification payload whose JSON serialization is exactly ``size`` bytes."""
+    payload = {
+        'jobId': 'job-1',
+        'bucketName': 'bucket',
+        'status': 'success',
+        'processedAt': '2024-01-01T00:00:00Z',
+        'units': '',
+    }
+    payload['units'] = 'x' * (size - len(serialize_notification_payload(payload)))
+    return payload
+
+
+def _offload(s3_provider, size, subject):
+    payload = _payload(size)
+    payload_bytes = serialize_notification_payload(payload)
+    assert len(payload_bytes) == size
+    message = offload_notification_payload(
+        s3_provider, payload, payload_bytes, 'bucket', 'job-1', subject=subject
+    )
+    return payload_bytes, message
+
+
+def test_offload_keeps_payloads_that_fit_with_their_subject():
+    s3_provider = FakeS3Provider()
+    subject = notification_subject('job-1')
+    size = MAX_BATCH_BYTES - len(subject.encode('utf-8')) - NOTIFICATION_SIZE_MARGIN
+
+    payload_bytes, message = _offload(s3_provider, size, subject)
+
+    assert message is payload_bytes
+    assert s3_provider.uploads == []
+
+
+@pytest.mark.parametrize("subject", [None, notification_subject('job-1')])
+def test_offload_uploads_payloads_over_the_limit_left_by_subject_and_margin(subject):
+    s3_provider = FakeS3Provider()
+    subject_bytes = len(subject.encode('utf-8')) if subject else 0
+    size = MAX_BATCH_BYTES - subject_bytes - NOTIFICATION_SIZE_MARGIN + 1
+
+    payload_bytes, message = _offload(s3_provider, size, subject)
+
+    assert s3_provider.uploads == [
+        (payload_bytes, 'bucket', 'contracts/job-1/notification_payload.json', 'application/json')
+    ]
+    assert json.loads(message) == {
+        'jobId': 'job-1',
+        'bucketName': 'bucket',
+        'status': 'success',
+        'processedAt': '2024-01-01T00:00:00Z',
+        'payloadUri': 's3://bucket/contracts/job-1/notification_payload.json',
+    }
@@ -0,0 +1,91 @@
+"""Tests of the text-layer fast path of pdf_parser.py."""
+
+import fitz
+import pytest
+
+import pdf_parser
+from pdf_parser import parse_pdf_to_chunks
+
+
+PAGE_WIDTH = 600
+PAGE_HEIGHT = 800
+
+
+@pytest.fixture
+def pdf_bytes():
+    """A born-digital page with a header, a clause, a list item, a ruled table and a footer."""
+    doc = fitz.open()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((50, 30), "Contrato de Compra e Venda", fontsize=9)
+    page.insert_text((50, 100), "CLÁUSULA PRIMEIRA - DO OBJETO", fontsize=14)
+    page.insert_text((50, 150), "O comprador adquire a unidade 101 pelo valor total de R$ 300.000,00.", fontsize=10)
+    page.insert_text((50, 165), "O pagamento segue o plano descrito na cláusula segunda.", fontsize=10)
+    page.insert_text((50, 250), "1. Parcela mensal de R$ 5.000,00", fontsize=10)
+    for x in (50, 250, 450):
+        page.draw_line((x, 400), (x, 460))
+    for y in (400, 430, 460):
+        page.draw_line((50, y), (450, y))
+    page.insert_text((55, 420), "Unidade", fontsize=10)
+    page.insert_text((255, 420), "Valor", fontsize=10)
+    page.insert_text((55, 450), "101", fontsize=10)
+    page.insert_text((255, 450), "300.000,00", fontsize=10)
+    page.insert_text((50, 785), "Página 1 de 1", fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def chunks(pdf_bytes, monkeypatch):
+    """Parse the page on the fast path, failing if Docling is ever reached."""
+    def _no_docling(*args, **kwargs):
+        raise AssertionError("the text layer should not go through Docling")
+
+    monkeypatch.setattr(pdf_parser, "_get_converter", _no_docling)
+    return list(parse_pdf_to_chunks("memory.pdf", pdf_bytes=pdf_bytes, fast_path=True))
+
+
+def test_fast_path_numbers_chunks_in_reading_order(chunks):
+    assert [chunk["chunk_id"] for chunk in chunks] == [f"chunk_{i:03d}" for i in range(len(chunks))]
+    assert all(chunk["page"] == 1 for chunk in chunks)
+
+
+def test_fast_path_classifies_blocks(chunks):
+    types = {chunk["text"]: chunk["element_type"] for chunk in chunks}
+
+    assert types["Contrato de Compra e Venda"] == "page_header"
+    assert types["CLÁUSULA PRIMEIRA - DO OBJETO"] == "section_header"
+    assert types["1. Parcela mensal de R$ 5.000,00"] == "list_item"
+    assert types["Página 1 de 1"] == "page_footer"
+    body = next(chunk for chunk in chunks if chunk["text"].startswith("O comprador"))
+    assert body["element_type"] == "text"
+    assert "cláusula segunda" in body["text"]
+
+
+def test_fast_path_renders_ruled_tables_as_markdown(chunks):
+    table = next(chunk for chunk in chunks if chunk["element_type"] == "table")
+
+    assert "|Unidade|Valor|" in table["text"]
+    assert "|101|300.000,00|" in table["text"]
+    assert table["bbox"] == (50.0, PAGE_HEIGHT - 400.0, 450.0, PAGE_HEIGHT - 460.0)
+    assert not any("Unidade" in chunk["text"] for chunk in chunks if chunk is not table)
+
+
+def test_fast_path_bboxes_use_a_bottom_left_origin(pdf_bytes, chunks):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        rect = doc[0].search_for("unidade 101")[0]
+    body = next(chunk for chunk in chunks if chunk["text"].startswith("O comprador"))
+
+    left, top, right, bottom = body["bbox"]
+    assert top > bottom
+    # Flipping back to a top-left origin must enclose the words of the block
+    assert left <= rect.x0 and right >= rect.x1
+    assert PAGE_HEIGHT - top <= rect.y0 and PAGE_HEIGHT - bottom >= rect.y1
+
+
+def test_has_text_layer_is_false_for_scanned_pages():
+    with fitz.open() as doc:
+        page = doc.new_page(width=200, height=200)
+        page.draw_rect(fitz.Rect(20, 20, 180, 180), color=(0, 0, 0), fill=(0.5, 0.5, 0.5))
+
+        assert not pdf_parser._has_text_layer(doc)
@@ -0,0 +1,84 @@
+"""Tests of the markdown report rendered by report_generator.generate_units_report."""
+
+import json
+import os
+
+from report_generator import _index_cutouts, generate_units_report
+
+
+def test_index_cutouts_groups_paths_by_unit():
+    manifest = {
+        "unit1_sellValue": ["out/u1_sell.png"],
+        "unit1_installmentPlans_0": ["out/u1_plan0.png"],
+        "unit1_installmentPlans_1": ["out/u1_plan1.png"],
+        "unit12_areaM2": ["out/u12_area.png"],
+        "summary": ["out/ignored.png"],
+    }
+
+    cutouts_by_unit, installment_cutouts_by_unit = _index_cutouts(manifest)
+
+    assert cutouts_by_unit == {
+        1: {
+            "sellValue": ["out/u1_sell.png"],
+            "installmentPlans_0": ["out/u1_plan0.png"],
+            "installmentPlans_1": ["out/u1_plan1.png"],
+        },
+        12: {"areaM2": ["out/u12_area.png"]},
+    }
+    assert installment_cutouts_by_unit == {1: ["out/u1_plan0.png", "out/u1_plan1.png"]}
+
+
+def test_generate_units_report_renders_templates(tmp_path):
+    manifest_path = tmp_path / "cutouts.json"
+    manifest_path.write_text(json.dumps({
+        "unit1_sellValue": [str(tmp_path / "cutouts" / "sell.png")],
+        "unit1_installmentPlans_0": [str(tmp_path / "cutouts" / "plan.png")],
+    }))
+    extraction_result = [
+        {
+            "unit": {
+                "unitCode": "101",
+                "areaM2": 50,
+                "sellValue": 300000,
+                "installmentPlans": [{"series": "MENSAL", "totalInstallments": 60, "installmentAmount": 5000}],
+            },
+            "confidence": {"unitCode": "high", "sellValue": "low"},
+        },
+        {"unit": {"unitCode": "102"}},
+    ]
+
+    report_path = generate_units_report(
+        extraction_result, str(tmp_path), str(manifest_path), generated_at="2025-01-01 00:00:00"
+    )
+
+    assert report_path == os.path.join(str(tmp_path), "report.md")
+    report = (tmp_path / "report.md").read_text(encoding="utf-8")
+
+    assert report.startswith(
+        "# Contract Information Extraction Report\n\n"
+        "**Generated:** 2025-01-01 00:00:00 | **Units:** 2\n\n"
+    )
+    assert (
+        "### Sell Value (R$)\n\n"
+        "| | |\n"
+        "|---|---|\n"
+        "| **Name** | Sell Value (R$) |\n"
+        "| **Value** | R$ 300,000.00 |\n"
+        "| **Confidence** | 🔴 low |\n"
+        "| **Image** | ![Sell Value (R$)](cutouts/sell.png) |\n"
+    ) in report
+    assert "| **Value** | 50.00 m² |\n| **Confidence** | ⚪ unknown |\n| **Image** | *No image available* |\n" in report
+    assert (
+        "#### Plan 1\n\n"
+        "| Field | Value |\n"
+        "|-------|-------|\n"
+        "| **Series** | MENSAL |\n"
+        "| **Total Installments** | 60 |\n"
+        "| **Installment Amount** | R$ 5,000.00 |\n"
+        "| **Total Value** | N/A |\n"
+    ) in report
+    assert "![Installment Plan Source](cutouts/plan.png)" in report
+    assert "### Unit 2 - 102\n\n*No installment plans found - Unit may be paid (QUITADA)*" in report
+    assert "**Total Value:** R$ 300,000.00 | **Total Area:** 50.00 m² | **Avg Price/m²:** R$ 6000.00 | " in report
+    assert "**Total Installment Plans:** 1\n\n⚠️ **1 fields with low confidence**" in report
+    assert report.endswith("*Report complete*\n")
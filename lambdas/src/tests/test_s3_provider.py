@@ -0,0 +1,97 @@
+"""Tests of S3Provider.get_file_as_bytes."""
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_provider import S3Provider
+
+
+class FakeBody:
+    """Streaming body that records whether it was read or closed."""
+
+    def __init__(self, data):
+        self.data = data
+        self.read_called = False
+        self.closed = False
+
+    def read(self):
+        self.read_called = True
+        return self.data
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3Client:
+    """Serves ``objects`` (key -> bytes) and records the GetObject parameters.
+
+    The ETag of an object is its length, and a matching ``IfNoneMatch`` is
+    answered with a 304 like S3 does.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.requests = []
+        self.bodies = []
+
+    def get_object(self, **params):
+        self.requests.append(params)
+        data = self.objects[params['Key']]
+        etag = f'"{len(data)}"'
+        if params.get('IfNoneMatch') == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        body = FakeBody(data)
+        self.bodies.append(body)
+        return {'Body': body, 'ContentLength': len(data), 'ETag': etag}
+
+
+@pytest.fixture
+def make_provider(monkeypatch):
+    """Build an S3Provider whose shared client is a FakeS3Client."""
+    def _make(client):
+        for name in ('CUSTOM_AWS_ACCESS_KEY_ID', 'CUSTOM_AWS_SECRET_ACCESS_KEY', 'CUSTOM_AWS_DEFAULT_REGION'):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setitem(S3Provider._client_cache, (None, None), client)
+        return S3Provider()
+    return _make
+
+
+def test_get_file_as_bytes_skips_objects_over_max_size(make_provider):
+    client = FakeS3Client({'small.pdf': b'x' * 10, 'large.pdf': b'x' * 11})
+    provider = make_provider(client)
+
+    assert provider.get_file_as_bytes('bucket', 'small.pdf', max_size=10) == b'x' * 10
+    assert provider.get_file_as_bytes('bucket', 'large.pdf', max_size=10) is None
+
+    large_body = client.bodies[1]
+    assert large_body.closed
+    assert not large_body.read_called
+
+
+def test_get_file_as_bytes_revalidates_cached_objects_by_etag(make_provider):
+    client = FakeS3Client({'layout.pdf': b'v1'})
+    provider = make_provider(client)
+
+    assert provider.get_file_as_bytes('bucket', 'layout.pdf', use_cache=True) == b'v1'
+    assert provider.get_file_as_bytes('bucket', 'layout.pdf', use_cache=True) == b'v1'
+
+    assert 'IfNoneMatch' not in client.requests[0]
+    assert client.requests[1]['IfNoneMatch'] == '"2"'
+    assert len(client.bodies) == 1
+
+    # A changed object has a new ETag, so the full body is read and cached again
+    client.objects['layout.pdf'] = b'v2 changed'
+    assert provider.get_file_as_bytes('bucket', 'layout.pdf', use_cache=True) == b'v2 changed'
+    assert provider.get_file_as_bytes('bucket', 'layout.pdf', use_cache=True) == b'v2 changed'
+    assert client.requests[-1]['IfNoneMatch'] == '"10"'
+
+
+def test_get_file_as_bytes_without_cache_never_sends_etags(make_provider):
+    client = FakeS3Client({'layout.pdf': b'v1'})
+    provider = make_provider(client)
+
+    provider.get_file_as_bytes('bucket', 'layout.pdf', use_cache=True)
+    provider.get_file_as_bytes('bucket', 'layout.pdf')
+
+    assert 'IfNoneMatch' not in client.requests[1]
+    assert client.bodies[1].read_called
@@ -0,0 +1,130 @@
+"""Tests of the PublishBatch packing and message encodings of sns_provider.SNSProvider."""
+
+import json
+
+import pytest
+
+from sns_provider import MAX_BATCH_BYTES, MAX_BATCH_ENTRIES, SNSProvider
+
+
+class FakeSNSClient:
+    """Records Publish/PublishBatch calls and rejects the entries listed in ``failed_ids``."""
+
+    def __init__(self, failed_ids=()):
+        self.failed_ids = set(failed_ids)
+        self.batches = []
+        self.published = []
+
+    def publish(self, **params):
+        self.published.append(params)
+        return {'MessageId': f"msg-p{len(self.published)}"}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.batches.append(PublishBatchRequestEntries)
+        return {
+            'Successful': [
+                {'Id': entry['Id'], 'MessageId': f"msg-{entry['Id']}"}
+                for entry in PublishBatchRequestEntries if entry['Id'] not in self.failed_ids
+            ],
+            'Failed': [
+                {'Id': entry['Id'], 'Code': 'InvalidParameter', 'Message': 'rejected'}
+                for entry in PublishBatchRequestEntries if entry['Id'] in self.failed_ids
+            ],
+        }
+
+
+@pytest.fixture
+def make_provider(monkeypatch):
+    """Build an SNSProvider whose shared client is a FakeSNSClient."""
+    def _make(client):
+        monkeypatch.setitem(SNSProvider._client_cache, ('us-east-1', None), client)
+        return SNSProvider(credentials={'region_name': 'us-east-1'})
+    return _make
+
+
+def test_publish_batch_packs_up_to_max_entries(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+
+    message_ids = provider.publish_batch('arn:topic', [{'job': i} for i in range(MAX_BATCH_ENTRIES + 3)])
+
+    assert [len(batch) for batch in client.batches] == [MAX_BATCH_ENTRIES, 3]
+    assert message_ids == [f"msg-{i}" for i in range(MAX_BATCH_ENTRIES + 3)]
+
+
+def test_publish_batch_splits_on_payload_size(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+    message = 'x' * (MAX_BATCH_BYTES // 2 + 1)
+
+    provider.publish_batch('arn:topic', [message, message, message], subjects=['a', None, 'c'])
+
+    assert [len(batch) for batch in client.batches] == [1, 1, 1]
+    assert client.batches[0][0]['Subject'] == 'a'
+    assert 'Subject' not in client.batches[1][0]
+
+
+def test_publish_batch_raises_on_failed_entries(make_provider):
+    client = FakeSNSClient(failed_ids={'1'})
+    provider = make_provider(client)
+
+    with pytest.raises(RuntimeError, match="1/3"):
+        provider.publish_batch('arn:topic', [{'job': i} for i in range(3)])
+
+    assert len(client.batches) == 1
+
+
+def test_publish_batch_rejects_oversized_message(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+
+    with pytest.raises(ValueError):
+        provider.publish_batch('arn:topic', [{'job': 1}, 'x' * (MAX_BATCH_BYTES + 1)])
+
+    assert client.batches == []
+
+
+def test_publish_messages_batch_forwards_subjects(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+
+    provider.publish_messages_batch('arn:topic', [({'job': 1}, 'Job 1'), ('{"job": 2}', None)])
+
+    assert client.batches == [[
+        {'Id': '0', 'Message': '{"job":1}', 'Subject': 'Job 1'},
+        {'Id': '1', 'Message': '{"job": 2}'},
+    ]]
+
+
+def test_publish_batch_counts_subjects_towards_the_size_limit(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+    message = 'x' * (MAX_BATCH_BYTES // 2 - 1)
+
+    provider.publish_batch('arn:topic', [message, message], subjects=['abc', None])
+
+    assert [len(batch) for batch in client.batches] == [1, 1]
+
+    with pytest.raises(ValueError):
+        provider.publish_batch('arn:topic', ['x' * (MAX_BATCH_BYTES - 2)], subjects=['abc'])
+
+
+def test_publish_tabular_round_trips_records(make_provider):
+    client = FakeSNSClient()
+    provider = make_provider(client)
+    records = [
+        {'unitCode': '101', 'sellValue': 300000.0, 'areaM2': 50},
+        {'unitCode': '102', 'sellValue': None, 'areaM2': 62.5},
+    ]
+    keys = ('unitCode', 'sellValue', 'areaM2')
+
+    message_id = provider.publish_tabular(
+        'arn:topic', keys, [tuple(record[key] for key in keys) for record in records], subject='Units'
+    )
+
+    assert message_id == 'msg-p1'
+    (params,) = client.published
+    assert params['Subject'] == 'Units'
+    message = json.loads(params['Message'])
+    assert message['k'] == list(keys)
+    assert [dict(zip(message['k'], row)) for row in message['v']] == records